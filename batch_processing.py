@@ -0,0 +1,202 @@
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from config import (ALL_FORMATS, BATCH_COMMIT_INTERVAL, BATCH_COMMIT_SIZE, BATCH_FAST_LANE_WORKERS,
+                    BATCH_MAX_WORKERS, BATCH_SLOW_LANE_COST, DB_PATH, DEDUP_NEW_ROW)
+from file_processing import estimate_cost, extract_document, limit_ocr_threads, store_documents
+
+# (file_path, custom_name, tags, description, force_ocr) -- same shape as the GUI's selected_files
+BatchJob = Tuple[str, str, str, str, bool]
+ProgressCallback = Callable[[int, int, str, Optional[dict], Optional[str]], None]
+
+# Seconds between cancellation checks while waiting on the process pool
+CANCEL_POLL_INTERVAL = 0.5
+
+
+def collect_batch_files(paths: Iterable[str], recursive: bool = True) -> List[str]:
+    """Expand files and directories into a sorted list of supported files."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            if recursive:
+                for root, _, names in os.walk(path):
+                    files.extend(os.path.join(root, name) for name in names)
+            else:
+                files.extend(os.path.join(path, name) for name in os.listdir(path))
+        else:
+            files.append(path)
+    return sorted(f for f in files
+                  if os.path.isfile(f) and Path(f).suffix.lower().lstrip('.') in ALL_FORMATS)
+
+
+def split_lanes(jobs: Iterable[BatchJob]) -> Tuple[List[BatchJob], List[BatchJob]]:
+    """Split jobs by estimated cost into a fast lane, cheapest first so most files
+    become searchable early, and a slow lane, most expensive first so the longest
+    OCR job does not start last."""
+    costed = [(estimate_cost(job[0], job[4]), job) for job in jobs]
+    fast = [job for cost, job in sorted(costed, key=lambda item: item[0])
+            if cost < BATCH_SLOW_LANE_COST]
+    slow = [job for cost, job in sorted(costed, key=lambda item: -item[0])
+            if cost >= BATCH_SLOW_LANE_COST]
+    return fast, slow
+
+
+def lane_workers(fast_jobs: int, slow_jobs: int, max_workers: int) -> Tuple[int, int]:
+    """Processes for the (fast, slow) lanes: a lane with no competition gets every
+    worker, otherwise the fast lane keeps BATCH_FAST_LANE_WORKERS and OCR the rest"""
+    if not slow_jobs:
+        return min(max_workers, fast_jobs), 0
+    if not fast_jobs:
+        return 0, min(max_workers, slow_jobs)
+    fast = max(1, min(BATCH_FAST_LANE_WORKERS, fast_jobs, max_workers - 1))
+    return fast, max(1, min(max_workers - fast, slow_jobs))
+
+
+def terminate_pool(executor: ProcessPoolExecutor) -> None:
+    """Shut a process pool down without waiting for its running jobs: queued jobs are
+    cancelled and the worker processes killed, so the interpreter can exit promptly"""
+    # ProcessPoolExecutor has no public way to stop busy workers before Python 3.14
+    processes = list((executor._processes or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join()
+
+
+def process_batch(jobs: Iterable[BatchJob], output_format: str = 'txt',
+                  max_workers: Optional[int] = None,
+                  progress_callback: Optional[ProgressCallback] = None,
+                  new_row_on_duplicate: bool = DEDUP_NEW_ROW,
+                  cancel_event: Optional[threading.Event] = None,
+                  db_path: str = DB_PATH) -> Tuple[List[dict], List[Tuple[str, str]]]:
+    """Extract many files in parallel and write them to the database from this process.
+
+    Jobs are split by estimated cost (``split_lanes``) into a fast lane of direct
+    extractions and a slow lane of OCR work, each with its own process pool sized by
+    ``lane_workers``, so a large scanned PDF does not hold up the small files queued
+    behind it. A pool whose lane runs dry takes jobs from the other lane.
+
+    Every result is funnelled back here and inserted by a single writer, so worker
+    processes only ever read the database. The writer commits in bulk every
+    BATCH_COMMIT_SIZE results or BATCH_COMMIT_INTERVAL seconds. ``progress_callback(completed, total, file_path, result, error)`` is called
+    once per file, after its row is committed or it has failed.
+
+    Setting ``cancel_event`` stops the batch: queued files are dropped, the workers
+    extracting files are terminated, and results received so far are still committed.
+    Returns the ``process_file``-style result dicts and a list of ``(file_path, error)``
+    failures; cancelled files appear in neither.
+    """
+    jobs = list(jobs)
+    total = len(jobs)
+    max_workers = max_workers or BATCH_MAX_WORKERS
+    results = []
+    failures = []
+    pending = []  # (file_path, record) extracted but not yet written
+    completed = 0
+    last_commit = time.monotonic()
+
+    def report(file_path, result=None, error=None):
+        nonlocal completed
+        completed += 1
+        if progress_callback:
+            progress_callback(completed, total, file_path, result, error)
+
+    def commit():
+        nonlocal last_commit
+        if pending:
+            try:
+                stored = store_documents([record for _, record in pending], db_path)
+            except Exception as e:
+                for file_path, _ in pending:
+                    failures.append((file_path, f"Database insert failed: {e}"))
+                    report(file_path, error=f"Database insert failed: {e}")
+            else:
+                for (file_path, _), result in zip(pending, stored):
+                    results.append(result)
+                    report(file_path, result)
+            pending.clear()
+        last_commit = time.monotonic()
+
+    def finish(file_path, record=None, error=None):
+        if error is not None:
+            failures.append((file_path, error))
+            report(file_path, error=error)
+            return
+        pending.append((file_path, record))
+        if (len(pending) >= BATCH_COMMIT_SIZE
+                or time.monotonic() - last_commit >= BATCH_COMMIT_INTERVAL):
+            commit()
+
+    def cancelled():
+        return cancel_event is not None and cancel_event.is_set()
+
+    fast_jobs, slow_jobs = split_lanes(jobs) if total > 1 else (jobs, [])
+    if max_workers <= 1 or total <= 1:
+        for file_path, custom_name, tags, description, force_ocr in fast_jobs + slow_jobs[::-1]:
+            if cancelled():
+                break
+            try:
+                record = extract_document(file_path, output_format, custom_name, tags,
+                                          description, force_ocr, new_row_on_duplicate, db_path)
+            except Exception as e:
+                finish(file_path, error=str(e))
+            else:
+                finish(file_path, record)
+        commit()
+        return results, failures
+
+    lanes = [deque(fast_jobs), deque(slow_jobs)]
+    workers = lane_workers(len(fast_jobs), len(slow_jobs), max_workers)
+    executors = [ProcessPoolExecutor(max_workers=n, initializer=limit_ocr_threads) if n else None
+                 for n in workers]
+    running = {}  # future -> (file_path, lane index)
+    busy = [0, 0]
+
+    def dispatch():
+        # Only as many jobs as a lane has workers are handed to its pool; a lane whose
+        # own queue is empty takes the other lane's jobs so no worker sits idle
+        for index, executor in enumerate(executors):
+            while executor is not None and busy[index] < workers[index]:
+                lane = lanes[index] or lanes[1 - index]
+                if not lane:
+                    break
+                file_path, custom_name, tags, description, force_ocr = lane.popleft()
+                future = executor.submit(extract_document, file_path, output_format, custom_name, tags,
+                                         description, force_ocr, new_row_on_duplicate, db_path)
+                running[future] = (file_path, index)
+                busy[index] += 1
+
+    try:
+        dispatch()
+        while running and not cancelled():
+            # Poll with a timeout so cancellation is noticed while long OCR jobs run
+            done, _ = wait(running, timeout=CANCEL_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in done:
+                file_path, index = running.pop(future)
+                busy[index] -= 1
+                try:
+                    record = future.result()
+                except Exception as e:
+                    finish(file_path, error=str(e))
+                else:
+                    finish(file_path, record)
+            dispatch()
+            if pending and time.monotonic() - last_commit >= BATCH_COMMIT_INTERVAL:
+                commit()
+    finally:
+        for executor in executors:
+            if executor is None:
+                continue
+            if cancelled():
+                terminate_pool(executor)
+            else:
+                executor.shutdown(wait=True, cancel_futures=True)
+    commit()
+
+    return results, failures
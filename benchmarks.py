@@ -0,0 +1,415 @@
+"""Benchmarks for the storage, search and OCR layers.
+
+Run ``python benchmarks.py <benchmark> [options]``; each benchmark builds its own
+synthetic database or fixture corpus in a temporary directory and prints
+plain-text results.
+"""
+import argparse
+import difflib
+import os
+import random
+import re
+import sqlite3
+import statistics
+import string
+import subprocess
+import sys
+import tempfile
+import time
+
+import db_ops
+
+
+def make_vocabulary(rng: random.Random, size: int = 5000) -> list:
+    return ["".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 10)))
+            for _ in range(size)]
+
+
+def synthetic_text(rng: random.Random, vocabulary: list, words: int) -> str:
+    return " ".join(rng.choices(vocabulary, k=words))
+
+
+def synthetic_documents(n_docs: int, words_per_doc: int, seed: int = 0):
+    """Yield ``insert_document`` keyword dicts for a reproducible synthetic corpus"""
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(rng)
+    for i in range(n_docs):
+        yield {
+            "name": f"doc_{i}.txt",
+            "custom_name": f"Document {i}",
+            "path": f"/storage/doc_{i}.txt",
+            "original_format": "txt",
+            "is_machine_readable": True,
+            "readable": True,
+            "extracted_text_path": "",
+            "output_format": "txt",
+            "output_path": "",
+            "processing_method": "direct_read",
+            "file_size": words_per_doc * 7,
+            "word_count": words_per_doc,
+            "tags": ",".join(rng.sample(vocabulary[:50], 2)),
+            "description": synthetic_text(rng, vocabulary, 8),
+            "extracted_text": synthetic_text(rng, vocabulary, words_per_doc)
+        }
+
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def bench_fts_storage(n_docs: int, words_per_doc: int) -> None:
+    """DB size and FTS rebuild time: legacy copy-of-content FTS vs external content"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+
+        # Legacy layout (schema v1): the FTS table stores its own copy of every text
+        conn = sqlite3.connect(db_path)
+        c = conn.cursor()
+        db_ops._migrate_to_v1(c)
+        c.execute("PRAGMA user_version = 1")
+        for doc in synthetic_documents(n_docs, words_per_doc):
+            c.execute("""INSERT INTO documents (name, custom_name, path, original_format, tags,
+                         description, ingested_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, '', '')""",
+                      (doc["name"], doc["custom_name"], doc["path"], doc["original_format"],
+                       doc["tags"], doc["description"]))
+            c.execute("INSERT INTO extracted_texts (doc_id, content) VALUES (?, ?)",
+                      (c.lastrowid, doc["extracted_text"]))
+        conn.commit()
+
+        def legacy_rebuild():
+            c.execute("DELETE FROM documents_fts")
+            c.execute("""INSERT INTO documents_fts (rowid, doc_id, name, custom_name, content, tags, description)
+                         SELECT d.id, d.id, d.name, COALESCE(d.custom_name, ''), COALESCE(et.content, ''),
+                                COALESCE(d.tags, ''), COALESCE(d.description, '')
+                         FROM documents d LEFT JOIN extracted_texts et ON d.id = et.doc_id""")
+            conn.commit()
+
+        legacy_rebuild_time, _ = _timed(legacy_rebuild)
+        c.execute("VACUUM")
+        conn.close()
+        legacy_size = os.path.getsize(db_path)
+
+        migrate_time, _ = _timed(db_ops.init_db, db_path)
+        external_size = os.path.getsize(db_path)
+        external_rebuild_time, _ = _timed(db_ops.rebuild_fts_index, db_path=db_path)
+        db_ops.get_store(db_path).close()
+
+    print(f"documents: {n_docs}, words/doc: {words_per_doc}")
+    print(f"{'layout':<20}{'db size (MB)':>14}{'rebuild (s)':>14}")
+    print(f"{'legacy (v1)':<20}{legacy_size / 1e6:>14.1f}{legacy_rebuild_time:>14.2f}")
+    print(f"{'external content':<20}{external_size / 1e6:>14.1f}{external_rebuild_time:>14.2f}")
+    print(f"one-shot migration: {migrate_time:.2f} s")
+
+
+def bench_bulk_insert(doc_counts: list, words_per_doc: int, batch_size: int) -> None:
+    """Documents/sec: per-row insert_document vs batched insert_documents"""
+    print(f"words/doc: {words_per_doc}, batch size: {batch_size}")
+    print(f"{'documents':>10}{'per-row docs/s':>18}{'bulk docs/s':>15}{'speedup':>10}")
+    for n_docs in doc_counts:
+        docs = list(synthetic_documents(n_docs, words_per_doc))
+        rates = []
+        for bulk in (False, True):
+            with tempfile.TemporaryDirectory() as tmp:
+                db_path = os.path.join(tmp, "bench.db")
+                db_ops.init_db(db_path)
+                if bulk:
+                    elapsed, _ = _timed(db_ops.insert_documents, docs, batch_size, db_path)
+                else:
+                    elapsed, _ = _timed(lambda: [db_ops.insert_document(db_path=db_path, **doc)
+                                                 for doc in docs])
+                db_ops.get_store(db_path).close()
+            rates.append(n_docs / elapsed)
+        print(f"{n_docs:>10}{rates[0]:>18.0f}{rates[1]:>15.0f}{rates[1] / rates[0]:>9.1f}x")
+
+
+# EXPLAIN QUERY PLAN lines that walk a whole table (or a whole index of it)
+FULL_SCAN_RE = re.compile(r"^SCAN (d|documents|et|extracted_texts|document_chunks)\b")
+
+
+def bench_search_plan(n_docs: int, words_per_doc: int, batch_size: int) -> None:
+    """Query plans and latency of every search type; fails if the "all" search scans a table"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        db_ops.init_db(db_path)
+        build_time, _ = _timed(db_ops.insert_documents, synthetic_documents(n_docs, words_per_doc),
+                               batch_size, db_path)
+        conn = db_ops.get_store(db_path).connection()
+        conn.execute("ANALYZE")
+        print(f"{n_docs} documents built in {build_time:.1f} s")
+
+        vocabulary = make_vocabulary(random.Random(0))
+        queries = [vocabulary[0], f"{vocabulary[1]} {vocabulary[2]}", "Document 4242",
+                   "ocument 42", "zzqx"]
+        failures = []
+        print(f"{'search':<10}{'filter':<22}{'query':<24}{'rows':>6}{'first page ms':>15}")
+        for search_type in ("all", "content", "name", "tags"):
+            for readability_filter in ("all", "machine_readable"):
+                for query in queries:
+                    plans = db_ops.explain_search_plan(query, search_type, readability_filter,
+                                                       db_path=db_path)
+                    elapsed, (rows, _) = _timed(db_ops.search_documents_page, query, search_type,
+                                                readability_filter, db_path=db_path)
+                    print(f"{search_type:<10}{readability_filter:<22}{query:<24}{len(rows):>6}"
+                          f"{elapsed * 1000:>15.1f}")
+                    if search_type != "all":
+                        continue
+                    for strategy, plan in plans.items():
+                        scans = [line for line in plan if FULL_SCAN_RE.match(line)]
+                        if scans:
+                            failures.append(f"{query!r} ({readability_filter}) {strategy}: {scans}")
+        db_ops.get_store(db_path).close()
+
+    assert not failures, "full table scans in the \"all\" search:\n" + "\n".join(failures)
+    print('"all" search: no full table scans in any strategy')
+
+
+# Modules a single-file CLI run has no use for
+CLI_UNWANTED_MODULES = ("tkinter", "concurrent.futures.process", "batch_processing", "watch", "ui",
+                        "pdfplumber", "docx", "pytesseract", "pdf2image", "reportlab")
+
+# What a single-file CLI call does before it touches the file: import the entry
+# point and check the schema version
+STARTUP_SCRIPT = """import sys
+import db_ops
+import transformodocs
+db_ops.init_db({db_path!r})
+print(",".join(name for name in {unwanted!r} if name in sys.modules))
+"""
+
+IMPORT_TIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def bench_startup(runs: int, top: int) -> None:
+    """Cold-start time of a single-file CLI call (interpreter, imports, init_db); fails if
+    it imports the GUI, the process pool or an extractor library"""
+    repo = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        db_ops.init_db(db_path)
+        db_ops.get_store(db_path).close()
+        script = STARTUP_SCRIPT.format(db_path=db_path, unwanted=CLI_UNWANTED_MODULES)
+
+        def run(*args):
+            return subprocess.run([sys.executable, *args], cwd=repo, capture_output=True, text=True,
+                                  check=True)
+
+        run("-c", script)  # warm the OS file cache and the .pyc files
+        baseline = [_timed(run, "-c", "pass")[0] for _ in range(runs)]
+        startup = [_timed(run, "-c", script)[0] for _ in range(runs)]
+        profile = run("-X", "importtime", "-c", script)
+
+    baseline_ms = statistics.median(baseline) * 1000
+    startup_ms = statistics.median(startup) * 1000
+    print(f"runs: {runs}")
+    print(f"{'bare interpreter':<28}{baseline_ms:>10.1f} ms")
+    print(f"{'CLI startup':<28}{startup_ms:>10.1f} ms")
+    print(f"{'overhead':<28}{startup_ms - baseline_ms:>10.1f} ms")
+
+    # Top-level imports of the script, by cumulative microseconds
+    imports = []
+    for line in profile.stderr.splitlines():
+        match = IMPORT_TIME_RE.match(line)
+        if match and len(match.group(3)) == 0:
+            imports.append((int(match.group(2)), match.group(4)))
+    print(f"{'slowest top-level imports':<28}{'cumulative ms':>14}")
+    for cumulative, name in sorted(imports, reverse=True)[:top]:
+        print(f"{name:<28}{cumulative / 1000:>14.1f}")
+
+    unwanted = [name for name in profile.stdout.strip().split(",") if name]
+    assert not unwanted, f"single-file CLI startup imports {', '.join(unwanted)}"
+    print("single-file CLI startup: no GUI, process pool or extractor imports")
+
+
+# Body-text sizes and scan defects of the OCR fixture pages, each cycled through
+# page by page; 21 pages cover every combination
+OCR_FIXTURE_POINT_SIZES = (9, 10, 11, 12, 14, 18, 24)
+OCR_FIXTURE_DISTORTIONS = ("clean", "skewed", "noisy")
+# Rotation of skewed pages, and the share of noise blended into clean/skewed and noisy pages
+OCR_FIXTURE_SKEW_DEGREES = 3
+OCR_FIXTURE_NOISE = 0.15
+OCR_FIXTURE_HEAVY_NOISE = 0.4
+
+# (label, ocr_pdf_to_text options) of the OCR configurations compared; the first
+# is the accuracy baseline, and every other one must stay within --max-drop of it
+OCR_CONFIGURATIONS = [
+    ("fixed 300 dpi, as rendered", {"dpi": 300, "adaptive_dpi": False, "preprocess": "none"}),
+    ("fixed 300 dpi, binarized", {"dpi": 300, "adaptive_dpi": False, "preprocess": "binarize"}),
+    ("adaptive dpi, as rendered", {"dpi": 300, "adaptive_dpi": True, "preprocess": "none"}),
+    ("adaptive dpi, binarized", {"dpi": 300, "adaptive_dpi": True, "preprocess": "binarize"}),
+    ("configured pipeline", {}),
+]
+# (label, ocr_image_to_text options) of the image-file configurations, compared
+# the same way on high-resolution scans
+OCR_IMAGE_CONFIGURATIONS = [
+    ("full resolution", {"downsample": False}),
+    ("downsampled", {"downsample": True}),
+]
+
+
+def ocr_fixture_page(rng: random.Random, vocabulary: list, point_size: int, dpi: int, font_path: str = None,
+                     distortion: str = "clean"):
+    """(image, text) of a letter-size page of random words on a noisy, scan-like background.
+    A "skewed" ``distortion`` rotates the page by OCR_FIXTURE_SKEW_DEGREES and a "noisy"
+    one blends in OCR_FIXTURE_HEAVY_NOISE instead of OCR_FIXTURE_NOISE."""
+    from PIL import Image, ImageDraw, ImageFont
+    size = (int(8.5 * dpi), int(11 * dpi))
+    pixel_size = point_size * dpi / 72
+    font = (ImageFont.truetype(font_path, round(pixel_size)) if font_path
+            else ImageFont.load_default(size=pixel_size))
+    page = Image.new("L", size, 235)
+    draw = ImageDraw.Draw(page)
+    lines = []
+    y = dpi
+    while y + pixel_size < size[1] - dpi:
+        line = synthetic_text(rng, vocabulary, max(1, round(60 / point_size)))
+        draw.text((dpi, y), line, fill=30, font=font)
+        lines.append(line)
+        y += round(pixel_size * 1.4)
+    if distortion == "skewed":
+        page = page.rotate(OCR_FIXTURE_SKEW_DEGREES, resample=Image.BICUBIC, fillcolor=235)
+    noise = OCR_FIXTURE_HEAVY_NOISE if distortion == "noisy" else OCR_FIXTURE_NOISE
+    noisy = Image.blend(page, Image.effect_noise(size, 40).convert("L"), noise)
+    return noisy, "\n".join(lines)
+
+
+def character_accuracy(text: str, truth: str) -> float:
+    """1 - (edits in difflib's alignment of ``text`` to ``truth``) / len(truth), whitespace-insensitive"""
+    text, truth = " ".join(text.split()), " ".join(truth.split())
+    matcher = difflib.SequenceMatcher(None, text, truth, autojunk=False)
+    edits = sum(max(i2 - i1, j2 - j1) for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != "equal")
+    return max(0.0, 1 - edits / max(1, len(truth)))
+
+
+def _accuracy_by_kind(texts: list, truths: list, distortions: list) -> dict:
+    """{"all" or distortion: mean character accuracy} of OCRed fixture pages"""
+    page_accuracies = list(map(character_accuracy, texts, truths))
+    accuracy = {"all": statistics.mean(page_accuracies)}
+    for kind in OCR_FIXTURE_DISTORTIONS:
+        values = [value for value, distortion in zip(page_accuracies, distortions) if distortion == kind]
+        if values:
+            accuracy[kind] = statistics.mean(values)
+    return accuracy
+
+
+def _accuracy_losses(configurations: list, accuracies: list, max_drop: float, pages: str) -> list:
+    """Descriptions of every configuration less accurate than the first by more than max_drop"""
+    baseline = accuracies[0]
+    return [f"{label} loses {baseline[kind] - accuracy[kind]:.3f} accuracy on {kind} {pages}"
+            for (label, _), accuracy in zip(configurations[1:], accuracies[1:])
+            for kind in accuracy if baseline[kind] - accuracy[kind] > max_drop]
+
+
+def bench_ocr(pages: int, image_dpi: int, max_drop: float, font_path: str) -> None:
+    """Pages/sec and character accuracy of OCR configurations on synthetic clean, skewed and
+    noisy scans; fails if any configuration is less accurate than fixed 300 DPI as rendered,
+    or downsampled image files than full-resolution ones, by more than --max-drop, overall
+    or on one kind of page"""
+    import file_processing
+
+    rng = random.Random(0)
+    vocabulary = make_vocabulary(rng)
+    with tempfile.TemporaryDirectory() as tmp:
+        images, truths, distortions = [], [], []
+        for i in range(pages):
+            point_size = OCR_FIXTURE_POINT_SIZES[i % len(OCR_FIXTURE_POINT_SIZES)]
+            distortions.append(OCR_FIXTURE_DISTORTIONS[i % len(OCR_FIXTURE_DISTORTIONS)])
+            image, truth = ocr_fixture_page(rng, vocabulary, point_size, 300, font_path, distortions[-1])
+            images.append(image)
+            truths.append(truth)
+        pdf_path = os.path.join(tmp, "fixtures.pdf")
+        images[0].save(pdf_path, save_all=True, append_images=images[1:], resolution=300)
+
+        def pdf_run(options):
+            page_texts = file_processing.ocr_pdf_pages(pdf_path, use_cache=False, **options)
+            return [page_texts[number] for number in range(1, pages + 1)]
+
+        print(f"fixture corpus: {pages} scanned PDF pages at 300 dpi, "
+              f"{', '.join(map(str, OCR_FIXTURE_POINT_SIZES))} pt text, "
+              f"{', '.join(OCR_FIXTURE_DISTORTIONS)}")
+        kinds = [kind for kind in OCR_FIXTURE_DISTORTIONS if kind in distortions]
+        print(f"{'configuration':<32}{'pages/s':>10}{'accuracy':>10}" + "".join(f"{kind:>10}" for kind in kinds))
+        accuracies = []  # {"all" or distortion: accuracy} per configuration
+        for label, options in OCR_CONFIGURATIONS:
+            elapsed, texts = _timed(pdf_run, options)
+            accuracy = _accuracy_by_kind(texts, truths, distortions)
+            accuracies.append(accuracy)
+            print(f"{label:<32}{pages / elapsed:>10.2f}{accuracy['all']:>10.3f}"
+                  + "".join(f"{accuracy[kind]:>10.3f}" for kind in kinds))
+
+        # Image files scanned at a high resolution, two of each kind
+        image_paths, image_truths, image_distortions = [], [], []
+        for i in range(min(pages, 2 * len(OCR_FIXTURE_DISTORTIONS))):
+            point_size = OCR_FIXTURE_POINT_SIZES[i % len(OCR_FIXTURE_POINT_SIZES)]
+            image_distortions.append(OCR_FIXTURE_DISTORTIONS[i % len(OCR_FIXTURE_DISTORTIONS)])
+            image, truth = ocr_fixture_page(rng, vocabulary, point_size, image_dpi, font_path,
+                                            image_distortions[-1])
+            image_paths.append(os.path.join(tmp, f"scan_{i}.png"))
+            image.save(image_paths[-1])
+            image_truths.append(truth)
+
+        def image_run(options):
+            return [file_processing.ocr_image_to_text(path, use_cache=False, **options)[1]
+                    for path in image_paths]
+
+        image_kinds = [kind for kind in OCR_FIXTURE_DISTORTIONS if kind in image_distortions]
+        print(f"image files: {len(image_paths)} scans at {image_dpi} dpi, {', '.join(image_kinds)}")
+        image_accuracies = []
+        for label, options in OCR_IMAGE_CONFIGURATIONS:
+            elapsed, texts = _timed(image_run, options)
+            accuracy = _accuracy_by_kind(texts, image_truths, image_distortions)
+            image_accuracies.append(accuracy)
+            print(f"{label:<32}{len(image_paths) / elapsed:>10.2f}{accuracy['all']:>10.3f}"
+                  + "".join(f"{accuracy[kind]:>10.3f}" for kind in image_kinds))
+
+    failures = (_accuracy_losses(OCR_CONFIGURATIONS, accuracies, max_drop, "pages")
+                + _accuracy_losses(OCR_IMAGE_CONFIGURATIONS, image_accuracies, max_drop, "image files"))
+    assert not failures, "OCR configurations less accurate than their baseline:\n" + "\n".join(failures)
+    print(f"every OCR configuration: accuracy within {max_drop} of fixed 300 dpi "
+          f"or full-resolution images")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    fts_storage = subparsers.add_parser("fts-storage", help=bench_fts_storage.__doc__)
+    fts_storage.add_argument("--docs", type=int, default=10000)
+    fts_storage.add_argument("--words", type=int, default=500)
+
+    bulk_insert = subparsers.add_parser("bulk-insert", help=bench_bulk_insert.__doc__)
+    bulk_insert.add_argument("--docs", type=int, nargs="+", default=[10000, 100000])
+    bulk_insert.add_argument("--words", type=int, default=200)
+    bulk_insert.add_argument("--batch-size", type=int, default=db_ops.BULK_INSERT_BATCH_SIZE)
+
+    search_plan = subparsers.add_parser("search-plan", help=bench_search_plan.__doc__)
+    search_plan.add_argument("--docs", type=int, default=1000000)
+    search_plan.add_argument("--words", type=int, default=20)
+    search_plan.add_argument("--batch-size", type=int, default=db_ops.BULK_INSERT_BATCH_SIZE)
+
+    startup = subparsers.add_parser("startup", help=bench_startup.__doc__)
+    startup.add_argument("--runs", type=int, default=20)
+    startup.add_argument("--top", type=int, default=10)
+
+    ocr = subparsers.add_parser("ocr", help=bench_ocr.__doc__)
+    ocr.add_argument("--pages", type=int, default=21)
+    ocr.add_argument("--image-dpi", type=int, default=600)
+    ocr.add_argument("--max-drop", type=float, default=0.01)
+    ocr.add_argument("--font", help="TrueType font for the fixtures (default: Pillow's built-in font)")
+
+    args = parser.parse_args()
+    if args.benchmark == "fts-storage":
+        bench_fts_storage(args.docs, args.words)
+    elif args.benchmark == "bulk-insert":
+        bench_bulk_insert(args.docs, args.words, args.batch_size)
+    elif args.benchmark == "search-plan":
+        bench_search_plan(args.docs, args.words, args.batch_size)
+    elif args.benchmark == "startup":
+        bench_startup(args.runs, args.top)
+    elif args.benchmark == "ocr":
+        bench_ocr(args.pages, args.image_dpi, args.max_drop, args.font)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,126 @@ import os
 
 # Database setup
 DB_PATH = os.path.join(os.path.dirname(__file__), "db", "documents.db")
-os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+
+
+def ensure_db_dir(db_path: str = DB_PATH) -> None:
+    """Create the directory holding the database; done by db_ops.init_db, not at import"""
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+
+
+# SQLite connection tuning applied by db_ops.DocumentStore
+SQLITE_BUSY_TIMEOUT = 30.0
+SQLITE_SYNCHRONOUS = "NORMAL"
+SQLITE_CACHE_SIZE_KB = 64 * 1024
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+SQLITE_STATEMENT_CACHE_SIZE = 256
+# Search/browse pages cached per database, dropped on any write
+SEARCH_CACHE_SIZE = 128
+
+# Content-hash deduplication: identical files reuse the stored blob and extracted
+# text of the first ingested copy. DEDUP_NEW_ROW controls whether a duplicate still
+# gets its own metadata row (True) or resolves to the existing document (False).
+DEDUP_ENABLED = True
+DEDUP_NEW_ROW = False
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Documents written per transaction by db_ops.insert_documents
+BULK_INSERT_BATCH_SIZE = 500
+
+# Passage storage: extracted text is also split into passages of CHUNK_WORDS words,
+# each indexed on its own so searches can rank and show individual passages. Off by
+# default since it stores and indexes every text a second time
+CHUNKING_ENABLED = False
+CHUNK_WORDS = 200
+
+# Number of rows fetched per page by the paginated search/browse API
+SEARCH_PAGE_SIZE = 200
+# bm25 weights of the indexed columns (name, custom_name, content, tags,
+# description) and the number of tokens in each result's match snippet
+FTS_RANK_WEIGHTS = (10.0, 10.0, 1.0, 5.0, 2.0)
+SNIPPET_TOKENS = 16
+
+# Ids re-indexed per committed (and checkpointed) batch by db_ops.rebuild_fts_index,
+# and pages merged per step by db_ops.merge_fts_index
+FTS_REBUILD_BATCH_SIZE = 2000
+FTS_MERGE_PAGES = 500
+
+# Batch ingestion: number of worker processes used for extraction/OCR
+BATCH_MAX_WORKERS = os.cpu_count() or 1
+# The batch DB writer commits once this many results are pending or this many
+# seconds have passed since its last commit, whichever comes first
+BATCH_COMMIT_SIZE = 50
+BATCH_COMMIT_INTERVAL = 2.0
+# Cost-aware scheduling: files whose estimated extraction cost (extractors.COST_*
+# units) reaches BATCH_SLOW_LANE_COST -- anything needing OCR -- run in a separate
+# slow lane. While both lanes have work the fast lane keeps BATCH_FAST_LANE_WORKERS
+# processes and the slow lane gets the rest of the workers.
+BATCH_SLOW_LANE_COST = 100
+BATCH_FAST_LANE_WORKERS = max(1, (os.cpu_count() or 1) // 4)
+# Cost estimates sample the text layer of this many pages of an unprobed PDF, and
+# count a page per COST_BYTES_PER_PAGE bytes of other formats
+COST_SAMPLE_PAGES = 3
+COST_BYTES_PER_PAGE = 64 * 1024
+
+# Watch-folder mode: inboxes are rescanned every WATCH_POLL_INTERVAL seconds and a
+# file is ingested once its size and mtime have not changed for WATCH_SETTLE_SECONDS
+WATCH_POLL_INTERVAL = 2.0
+WATCH_SETTLE_SECONDS = 5.0
+
+# Number of file probes (format, page count, per-page text layer) kept in memory,
+# keyed on path, size and modification time
+PROBE_CACHE_SIZE = 256
+
+# Text-like formats (txt, csv, json, xml, html, md) are extracted and converted in
+# chunks of STREAM_CHUNK_CHARS characters; only the first INDEXED_TEXT_MAX_CHARS
+# characters of their text are stored in the database and full-text index
+STREAM_CHUNK_CHARS = 1024 * 1024
+INDEXED_TEXT_MAX_CHARS = 8 * 1024 * 1024
+
+# Scanned-PDF OCR: pages are rasterized in windows of OCR_PAGE_CHUNK and at most
+# OCR_MAX_IN_FLIGHT_PAGES rasterized pages are held in memory at any time
+OCR_DPI = 300
+OCR_PAGE_CHUNK = 4
+# Threads OCRing one PDF's pages; batch and watch pool workers use one each,
+# since they already run a file per CPU
+OCR_MAX_WORKERS = 2
+OCR_MAX_IN_FLIGHT_PAGES = 8
+# A PDF page needs OCR unless its text layer has at least this many non-blank
+# characters; mixed PDFs only OCR the pages that fall short
+OCR_MIN_PAGE_CHARS = 16
+# Adaptive OCR resolution: each page is first rendered at OCR_PROBE_DPI to measure
+# its median text-line height, then OCR'd at the DPI (a multiple of OCR_DPI_STEP
+# within OCR_MIN_DPI..OCR_MAX_DPI) that brings lines to about OCR_TARGET_LINE_HEIGHT
+# pixels, about the height of 10pt text at 300 DPI (Tesseract's accuracy drops off
+# for smaller text). OCR_DPI is used for pages where no text lines are found.
+# Off until `python benchmarks.py ocr` passes with it: line heights are measured
+# from row profiles, which skewed scans blur
+OCR_ADAPTIVE_DPI = False
+OCR_PROBE_DPI = 100
+OCR_MIN_DPI = 150
+OCR_MAX_DPI = 400
+OCR_DPI_STEP = 25
+OCR_TARGET_LINE_HEIGHT = 40
+# Image handed to Tesseract: "none" (as rendered), "grayscale", or "binarize"
+# (grayscale, then black and white at Otsu's threshold). "none" until
+# `python benchmarks.py ocr` passes with another mode
+OCR_PREPROCESS = "none"
+# Image files whose text lines are larger than OCR_TARGET_LINE_HEIGHT, or whose
+# longer side exceeds OCR_MAX_IMAGE_SIDE pixels, are scaled down before OCR.
+# Off until the image-file runs of `python benchmarks.py ocr` pass with it on
+# skewed and noisy scans, not only clean ones
+OCR_DOWNSAMPLE_IMAGES = False
+OCR_MAX_IMAGE_SIDE = 4000
+# Tesseract language(s) and extra command-line options for every OCR call
+OCR_LANG = "eng"
+OCR_TESSERACT_CONFIG = ""
+# On-disk cache of OCR text per page, keyed by source-file hash and page (with the
+# rendering settings) and by the hash of the preprocessed page raster, both with
+# language, options and Tesseract version;
+# least recently used pages are evicted beyond OCR_CACHE_MAX_BYTES of text
+OCR_CACHE_ENABLED = True
+OCR_CACHE_PATH = os.path.join(os.path.dirname(__file__), "db", "ocr_cache.db")
+OCR_CACHE_MAX_BYTES = 256 * 1024 * 1024
 
 # Supported file formats categorized by readability
 MACHINE_READABLE_FORMATS = {
@@ -32,6 +151,9 @@ NON_MACHINE_READABLE_FORMATS = {
 
 ALL_FORMATS = {**MACHINE_READABLE_FORMATS, **NON_MACHINE_READABLE_FORMATS}
 
+# Formats that are always OCRed
+IMAGE_FORMATS = ('jpg', 'jpeg', 'png', 'tiff', 'bmp', 'gif', 'webp')
+
 OUTPUT_FORMATS = {
     'txt': 'Plain Text (.txt)',
     'docx': 'Word Document (.docx)',
@@ -1,15 +1,183 @@
+import os
+import re
 import sqlite3
 import datetime
-from typing import List, Tuple
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from typing import Callable, Iterable, List, Optional, Tuple
 
-from config import DB_PATH
+from config import (BULK_INSERT_BATCH_SIZE, CHUNK_WORDS, CHUNKING_ENABLED, DB_PATH, FTS_MERGE_PAGES,
+                    FTS_RANK_WEIGHTS, FTS_REBUILD_BATCH_SIZE, SEARCH_CACHE_SIZE, SEARCH_PAGE_SIZE,
+                    SNIPPET_TOKENS, SQLITE_BUSY_TIMEOUT, SQLITE_CACHE_SIZE_KB, SQLITE_MMAP_SIZE,
+                    SQLITE_STATEMENT_CACHE_SIZE, SQLITE_SYNCHRONOUS, ensure_db_dir)
 
 
-def init_db(db_path: str = DB_PATH) -> None:
-    """Initialize database with enhanced schema and fixed FTS setup"""
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
+def _enable_wal(conn: sqlite3.Connection) -> None:
+    """Switch to WAL, retrying for up to SQLITE_BUSY_TIMEOUT: while another connection
+    is switching a new database over, this fails with "database is locked" without
+    going through the busy handler"""
+    deadline = time.monotonic() + SQLITE_BUSY_TIMEOUT
+    while True:
+        try:
+            conn.execute("PRAGMA journal_mode = WAL")
+            return
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e) or time.monotonic() >= deadline:
+                raise
+            time.sleep(0.01)
+
+
+class DocumentStore:
+    """Owns one reused, tuned SQLite connection per thread for a database file.
+
+    Connections are opened lazily, kept for the life of the thread and configured
+    for WAL with the mmap/cache/synchronous settings from config. sqlite3's
+    statement cache (``cached_statements``) reuses prepared statements across calls.
+
+    The store also keeps an LRU cache of search results. Writers through db_ops
+    call ``invalidate()``, which bumps ``generation`` and empties it; writes by
+    other connections are noticed through ``PRAGMA data_version``.
+    """
+
+    def __init__(self, db_path: str = DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        self.generation = 0
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        # A connection inherited across fork() must not be shared with the parent
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=SQLITE_BUSY_TIMEOUT,
+                                   cached_statements=SQLITE_STATEMENT_CACHE_SIZE)
+            _enable_wal(conn)
+            conn.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+            conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}")
+            conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+            conn.execute("PRAGMA temp_store = MEMORY")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def transaction(self, immediate: bool = False):
+        """Yield this thread's connection inside a transaction committed on success;
+        cached search results are dropped once it commits. ``immediate`` takes the
+        write lock up front (BEGIN IMMEDIATE), so what is read decides what is written
+        without a race, DDL included."""
+        conn = self.connection()
+        with conn:
+            if immediate:
+                conn.execute("BEGIN IMMEDIATE")
+            yield conn
+        self.invalidate()
+
+    def has_table(self, name: str) -> bool:
+        """Whether the database has a table (virtual tables included), looked up once
+        per thread and write generation since migrations add tables"""
+        known = getattr(self._local, "tables", None)
+        if known is None or known[0] != (self.connection(), self.generation):
+            known = self._local.tables = ((self.connection(), self.generation), {})
+        tables = known[1]
+        if name not in tables:
+            tables[name] = self.connection().execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+        return tables[name]
+
+    def invalidate(self) -> None:
+        """Drop every cached result; call after committing a write"""
+        with self._cache_lock:
+            self.generation += 1
+            self._cache.clear()
+
+    def _check_data_version(self) -> None:
+        # data_version changes when another connection (thread or process) commits.
+        # A thread's first check cannot know what it missed, so it invalidates too.
+        version = self.connection().execute("PRAGMA data_version").fetchone()[0]
+        if getattr(self._local, "data_version", None) != version:
+            self._local.data_version = version
+            self.invalidate()
+
+    def cache_get(self, key: tuple):
+        """Cached value for key, or None"""
+        self._check_data_version()
+        with self._cache_lock:
+            value = self._cache.get(key)
+            if value is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._cache.move_to_end(key)
+            return value
+
+    def cache_put(self, key: tuple, value, generation: int):
+        """Cache value unless a write happened since ``generation`` was read; returns value"""
+        with self._cache_lock:
+            if generation == self.generation:
+                self._cache[key] = value
+                self._cache.move_to_end(key)
+                while len(self._cache) > SEARCH_CACHE_SIZE:
+                    self._cache.popitem(last=False)
+        return value
+
+    def cache_stats(self) -> dict:
+        with self._cache_lock:
+            return {"hits": self._hits, "misses": self._misses, "size": len(self._cache),
+                    "generation": self.generation}
+
+    def close(self) -> None:
+        """Close the calling thread's connection, if it has one"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            if self._local.pid == os.getpid():
+                conn.close()
+            self._local.conn = None
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(db_path: str = DB_PATH) -> DocumentStore:
+    """Return the shared DocumentStore for a database path"""
+    store = _stores.get(db_path)
+    if store is None:
+        with _stores_lock:
+            store = _stores.setdefault(db_path, DocumentStore(db_path))
+    return store
+
+
+SCHEMA_VERSION = 10
+
+# Migrations after which the database file is compacted (they free a lot of pages)
+VACUUM_AFTER_VERSIONS = {2}
+
+FTS_COLUMNS = "name, custom_name, content, tags, description"
+
+FTS_SOURCE_SELECT = f"SELECT id, {FTS_COLUMNS} FROM documents_fts_source"
 
+# Metadata fields with a trigram index for indexed substring search
+TRIGRAM_COLUMNS = "name, custom_name, tags, description"
+
+# FTS5's trigram tokenizer needs SQLite 3.34+; without it substring search
+# falls back to LIKE scans
+TRIGRAM_SUPPORTED = sqlite3.sqlite_version_info >= (3, 34, 0)
+
+
+def _has_trigram_index(store: "DocumentStore") -> bool:
+    """Whether documents_meta_trigram can be used: it only exists if the schema was
+    migrated by an SQLite with the trigram tokenizer, and only such an SQLite reads it"""
+    return TRIGRAM_SUPPORTED and store.has_table("documents_meta_trigram")
+
+
+def _migrate_to_v1(c: sqlite3.Cursor) -> None:
+    """Base schema; the FTS index is built once, keyed by rowid = documents.id"""
     c.execute("""CREATE TABLE IF NOT EXISTS documents
                  (id INTEGER PRIMARY KEY,
                   name TEXT NOT NULL,
@@ -46,6 +214,8 @@ def init_db(db_path: str = DB_PATH) -> None:
                   content TEXT,
                   FOREIGN KEY (doc_id) REFERENCES documents (id))""")
 
+    # Databases created before schema versioning rebuilt this table on every start
+    # with arbitrary rowids; rebuild it one last time so rowid matches documents.id.
     c.execute("DROP TABLE IF EXISTS documents_fts")
 
     c.execute("""CREATE VIRTUAL TABLE documents_fts USING fts5(
@@ -62,43 +232,555 @@ def init_db(db_path: str = DB_PATH) -> None:
     c.execute("DROP TRIGGER IF EXISTS documents_ad")
     c.execute("DROP TRIGGER IF EXISTS documents_au")
 
+    c.execute("""INSERT INTO documents_fts (rowid, doc_id, name, custom_name, content, tags, description)
+                 SELECT d.id, d.id, d.name,
+                        COALESCE(d.custom_name, ''),
+                        COALESCE(et.content, ''),
+                        COALESCE(d.tags, ''),
+                        COALESCE(d.description, '')
+                 FROM documents d
+                 LEFT JOIN extracted_texts et ON d.id = et.doc_id""")
+
+
+def _migrate_to_v2(c: sqlite3.Cursor) -> None:
+    """External-content FTS: the index reads text from documents/extracted_texts
+    through a view instead of storing a second copy, and triggers keep it in sync."""
+    c.execute("DROP TABLE IF EXISTS documents_fts")
+    c.execute("DROP VIEW IF EXISTS documents_fts_source")
+
+    c.execute("""CREATE VIEW documents_fts_source AS
+                 SELECT d.id AS id,
+                        d.name AS name,
+                        COALESCE(d.custom_name, '') AS custom_name,
+                        COALESCE(et.content, '') AS content,
+                        COALESCE(d.tags, '') AS tags,
+                        COALESCE(d.description, '') AS description
+                 FROM documents d
+                 LEFT JOIN extracted_texts et ON d.id = et.doc_id""")
+
+    c.execute(f"""CREATE VIRTUAL TABLE documents_fts USING fts5(
+                  {FTS_COLUMNS},
+                  content = 'documents_fts_source',
+                  content_rowid = 'id',
+                  tokenize = 'porter ascii'
+              )""")
+
+    # Every trigger keeps one invariant: the FTS row for a document is indexed with
+    # that document's current fields plus its current extracted text ('' if none).
+    # External-content deletes must replay exactly the values that were indexed.
+    doc_content = "COALESCE((SELECT content FROM extracted_texts WHERE doc_id = {}.id), '')"
+    c.execute(f"""CREATE TRIGGER documents_fts_ai AFTER INSERT ON documents BEGIN
+                    INSERT INTO documents_fts (rowid, {FTS_COLUMNS})
+                    VALUES (new.id, new.name, COALESCE(new.custom_name, ''),
+                            {doc_content.format('new')},
+                            COALESCE(new.tags, ''), COALESCE(new.description, ''));
+                  END""")
+    c.execute(f"""CREATE TRIGGER documents_fts_ad AFTER DELETE ON documents BEGIN
+                    INSERT INTO documents_fts (documents_fts, rowid, {FTS_COLUMNS})
+                    VALUES ('delete', old.id, old.name, COALESCE(old.custom_name, ''),
+                            {doc_content.format('old')},
+                            COALESCE(old.tags, ''), COALESCE(old.description, ''));
+                  END""")
+    c.execute(f"""CREATE TRIGGER documents_fts_au
+                  AFTER UPDATE OF name, custom_name, tags, description ON documents BEGIN
+                    INSERT INTO documents_fts (documents_fts, rowid, {FTS_COLUMNS})
+                    VALUES ('delete', old.id, old.name, COALESCE(old.custom_name, ''),
+                            {doc_content.format('old')},
+                            COALESCE(old.tags, ''), COALESCE(old.description, ''));
+                    INSERT INTO documents_fts (rowid, {FTS_COLUMNS})
+                    VALUES (new.id, new.name, COALESCE(new.custom_name, ''),
+                            {doc_content.format('new')},
+                            COALESCE(new.tags, ''), COALESCE(new.description, ''));
+                  END""")
+
+    def replace_content(old_content: str, new_content: str, doc_id: str) -> str:
+        return f"""INSERT INTO documents_fts (documents_fts, rowid, {FTS_COLUMNS})
+                   SELECT 'delete', d.id, d.name, COALESCE(d.custom_name, ''), {old_content},
+                          COALESCE(d.tags, ''), COALESCE(d.description, '')
+                   FROM documents d WHERE d.id = {doc_id};
+                   INSERT INTO documents_fts (rowid, {FTS_COLUMNS})
+                   SELECT d.id, d.name, COALESCE(d.custom_name, ''), {new_content},
+                          COALESCE(d.tags, ''), COALESCE(d.description, '')
+                   FROM documents d WHERE d.id = {doc_id};"""
+
+    c.execute(f"""CREATE TRIGGER extracted_texts_fts_ai AFTER INSERT ON extracted_texts BEGIN
+                    {replace_content("''", "COALESCE(new.content, '')", "new.doc_id")}
+                  END""")
+    c.execute(f"""CREATE TRIGGER extracted_texts_fts_ad AFTER DELETE ON extracted_texts BEGIN
+                    {replace_content("COALESCE(old.content, '')", "''", "old.doc_id")}
+                  END""")
+    c.execute(f"""CREATE TRIGGER extracted_texts_fts_au AFTER UPDATE OF content ON extracted_texts BEGIN
+                    {replace_content("COALESCE(old.content, '')", "COALESCE(new.content, '')", "new.doc_id")}
+                  END""")
+
+    c.execute("INSERT INTO documents_fts (documents_fts) VALUES ('rebuild')")
+
+
+def _migrate_to_v3(c: sqlite3.Cursor) -> None:
+    """Composite index backing keyset pagination over (updated_at, id)"""
+    c.execute("CREATE INDEX IF NOT EXISTS idx_updated_at_id ON documents(updated_at, id)")
+
+
+def _migrate_to_v4(c: sqlite3.Cursor) -> None:
+    """SHA-256 of each ingested file, for content-addressed deduplication"""
+    c.execute("ALTER TABLE documents ADD COLUMN content_hash TEXT")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_content_hash ON documents(content_hash)")
+
+
+def _migrate_to_v5(c: sqlite3.Cursor) -> None:
+    """Per-page extraction method (text layer or OCR) of page-structured documents"""
+    c.execute("""CREATE TABLE IF NOT EXISTS document_pages
+                 (doc_id INTEGER NOT NULL,
+                  page_number INTEGER NOT NULL,
+                  method TEXT NOT NULL,
+                  PRIMARY KEY (doc_id, page_number),
+                  FOREIGN KEY (doc_id) REFERENCES documents (id)) WITHOUT ROWID""")
+
+
+_PASSAGE_WORD_RE = re.compile(r'\s*\S+\s*')
+
+
+def split_passages(text_chunks: Iterable[str], words_per_passage: int = CHUNK_WORDS):
+    """Yield passages of ``words_per_passage`` words from a stream of text chunks.
+
+    Whitespace is kept, so the passages concatenate back to the original text.
+    """
+    passage = []
+    pending = ""
+    for chunk in text_chunks:
+        text = pending + chunk
+        words = _PASSAGE_WORD_RE.findall(text)
+        if not words:
+            pending = text
+            continue
+        # The last word may continue in the next chunk
+        pending = words.pop()
+        for word in words:
+            passage.append(word)
+            if len(passage) >= words_per_passage:
+                yield "".join(passage)
+                passage = []
+    tail = "".join(passage) + pending
+    if tail.strip():
+        yield tail
+
+
+def _migrate_to_v6(c: sqlite3.Cursor) -> None:
+    """Passage table with its own external-content FTS index, backfilled from extracted_texts
+    when CHUNKING_ENABLED"""
+    c.execute("""CREATE TABLE IF NOT EXISTS document_chunks
+                 (id INTEGER PRIMARY KEY,
+                  doc_id INTEGER NOT NULL,
+                  chunk_number INTEGER NOT NULL,
+                  content TEXT NOT NULL,
+                  UNIQUE (doc_id, chunk_number),
+                  FOREIGN KEY (doc_id) REFERENCES documents (id))""")
+    c.execute("""CREATE VIRTUAL TABLE chunks_fts USING fts5(
+                 content,
+                 content = 'document_chunks',
+                 content_rowid = 'id',
+                 tokenize = 'porter ascii'
+             )""")
+    c.execute("""CREATE TRIGGER chunks_fts_ai AFTER INSERT ON document_chunks BEGIN
+                   INSERT INTO chunks_fts (rowid, content) VALUES (new.id, new.content);
+                 END""")
+    c.execute("""CREATE TRIGGER chunks_fts_ad AFTER DELETE ON document_chunks BEGIN
+                   INSERT INTO chunks_fts (chunks_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                 END""")
+    c.execute("""CREATE TRIGGER chunks_fts_au AFTER UPDATE OF content ON document_chunks BEGIN
+                   INSERT INTO chunks_fts (chunks_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                   INSERT INTO chunks_fts (rowid, content) VALUES (new.id, new.content);
+                 END""")
+
+    if not CHUNKING_ENABLED:
+        return
+    texts = c.connection.execute("SELECT doc_id, content FROM extracted_texts WHERE content IS NOT NULL")
+    for doc_id, content in texts:
+        c.executemany("INSERT INTO document_chunks (doc_id, chunk_number, content) VALUES (?, ?, ?)",
+                      [(doc_id, number, passage)
+                       for number, passage in enumerate(split_passages([content]))])
+
+
+def _migrate_to_v7(c: sqlite3.Cursor) -> None:
+    """Trigram index over document metadata so substring search does not scan documents"""
+    if not TRIGRAM_SUPPORTED:
+        return
+    c.execute(f"""CREATE VIRTUAL TABLE documents_meta_trigram USING fts5(
+                  {TRIGRAM_COLUMNS},
+                  content = 'documents',
+                  content_rowid = 'id',
+                  tokenize = 'trigram'
+              )""")
+    new_values = "new.id, new.name, new.custom_name, new.tags, new.description"
+    old_values = "'delete', old.id, old.name, old.custom_name, old.tags, old.description"
+    c.execute(f"""CREATE TRIGGER documents_meta_trigram_ai AFTER INSERT ON documents BEGIN
+                    INSERT INTO documents_meta_trigram (rowid, {TRIGRAM_COLUMNS}) VALUES ({new_values});
+                  END""")
+    c.execute(f"""CREATE TRIGGER documents_meta_trigram_ad AFTER DELETE ON documents BEGIN
+                    INSERT INTO documents_meta_trigram (documents_meta_trigram, rowid, {TRIGRAM_COLUMNS})
+                    VALUES ({old_values});
+                  END""")
+    c.execute(f"""CREATE TRIGGER documents_meta_trigram_au
+                  AFTER UPDATE OF name, custom_name, tags, description ON documents BEGIN
+                    INSERT INTO documents_meta_trigram (documents_meta_trigram, rowid, {TRIGRAM_COLUMNS})
+                    VALUES ({old_values});
+                    INSERT INTO documents_meta_trigram (rowid, {TRIGRAM_COLUMNS}) VALUES ({new_values});
+                  END""")
+    c.execute("INSERT INTO documents_meta_trigram (documents_meta_trigram) VALUES ('rebuild')")
+
+
+def parse_tags(tags: str) -> List[str]:
+    """Split a comma-separated tag string into distinct trimmed tags (case-insensitive)"""
+    seen = set()
+    result = []
+    for tag in (tags or "").split(","):
+        tag = tag.strip()
+        if tag and tag.lower() not in seen:
+            seen.add(tag.lower())
+            result.append(tag)
+    return result
+
+
+def _link_tags(c: sqlite3.Cursor, doc_tags: Iterable[Tuple[int, str]]) -> None:
+    """Record (doc_id, comma-separated tags) pairs in tags/document_tags"""
+    pairs = [(doc_id, tag) for doc_id, tags in doc_tags for tag in parse_tags(tags)]
+    if not pairs:
+        return
+    c.executemany("INSERT OR IGNORE INTO tags (name) VALUES (?)", [(tag,) for _, tag in pairs])
+    c.executemany("""INSERT OR IGNORE INTO document_tags (doc_id, tag_id)
+                     SELECT ?, id FROM tags WHERE name = ?""", pairs)
+
+
+def _unlink_tags(c: sqlite3.Cursor, doc_id: int) -> None:
+    """Remove a document's tags, dropping tags no other document uses"""
+    c.execute("SELECT tag_id FROM document_tags WHERE doc_id = ?", (doc_id,))
+    tag_ids = [row[0] for row in c.fetchall()]
+    c.execute("DELETE FROM document_tags WHERE doc_id = ?", (doc_id,))
+    c.executemany("""DELETE FROM tags WHERE id = ?
+                     AND NOT EXISTS (SELECT 1 FROM document_tags WHERE tag_id = ?)""",
+                  [(tag_id, tag_id) for tag_id in tag_ids])
+
+
+def _migrate_to_v8(c: sqlite3.Cursor) -> None:
+    """Normalized tags, one row per (document, tag), replacing LIKE over documents.tags"""
+    c.execute("""CREATE TABLE IF NOT EXISTS tags
+                 (id INTEGER PRIMARY KEY,
+                  name TEXT NOT NULL UNIQUE COLLATE NOCASE)""")
+    c.execute("""CREATE TABLE IF NOT EXISTS document_tags
+                 (doc_id INTEGER NOT NULL,
+                  tag_id INTEGER NOT NULL,
+                  PRIMARY KEY (doc_id, tag_id),
+                  FOREIGN KEY (doc_id) REFERENCES documents (id),
+                  FOREIGN KEY (tag_id) REFERENCES tags (id)) WITHOUT ROWID""")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_document_tags_tag ON document_tags(tag_id, doc_id)")
+    # Tag searches no longer read documents.tags
+    c.execute("DROP INDEX IF EXISTS idx_tags")
+    _link_tags(c, c.connection.execute("SELECT id, tags FROM documents WHERE tags <> ''").fetchall())
+
+
+def _migrate_to_v9(c: sqlite3.Cursor) -> None:
+    """Checkpoints for resumable FTS rebuilds. The FTS triggers now only replay a
+    'delete' for rows that are indexed, so writes made while a rebuild has emptied
+    (part of) an index cannot corrupt it."""
+    c.execute("""CREATE TABLE IF NOT EXISTS fts_rebuild_state
+                 (index_name TEXT PRIMARY KEY,
+                  mode TEXT NOT NULL,
+                  last_id INTEGER NOT NULL,
+                  done INTEGER NOT NULL,
+                  total INTEGER NOT NULL,
+                  updated_at TEXT NOT NULL)""")
+
+    def indexed(index: str, row_id: str) -> str:
+        return f"EXISTS (SELECT 1 FROM {index}_docsize WHERE id = {row_id})"
+
+    doc_content = "COALESCE((SELECT content FROM extracted_texts WHERE doc_id = {}.id), '')"
+    for trigger in ("documents_fts_ad", "documents_fts_au", "extracted_texts_fts_ai",
+                    "extracted_texts_fts_ad", "extracted_texts_fts_au", "chunks_fts_ad", "chunks_fts_au",
+                    "documents_meta_trigram_ad", "documents_meta_trigram_au"):
+        c.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+
+    c.execute(f"""CREATE TRIGGER documents_fts_ad AFTER DELETE ON documents
+                  WHEN {indexed('documents_fts', 'old.id')} BEGIN
+                    INSERT INTO documents_fts (documents_fts, rowid, {FTS_COLUMNS})
+                    VALUES ('delete', old.id, old.name, COALESCE(old.custom_name, ''),
+                            {doc_content.format('old')},
+                            COALESCE(old.tags, ''), COALESCE(old.description, ''));
+                  END""")
+    c.execute(f"""CREATE TRIGGER documents_fts_au
+                  AFTER UPDATE OF name, custom_name, tags, description ON documents BEGIN
+                    INSERT INTO documents_fts (documents_fts, rowid, {FTS_COLUMNS})
+                    SELECT 'delete', old.id, old.name, COALESCE(old.custom_name, ''),
+                           {doc_content.format('old')},
+                           COALESCE(old.tags, ''), COALESCE(old.description, '')
+                    WHERE {indexed('documents_fts', 'old.id')};
+                    INSERT INTO documents_fts (rowid, {FTS_COLUMNS})
+                    VALUES (new.id, new.name, COALESCE(new.custom_name, ''),
+                            {doc_content.format('new')},
+                            COALESCE(new.tags, ''), COALESCE(new.description, ''));
+                  END""")
+
+    def replace_content(old_content: str, new_content: str, doc_id: str) -> str:
+        return f"""INSERT INTO documents_fts (documents_fts, rowid, {FTS_COLUMNS})
+                   SELECT 'delete', d.id, d.name, COALESCE(d.custom_name, ''), {old_content},
+                          COALESCE(d.tags, ''), COALESCE(d.description, '')
+                   FROM documents d WHERE d.id = {doc_id} AND {indexed('documents_fts', 'd.id')};
+                   INSERT INTO documents_fts (rowid, {FTS_COLUMNS})
+                   SELECT d.id, d.name, COALESCE(d.custom_name, ''), {new_content},
+                          COALESCE(d.tags, ''), COALESCE(d.description, '')
+                   FROM documents d WHERE d.id = {doc_id};"""
+
+    c.execute(f"""CREATE TRIGGER extracted_texts_fts_ai AFTER INSERT ON extracted_texts BEGIN
+                    {replace_content("''", "COALESCE(new.content, '')", "new.doc_id")}
+                  END""")
+    c.execute(f"""CREATE TRIGGER extracted_texts_fts_ad AFTER DELETE ON extracted_texts BEGIN
+                    {replace_content("COALESCE(old.content, '')", "''", "old.doc_id")}
+                  END""")
+    c.execute(f"""CREATE TRIGGER extracted_texts_fts_au AFTER UPDATE OF content ON extracted_texts BEGIN
+                    {replace_content("COALESCE(old.content, '')", "COALESCE(new.content, '')", "new.doc_id")}
+                  END""")
+
+    c.execute(f"""CREATE TRIGGER chunks_fts_ad AFTER DELETE ON document_chunks
+                  WHEN {indexed('chunks_fts', 'old.id')} BEGIN
+                    INSERT INTO chunks_fts (chunks_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                  END""")
+    c.execute(f"""CREATE TRIGGER chunks_fts_au AFTER UPDATE OF content ON document_chunks BEGIN
+                    INSERT INTO chunks_fts (chunks_fts, rowid, content)
+                    SELECT 'delete', old.id, old.content WHERE {indexed('chunks_fts', 'old.id')};
+                    INSERT INTO chunks_fts (rowid, content) VALUES (new.id, new.content);
+                  END""")
+
+    if not TRIGRAM_SUPPORTED:
+        return
+    new_values = "new.id, new.name, new.custom_name, new.tags, new.description"
+    old_values = "'delete', old.id, old.name, old.custom_name, old.tags, old.description"
+    c.execute(f"""CREATE TRIGGER documents_meta_trigram_ad AFTER DELETE ON documents
+                  WHEN {indexed('documents_meta_trigram', 'old.id')} BEGIN
+                    INSERT INTO documents_meta_trigram (documents_meta_trigram, rowid, {TRIGRAM_COLUMNS})
+                    VALUES ({old_values});
+                  END""")
+    c.execute(f"""CREATE TRIGGER documents_meta_trigram_au
+                  AFTER UPDATE OF name, custom_name, tags, description ON documents BEGIN
+                    INSERT INTO documents_meta_trigram (documents_meta_trigram, rowid, {TRIGRAM_COLUMNS})
+                    SELECT {old_values} WHERE {indexed('documents_meta_trigram', 'old.id')};
+                    INSERT INTO documents_meta_trigram (rowid, {TRIGRAM_COLUMNS}) VALUES ({new_values});
+                  END""")
+
+
+def _migrate_to_v10(c: sqlite3.Cursor) -> None:
+    """Ledger of files picked up by the watch-folder daemon, so restarts skip them"""
+    c.execute("""CREATE TABLE IF NOT EXISTS processed_files
+                 (path TEXT PRIMARY KEY,
+                  file_size INTEGER NOT NULL,
+                  mtime_ns INTEGER NOT NULL,
+                  doc_id INTEGER,
+                  error TEXT,
+                  processed_at TEXT NOT NULL) WITHOUT ROWID""")
+
+
+MIGRATIONS = [
+    (1, _migrate_to_v1),
+    (2, _migrate_to_v2),
+    (3, _migrate_to_v3),
+    (4, _migrate_to_v4),
+    (5, _migrate_to_v5),
+    (6, _migrate_to_v6),
+    (7, _migrate_to_v7),
+    (8, _migrate_to_v8),
+    (9, _migrate_to_v9),
+    (10, _migrate_to_v10),
+]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _has_fts_tail_drift(conn: sqlite3.Connection) -> bool:
+    """Cheap drift check: documents newer than the highest indexed rowid"""
+    max_doc = conn.execute("SELECT MAX(id) FROM documents").fetchone()[0] or 0
+    max_fts = conn.execute("SELECT MAX(id) FROM documents_fts_docsize").fetchone()[0] or 0
+    return max_doc > max_fts
+
+
+def init_db(db_path: str = DB_PATH) -> None:
+    """Bring the schema up to SCHEMA_VERSION; only a version check when already current"""
+    ensure_db_dir(db_path)
+    store = get_store(db_path)
+    conn = store.connection()
+    try:
+        version = get_schema_version(conn)
+        if version > SCHEMA_VERSION:
+            raise RuntimeError(f"Database schema version {version} is newer than supported "
+                               f"version {SCHEMA_VERSION}")
+        if version == SCHEMA_VERSION:
+            # An interrupted rebuild leaves the index short too; rebuild_fts_index
+            # finishes it in batches rather than in one transaction here
+            if not pending_fts_rebuilds(db_path) and _has_fts_tail_drift(conn):
+                _sync_fts_tail(conn)
+                store.invalidate()
+            return
+
+        c = conn.cursor()
+        vacuum = False
+        for target_version, migrate in MIGRATIONS:
+            if version < target_version:
+                # Explicit BEGIN so the DDL in each migration is atomic too. The version
+                # is read again under the write lock, since another process may have
+                # applied this migration since it was last read.
+                c.execute("BEGIN IMMEDIATE")
+                version = get_schema_version(conn)
+                if version < target_version:
+                    migrate(c)
+                    c.execute(f"PRAGMA user_version = {target_version}")
+                    vacuum = vacuum or (version > 0 and target_version in VACUUM_AFTER_VERSIONS)
+                    version = target_version
+                conn.commit()
+        if vacuum:
+            c.execute("VACUUM")
+        store.invalidate()
+    except Exception:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+
+
+def _sync_fts_tail(conn: sqlite3.Connection) -> int:
+    """Index documents newer than the highest indexed rowid; rows missing anywhere
+    else are left to rebuild_fts_index(mode="missing")"""
+    c = conn.cursor()
+    # documents_fts_docsize holds one row per indexed document; reading rowids from
+    # documents_fts itself would go through to the content view.
+    max_fts = c.execute("SELECT MAX(id) FROM documents_fts_docsize").fetchone()[0] or 0
+    c.execute(f"""INSERT INTO documents_fts (rowid, {FTS_COLUMNS})
+                  {FTS_SOURCE_SELECT}
+                  WHERE id > ?""", (max_fts,))
+    added = c.rowcount
     conn.commit()
-    conn.close()
+    return added
 
 
 def insert_document(name: str, custom_name: str, path: str, original_format: str,
                    is_machine_readable: bool, readable: bool, extracted_text_path: str,
                    output_format: str, output_path: str, processing_method: str,
                    file_size: int = 0, word_count: int = 0, tags: str = "",
-                   description: str = "", extracted_text: str = "",
+                   description: str = "", extracted_text: str = "", content_hash: str = "",
+                   page_methods: Optional[List[str]] = None, chunks: Optional[Iterable[str]] = None,
                    db_path: str = DB_PATH) -> int:
-    """Fixed document insertion with proper FTS population"""
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
-
+    """Insert a document, its extracted text, per-page methods and passages; the FTS
+    indexes are updated by triggers"""
     timestamp = datetime.datetime.utcnow().isoformat()
 
-    c.execute("""INSERT INTO documents (name, custom_name, path, original_format, is_machine_readable,
-                 readable, extracted_text_path, output_format, output_path, processing_method,
-                 file_size, word_count, tags, description, ingested_at, updated_at)
-                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-              (name, custom_name, path, original_format, int(is_machine_readable), int(readable),
-               extracted_text_path, output_format, output_path, processing_method, file_size,
-               word_count, tags, description, timestamp, timestamp))
+    with get_store(db_path).transaction() as conn:
+        c = conn.cursor()
+        c.execute("""INSERT INTO documents (name, custom_name, path, original_format, is_machine_readable,
+                     readable, extracted_text_path, output_format, output_path, processing_method,
+                     file_size, word_count, tags, description, content_hash, ingested_at, updated_at)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                  (name, custom_name, path, original_format, int(is_machine_readable), int(readable),
+                   extracted_text_path, output_format, output_path, processing_method, file_size,
+                   word_count, tags, description, content_hash or None, timestamp, timestamp))
 
-    doc_id = c.lastrowid
+        doc_id = c.lastrowid
 
-    if extracted_text:
-        c.execute("INSERT OR REPLACE INTO extracted_texts (doc_id, content) VALUES (?, ?)",
-                  (doc_id, extracted_text))
+        # documents_fts is maintained by triggers on documents and extracted_texts
+        if extracted_text:
+            c.execute("""INSERT INTO extracted_texts (doc_id, content) VALUES (?, ?)
+                         ON CONFLICT(doc_id) DO UPDATE SET content = excluded.content""",
+                      (doc_id, extracted_text))
+        if page_methods:
+            c.executemany("INSERT INTO document_pages (doc_id, page_number, method) VALUES (?, ?, ?)",
+                          [(doc_id, number, method) for number, method in enumerate(page_methods, 1)])
+        if chunks:
+            c.executemany("INSERT INTO document_chunks (doc_id, chunk_number, content) VALUES (?, ?, ?)",
+                          ((doc_id, number, passage) for number, passage in enumerate(chunks)))
+        _link_tags(c, [(doc_id, tags)])
+    return doc_id
 
-    c.execute("""INSERT INTO documents_fts (doc_id, name, custom_name, content, tags, description)
-                 VALUES (?, ?, ?, ?, ?, ?)""",
-              (doc_id, name, custom_name or "", extracted_text or "", tags or "", description or ""))
 
-    conn.commit()
-    conn.close()
-    return doc_id
+def insert_documents(records: Iterable[dict], batch_size: int = BULK_INSERT_BATCH_SIZE,
+                     db_path: str = DB_PATH) -> List[int]:
+    """Bulk-insert document records (dicts of ``insert_document`` keyword arguments).
+
+    A record's optional ``chunks`` is an iterable of passages (see split_passages).
+    Rows are written with executemany in transactions of ``batch_size`` documents;
+    ids are assigned up front inside each write-locked transaction. Returns the new
+    ids in input order. The FTS index is updated by the same triggers as single inserts.
+    """
+    store = get_store(db_path)
+    conn = store.connection()
+    doc_ids = []
+    batch = []
+
+    def flush():
+        timestamp = datetime.datetime.utcnow().isoformat()
+        with conn:
+            c = conn.cursor()
+            c.execute("BEGIN IMMEDIATE")
+            first_id = c.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM documents").fetchone()[0]
+            ids = list(range(first_id, first_id + len(batch)))
+            c.executemany("""INSERT INTO documents (id, name, custom_name, path, original_format,
+                             is_machine_readable, readable, extracted_text_path, output_format,
+                             output_path, processing_method, file_size, word_count, tags, description,
+                             content_hash, ingested_at, updated_at)
+                             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                          [(doc_id, r["name"], r.get("custom_name"), r["path"], r.get("original_format"),
+                            int(r.get("is_machine_readable", False)), int(r.get("readable", False)),
+                            r.get("extracted_text_path", ""), r.get("output_format", ""),
+                            r.get("output_path", ""), r.get("processing_method", ""),
+                            r.get("file_size", 0), r.get("word_count", 0), r.get("tags", ""),
+                            r.get("description", ""), r.get("content_hash") or None, timestamp, timestamp)
+                           for doc_id, r in zip(ids, batch)])
+            c.executemany("INSERT INTO extracted_texts (doc_id, content) VALUES (?, ?)",
+                          [(doc_id, r["extracted_text"]) for doc_id, r in zip(ids, batch)
+                           if r.get("extracted_text")])
+            c.executemany("INSERT INTO document_pages (doc_id, page_number, method) VALUES (?, ?, ?)",
+                          [(doc_id, number, method) for doc_id, r in zip(ids, batch)
+                           for number, method in enumerate(r.get("page_methods") or (), 1)])
+            # A generator, so passages of very large documents are never all in memory
+            c.executemany("INSERT INTO document_chunks (doc_id, chunk_number, content) VALUES (?, ?, ?)",
+                          ((doc_id, number, passage) for doc_id, r in zip(ids, batch)
+                           for number, passage in enumerate(r.get("chunks") or ())))
+            _link_tags(c, [(doc_id, r.get("tags", "")) for doc_id, r in zip(ids, batch)])
+        store.invalidate()
+        doc_ids.extend(ids)
+        batch.clear()
+
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return doc_ids
+
+
+def update_documents(updates: Iterable[Tuple[int, str, str, str, str, str]],
+                     db_path: str = DB_PATH) -> List[str]:
+    """Set (doc_id, custom_name, tags, description, output_format, output_path) of existing
+    documents; returns replaced output files that no document refers to any more"""
+    updates = list(updates)
+    if not updates:
+        return []
+    timestamp = datetime.datetime.utcnow().isoformat()
+    orphaned = []
+    with get_store(db_path).transaction() as conn:
+        c = conn.cursor()
+        for doc_id, custom_name, tags, description, output_format, output_path in updates:
+            row = c.execute("SELECT output_path, content_hash FROM documents WHERE id = ?", (doc_id,)).fetchone()
+            if row is None:
+                continue
+            c.execute("""UPDATE documents SET custom_name = ?, tags = ?, description = ?, output_format = ?,
+                         output_path = ?, updated_at = ? WHERE id = ?""",
+                      (custom_name, tags, description, output_format, output_path, timestamp, doc_id))
+            _unlink_tags(c, doc_id)
+            _link_tags(c, [(doc_id, tags)])
+            old_output, content_hash = row
+            # Outputs can only be shared between copies of the same content
+            if old_output and old_output != output_path and not c.execute(
+                    "SELECT 1 FROM documents WHERE content_hash IS ? AND output_path = ?",
+                    (content_hash, old_output)).fetchone():
+                orphaned.append(old_output)
+    return orphaned
 
 
 def sanitize_fts_query(query: str) -> str:
@@ -115,151 +797,565 @@ def sanitize_fts_query(query: str) -> str:
         return f'{words[0]}*'
 
 
-def search_documents(query: str, search_type: str = "all", readability_filter: str = "all",
-                     db_path: str = DB_PATH) -> list:
-    if not query.strip():
-        return get_all_documents(readability_filter, db_path)
+DOCUMENT_COLUMNS = ("id", "name", "custom_name", "path", "original_format", "is_machine_readable",
+                    "readable", "extracted_text_path", "output_format", "output_path",
+                    "processing_method", "file_size", "word_count", "tags", "description",
+                    "ingested_at", "updated_at")
+
+# Columns returned by listing/search queries, in row order. Full text is never
+# selected here; use get_document_content() when a document is opened.
+LISTING_COLUMNS = ("id", "name", "custom_name", "original_format", "is_machine_readable",
+                   "readable", "file_size", "word_count", "tags", "updated_at")
+
+LISTING_FIELDS = ", ".join("d." + col for col in LISTING_COLUMNS)
+
+# Rows of the paged search/browse API: the listing columns, the ranking score
+# (weighted bm25, lower is better) and a snippet of the best-matching column with
+# matched terms between HIGHLIGHT_START and HIGHLIGHT_END. The score is NULL for
+# unranked results and the snippet '' for rows not found through the full-text index.
+SEARCH_COLUMNS = LISTING_COLUMNS + ("score", "snippet")
+
+HIGHLIGHT_START = "\u00ab"
+HIGHLIGHT_END = "\u00bb"
+SNIPPET_ELLIPSIS = "\u2026"
+
+RANK_EXPRESSION = f"bm25(documents_fts, {', '.join(str(w) for w in FTS_RANK_WEIGHTS)})"
 
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
 
-    base_query = """SELECT d.*, et.content FROM documents d 
-                    LEFT JOIN extracted_texts et ON d.id = et.doc_id"""
+# One way of answering a search. Strategies for a search type are tried in order
+# until one returns rows; the winning strategy's name is carried in the page cursor
+# so later pages keep using it. order is "recent" (updated_at DESC, id DESC) or
+# "rank" (score ascending, i.e. best match first); rank strategies join their
+# (id, score) rows as hits and carry their FTS query in match so snippets can be
+# built for the returned page.
+SearchStrategy = namedtuple("SearchStrategy", "name order joins where params match",
+                            defaults=(None,))
 
-    readability_condition = ""
+FTS_HITS = f"SELECT rowid AS id, {RANK_EXPRESSION} AS score FROM documents_fts WHERE documents_fts MATCH ?"
+
+# Score of substring matches merged into a ranking; bm25 scores are negative, so
+# these come after every full-text hit
+SUBSTRING_SCORE = 0
+
+
+def _readability_condition(readability_filter: str) -> str:
     if readability_filter == "machine_readable":
-        readability_condition = " AND d.is_machine_readable = 1"
+        return " AND d.is_machine_readable = 1"
     elif readability_filter == "non_machine_readable":
-        readability_condition = " AND d.is_machine_readable = 0"
+        return " AND d.is_machine_readable = 0"
+    return ""
+
+
+def _fts_or_query(query: str) -> str:
+    word_queries = [f'{word}*' for word in query.split() if word.strip()]
+    return " OR ".join(word_queries)
+
+
+def _like_prefix(text: str) -> str:
+    """LIKE pattern (ESCAPE '\\') matching strings that start with text"""
+    return re.sub(r"([\\%_])", r"\\\1", text) + "%"
+
+
+def _fts_phrase(text: str) -> str:
+    """Quote text as a single FTS5 string, matched as a substring by the trigram index"""
+    return '"' + text.replace('"', '""') + '"'
 
-    try:
-        if search_type == "name":
-            sql = f"""{base_query}
-                      WHERE (d.name LIKE ? OR d.custom_name LIKE ?)
-                      {readability_condition}
-                      ORDER BY d.updated_at DESC"""
-            c.execute(sql, (f"%{query}%", f"%{query}%"))
-
-        elif search_type == "content":
-            fts_query = sanitize_fts_query(query)
-            try:
-                sql = f"""{base_query}
-                          INNER JOIN documents_fts fts ON d.id = fts.doc_id
-                          WHERE documents_fts MATCH ?
-                          {readability_condition}
-                          ORDER BY bm25(documents_fts) DESC"""
-                c.execute(sql, (fts_query,))
-                results = c.fetchall()
-                if not results and " " in query:
-                    words = query.split()
-                    word_queries = [f'{word}*' for word in words if word.strip()]
-                    if word_queries:
-                        fts_query = " OR ".join(word_queries)
-                        c.execute(sql, (fts_query,))
-                        results = c.fetchall()
-                if not results:
-                    sql = f"""{base_query}
-                              WHERE et.content LIKE ?
-                              {readability_condition}
-                              ORDER BY d.updated_at DESC"""
-                    c.execute(sql, (f"%{query}%",))
-                conn.close()
-                return results
-            except Exception as fts_error:
-                print(f"FTS search failed: {fts_error}")
-                sql = f"""{base_query}
-                          WHERE et.content LIKE ?
-                          {readability_condition}
-                          ORDER BY d.updated_at DESC"""
-                c.execute(sql, (f"%{query}%",))
-
-        elif search_type == "tags":
-            sql = f"""{base_query}
-                      WHERE d.tags LIKE ?
-                      {readability_condition}
-                      ORDER BY d.updated_at DESC"""
-            c.execute(sql, (f"%{query}%",))
 
+def _search_strategies(query: str, search_type: str, trigram_index: bool = False) -> list:
+    like = f"%{query}%"
+    content_like = "d.id IN (SELECT doc_id FROM extracted_texts WHERE content LIKE ?)"
+
+    if search_type == "name":
+        return [SearchStrategy("name", "recent", "", "(d.name LIKE ? OR d.custom_name LIKE ?)",
+                               (like, like))]
+
+    if search_type == "tags":
+        # Every tag in the query must be present: exact names first, then prefixes
+        tags = parse_tags(query)
+        if not tags:
+            return []
+        has_tag = """d.id IN (SELECT dt.doc_id FROM document_tags dt
+                              INNER JOIN tags t ON t.id = dt.tag_id WHERE {})"""
+        exact = " AND ".join(has_tag.format("t.name = ?") for _ in tags)
+        prefix = " AND ".join(has_tag.format("t.name LIKE ? ESCAPE '\\'") for _ in tags)
+        return [SearchStrategy("tags_exact", "recent", "", exact, tuple(tags)),
+                SearchStrategy("tags_prefix", "recent", "", prefix,
+                               tuple(_like_prefix(tag) for tag in tags))]
+
+    if search_type == "content":
+        strategies = _fts_strategies("content", query)
+        strategies.append(SearchStrategy("content_like", "recent", "", content_like, (like,)))
+        return strategies
+
+    # Every field is in the full-text index, ranked with name and tags above content,
+    # and metadata substrings (e.g. "voice" in invoice.pdf) are merged in from the
+    # trigram index, or from LIKE over the metadata columns without one. Queries too
+    # short for trigrams rely on the FTS prefix match alone, and content is never
+    # searched by substring: either would scan every document.
+    substring = None
+    if len(query.strip()) >= 3:
+        if trigram_index:
+            substring = ("SELECT rowid AS id FROM documents_meta_trigram WHERE documents_meta_trigram MATCH ?",
+                         (_fts_phrase(query.strip()),))
+        else:
+            substring = ("""SELECT id FROM documents
+                            WHERE name LIKE ? OR custom_name LIKE ? OR tags LIKE ? OR description LIKE ?""",
+                         (like, like, like, like))
+    return _fts_strategies("all", query, substring)
+
+
+def _fts_strategies(prefix: str, query: str, substring: Optional[tuple] = None) -> list:
+    """Ranked full-text strategies: the whole query, then any of its words. ``substring``
+    is the (SQL, params) of further matching ids to merge in at SUBSTRING_SCORE."""
+    fts_queries = [("fts", sanitize_fts_query(query))]
+    if " " in query:
+        fts_queries.append(("fts_or", _fts_or_query(query)))
+    strategies = []
+    for suffix, fts_query in fts_queries:
+        hits, params = FTS_HITS, (fts_query,)
+        if substring:
+            hits = f"""SELECT id, MIN(score) AS score
+                       FROM ({FTS_HITS} UNION ALL SELECT id, {SUBSTRING_SCORE} FROM ({substring[0]}))
+                       GROUP BY id"""
+            params += substring[1]
+        strategies.append(SearchStrategy(f"{prefix}_{suffix}", "rank",
+                                         f"INNER JOIN ({hits}) hits ON hits.id = d.id", "1",
+                                         params, fts_query))
+    return strategies
+
+
+def _page_query(strategy: SearchStrategy, readability_condition: str, page_size: Optional[int],
+                after: Optional[tuple]) -> Tuple[str, list]:
+    """SQL and parameters for one keyset page of a strategy"""
+    params = list(strategy.params)
+    limit = ""
+    if page_size:
+        limit = "LIMIT ?"
+
+    if strategy.order == "rank":
+        keyset = "WHERE (score, id) > (?, ?)" if after else ""
+        # Snippets are built in the outer query, so only for the rows of this page
+        sql = f"""SELECT page.*, COALESCE((SELECT snippet(documents_fts, -1, ?, ?, ?, ?) FROM documents_fts
+                                          WHERE documents_fts MATCH ? AND documents_fts.rowid = page.id), '')
+                  FROM (SELECT * FROM (
+                            SELECT {LISTING_FIELDS}, hits.score AS score
+                            FROM documents d {strategy.joins}
+                            WHERE {strategy.where} {readability_condition})
+                        {keyset}
+                        ORDER BY score, id {limit}) page
+                  ORDER BY page.score, page.id"""
+        params = [HIGHLIGHT_START, HIGHLIGHT_END, SNIPPET_ELLIPSIS, SNIPPET_TOKENS, strategy.match] + params
+    else:
+        keyset = "AND (d.updated_at, d.id) < (?, ?)" if after else ""
+        sql = f"""SELECT {LISTING_FIELDS}, NULL, ''
+                  FROM documents d {strategy.joins}
+                  WHERE {strategy.where} {readability_condition} {keyset}
+                  ORDER BY d.updated_at DESC, d.id DESC {limit}"""
+
+    if after:
+        params.extend(after)
+    if page_size:
+        params.append(page_size + 1)
+    return sql, params
+
+
+def _fetch_page(c: sqlite3.Cursor, strategy: SearchStrategy, readability_condition: str,
+                page_size: Optional[int], after: Optional[tuple]) -> Tuple[list, Optional[tuple]]:
+    """Run one strategy with keyset pagination; returns (rows, next_cursor)"""
+    c.execute(*_page_query(strategy, readability_condition, page_size, after))
+    rows = c.fetchall()
+
+    next_cursor = None
+    if page_size and len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        if strategy.order == "rank":
+            next_cursor = (strategy.name, last[SEARCH_COLUMNS.index("score")], last[0])
         else:
-            fts_query = sanitize_fts_query(query)
+            next_cursor = (strategy.name, last[SEARCH_COLUMNS.index("updated_at")], last[0])
+    return rows, next_cursor
+
+
+def search_documents_page(query: str, search_type: str = "all", readability_filter: str = "all",
+                          page_size: Optional[int] = SEARCH_PAGE_SIZE, cursor: Optional[tuple] = None,
+                          db_path: str = DB_PATH) -> Tuple[list, Optional[tuple]]:
+    """Return one page of search results and the cursor for the next page (None when done).
+
+    Rows contain SEARCH_COLUMNS, best match first for full-text results. Pass the
+    returned cursor back unchanged to continue; page_size=None returns everything.
+    Pages are served from the store's result cache until the next write; unpaged
+    results, which can hold every document, are not cached.
+    """
+    if not query.strip():
+        return get_documents_page(readability_filter, page_size, cursor, db_path)
+
+    store = get_store(db_path)
+    key = ("search", query, search_type, readability_filter, page_size, cursor) if page_size else None
+    cached = store.cache_get(key) if key else None
+    if cached is not None:
+        return list(cached[0]), cached[1]
+    generation = store.generation
+
+    strategies = _search_strategies(query, search_type, _has_trigram_index(store))
+    after = None
+    if cursor:
+        strategies = [s for s in strategies if s.name == cursor[0]]
+        after = tuple(cursor[1:])
+
+    c = store.connection().cursor()
+    try:
+        readability_condition = _readability_condition(readability_filter)
+        page = [], None
+        for strategy in strategies:
             try:
-                sql = f"""SELECT DISTINCT d.*, et.content FROM documents d 
-                          LEFT JOIN extracted_texts et ON d.id = et.doc_id
-                          LEFT JOIN documents_fts fts ON d.id = fts.doc_id
-                          WHERE (d.name LIKE ? OR d.custom_name LIKE ? OR d.tags LIKE ? OR d.description LIKE ?
-                                 OR (documents_fts MATCH ? AND fts.doc_id IS NOT NULL))
-                          {readability_condition}
-                          ORDER BY d.updated_at DESC"""
-                c.execute(sql, (f"%{query}%", f"%{query}%", f"%{query}%", f"%{query}%", fts_query))
-                results = c.fetchall()
-                if not results and " " in query:
-                    words = query.split()
-                    word_queries = [f'{word}*' for word in words if word.strip()]
-                    if word_queries:
-                        fts_query = " OR ".join(word_queries)
-                        c.execute(sql, (f"%{query}%", f"%{query}%", f"%{query}%", f"%{query}%", fts_query))
-                        results = c.fetchall()
-                conn.close()
-                return results
-            except Exception as fts_error:
+                rows, next_cursor = _fetch_page(c, strategy, readability_condition, page_size, after)
+            except sqlite3.OperationalError as fts_error:
                 print(f"FTS search failed: {fts_error}")
-                sql = f"""SELECT DISTINCT d.*, et.content FROM documents d 
-                          LEFT JOIN extracted_texts et ON d.id = et.doc_id
-                          WHERE (d.name LIKE ? OR d.custom_name LIKE ? OR d.tags LIKE ? OR d.description LIKE ?
-                                 OR et.content LIKE ?)
-                          {readability_condition}
-                          ORDER BY d.updated_at DESC"""
-                c.execute(sql, (f"%{query}%", f"%{query}%", f"%{query}%", f"%{query}%", f"%{query}%"))
-
-        results = c.fetchall()
-        conn.close()
-        return results
+                continue
+            if rows or cursor:
+                page = rows, next_cursor
+                break
     except Exception as e:
         print(f"Search error: {e}")
-        conn.close()
-        return []
+        return [], None
+    rows, next_cursor = store.cache_put(key, page, generation) if key else page
+    return list(rows), next_cursor
+
+
+def explain_search_plan(query: str, search_type: str = "all", readability_filter: str = "all",
+                        page_size: Optional[int] = SEARCH_PAGE_SIZE, db_path: str = DB_PATH) -> dict:
+    """EXPLAIN QUERY PLAN details of the first page of every strategy of a search,
+    as {strategy name: [plan detail, ...]}"""
+    store = get_store(db_path)
+    c = store.connection().cursor()
+    readability_condition = _readability_condition(readability_filter)
+    plans = {}
+    for strategy in _search_strategies(query, search_type, _has_trigram_index(store)):
+        sql, params = _page_query(strategy, readability_condition, page_size, None)
+        c.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        plans[strategy.name] = [row[-1] for row in c.fetchall()]
+    return plans
+
+
+def get_documents_page(readability_filter: str = "all", page_size: Optional[int] = SEARCH_PAGE_SIZE,
+                       cursor: Optional[tuple] = None,
+                       db_path: str = DB_PATH) -> Tuple[list, Optional[tuple]]:
+    """Browse documents newest first, one keyset page at a time (cached like searches)"""
+    store = get_store(db_path)
+    key = ("browse", readability_filter, page_size, cursor) if page_size else None
+    cached = store.cache_get(key) if key else None
+    if cached is not None:
+        return list(cached[0]), cached[1]
+    generation = store.generation
+    strategy = SearchStrategy("browse", "recent", "", "1", ())
+    page = _fetch_page(store.connection().cursor(), strategy, _readability_condition(readability_filter),
+                       page_size, tuple(cursor[1:]) if cursor else None)
+    rows, next_cursor = store.cache_put(key, page, generation) if key else page
+    return list(rows), next_cursor
+
+
+def search_cache_stats(db_path: str = DB_PATH) -> dict:
+    """Hit/miss counts, size and write generation of a database's search result cache"""
+    return get_store(db_path).cache_stats()
+
+
+def search_documents(query: str, search_type: str = "all", readability_filter: str = "all",
+                     db_path: str = DB_PATH) -> list:
+    """Search documents without paging; rows contain SEARCH_COLUMNS"""
+    rows, _ = search_documents_page(query, search_type, readability_filter, None, None, db_path)
+    return rows
 
 
 def get_all_documents(readability_filter: str = "all", db_path: str = DB_PATH) -> list:
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
+    """List documents newest first without paging; rows contain SEARCH_COLUMNS"""
+    rows, _ = get_documents_page(readability_filter, None, None, db_path)
+    return rows
 
-    base_query = """SELECT d.*, et.content FROM documents d 
-                    LEFT JOIN extracted_texts et ON d.id = et.doc_id"""
 
-    if readability_filter == "machine_readable":
-        base_query += " WHERE d.is_machine_readable = 1"
-    elif readability_filter == "non_machine_readable":
-        base_query += " WHERE d.is_machine_readable = 0"
+def get_document(doc_id: int, db_path: str = DB_PATH):
+    """Return the full documents row plus a has_content flag, without loading the text"""
+    columns = ", ".join("d." + col for col in DOCUMENT_COLUMNS)
+    c = get_store(db_path).connection().cursor()
+    c.execute(f"""SELECT {columns}, et.doc_id IS NOT NULL FROM documents d
+                  LEFT JOIN extracted_texts et ON d.id = et.doc_id
+                  WHERE d.id = ?""", (doc_id,))
+    return c.fetchone()
 
-    base_query += " ORDER BY d.updated_at DESC"
 
-    c.execute(base_query)
-    results = c.fetchall()
-    conn.close()
-    return results
+def get_document_content(doc_id: int, db_path: str = DB_PATH) -> str:
+    c = get_store(db_path).connection().cursor()
+    c.execute("SELECT content FROM extracted_texts WHERE doc_id = ?", (doc_id,))
+    result = c.fetchone()
+    return result[0] if result and result[0] else ""
 
 
-def rebuild_fts_index(db_path: str = DB_PATH) -> None:
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
+def get_document_pages(doc_id: int, db_path: str = DB_PATH) -> List[Tuple[int, str]]:
+    """(page_number, method) for each recorded page of a document, in page order"""
+    c = get_store(db_path).connection().cursor()
+    c.execute("SELECT page_number, method FROM document_pages WHERE doc_id = ? ORDER BY page_number",
+              (doc_id,))
+    return c.fetchall()
+
+
+def find_tags(prefix: str = "", exact: bool = False, readability_filter: str = "all",
+              limit: Optional[int] = SEARCH_PAGE_SIZE, db_path: str = DB_PATH) -> List[Tuple[str, int]]:
+    """(tag, document count) pairs for tags equal to / starting with ``prefix``
+    (case-insensitive), most used first. An empty prefix lists every tag."""
+    params = []
+    condition = "1"
+    if prefix:
+        condition = "t.name = ?" if exact else "t.name LIKE ? ESCAPE '\\'"
+        params.append(prefix if exact else _like_prefix(prefix))
+    joins = ""
+    readability_condition = _readability_condition(readability_filter)
+    if readability_condition:
+        joins = "INNER JOIN documents d ON d.id = dt.doc_id"
+    params.append(-1 if limit is None else limit)
+    c = get_store(db_path).connection().cursor()
+    c.execute(f"""SELECT t.name, COUNT(*) AS doc_count
+                  FROM tags t
+                  INNER JOIN document_tags dt ON dt.tag_id = t.id {joins}
+                  WHERE {condition} {readability_condition}
+                  GROUP BY t.id
+                  ORDER BY doc_count DESC, t.name LIMIT ?""", params)
+    return c.fetchall()
+
+
+def count_document_chunks(doc_id: int, db_path: str = DB_PATH) -> int:
+    c = get_store(db_path).connection().cursor()
+    c.execute("SELECT COUNT(*) FROM document_chunks WHERE doc_id = ?", (doc_id,))
+    return c.fetchone()[0]
+
+
+def get_document_chunks(doc_id: int, first_chunk: int = 0, count: Optional[int] = None,
+                        db_path: str = DB_PATH) -> List[Tuple[int, str]]:
+    """(chunk_number, content) for ``count`` passages starting at ``first_chunk``"""
+    c = get_store(db_path).connection().cursor()
+    c.execute("""SELECT chunk_number, content FROM document_chunks
+                 WHERE doc_id = ? AND chunk_number >= ?
+                 ORDER BY chunk_number LIMIT ?""",
+              (doc_id, first_chunk, -1 if count is None else count))
+    return c.fetchall()
+
+
+def search_passages(query: str, doc_ids: Optional[Iterable[int]] = None, per_doc: int = 1,
+                    limit: Optional[int] = SEARCH_PAGE_SIZE, db_path: str = DB_PATH) -> list:
+    """Best-matching passages for a full-text query, at most ``per_doc`` per document.
+
+    Returns (doc_id, chunk_number, content, score) rows, best match (lowest bm25)
+    first, with matched terms in content wrapped in HIGHLIGHT_START/HIGHLIGHT_END.
+    Passages are ranked on their own, so long documents are not penalised.
+    """
+    fts_query = sanitize_fts_query(query)
+    if not fts_query:
+        return []
+    params = [HIGHLIGHT_START, HIGHLIGHT_END, fts_query]
+    doc_filter = ""
+    if doc_ids is not None:
+        doc_ids = list(doc_ids)
+        doc_filter = f"AND ch.doc_id IN ({', '.join('?' * len(doc_ids))})"
+        params.extend(doc_ids)
+    params.extend([per_doc, -1 if limit is None else limit, fts_query])
+    c = get_store(db_path).connection().cursor()
     try:
-        c.execute("DELETE FROM documents_fts")
-        c.execute("""INSERT INTO documents_fts (doc_id, name, custom_name, content, tags, description)
-                     SELECT d.id, d.name, 
-                            COALESCE(d.custom_name, ''), 
-                            COALESCE(et.content, ''), 
-                            COALESCE(d.tags, ''), 
-                            COALESCE(d.description, '')
-                     FROM documents d
-                     LEFT JOIN extracted_texts et ON d.id = et.doc_id""")
-        conn.commit()
+        # highlight() runs in the outer query, so only for the passages returned
+        c.execute(f"""SELECT best.doc_id, best.chunk_number, highlight(chunks_fts, 0, ?, ?), best.score
+                      FROM (SELECT id, doc_id, chunk_number, score FROM (
+                                SELECT id, doc_id, chunk_number, score,
+                                       ROW_NUMBER() OVER (PARTITION BY doc_id ORDER BY score) AS doc_rank
+                                FROM (SELECT ch.id, ch.doc_id, ch.chunk_number, bm25(chunks_fts) AS score
+                                      FROM chunks_fts
+                                      INNER JOIN document_chunks ch ON ch.id = chunks_fts.rowid
+                                      WHERE chunks_fts MATCH ? {doc_filter}))
+                            WHERE doc_rank <= ?
+                            ORDER BY score LIMIT ?) best
+                      CROSS JOIN chunks_fts ON chunks_fts.rowid = best.id
+                      WHERE chunks_fts MATCH ?
+                      ORDER BY best.score""", params)
+        return c.fetchall()
+    except sqlite3.OperationalError as e:
+        print(f"Passage search failed: {e}")
+        return []
+
+
+def find_document_by_hash(content_hash: str, db_path: str = DB_PATH):
+    """Return the DOCUMENT_COLUMNS row of the oldest document with this content hash
+    whose stored file still exists, or None. Documents whose extraction failed are
+    skipped, so ingesting the file again retries it."""
+    columns = ", ".join(DOCUMENT_COLUMNS)
+    c = get_store(db_path).connection().cursor()
+    c.execute(f"""SELECT {columns} FROM documents
+                  WHERE content_hash = ? AND processing_method IS NOT 'failed'
+                  ORDER BY id""", (content_hash,))
+    for row in c.fetchall():
+        if os.path.exists(row[DOCUMENT_COLUMNS.index("path")]):
+            return row
+    return None
+
+
+def get_processed_files(db_path: str = DB_PATH) -> dict:
+    """{path: (file_size, mtime_ns)} of every file in the watch-folder ledger"""
+    conn = get_store(db_path).connection()
+    return {path: (file_size, mtime_ns)
+            for path, file_size, mtime_ns in conn.execute("SELECT path, file_size, mtime_ns FROM processed_files")}
+
+
+def record_processed_files(entries: Iterable[Tuple[str, int, int, Optional[int], Optional[str]]],
+                           db_path: str = DB_PATH) -> None:
+    """Record (path, file_size, mtime_ns, doc_id, error) ledger entries, replacing older ones"""
+    processed_at = datetime.datetime.now().isoformat()
+    with get_store(db_path).transaction() as conn:
+        conn.executemany("""INSERT OR REPLACE INTO processed_files
+                            (path, file_size, mtime_ns, doc_id, error, processed_at)
+                            VALUES (?, ?, ?, ?, ?, ?)""",
+                         [entry + (processed_at,) for entry in entries])
+
+
+def delete_document(doc_id: int, db_path: str = DB_PATH) -> Optional[Tuple[str, str, str]]:
+    """Delete a document's rows; returns its (path, extracted_text_path, output_path)
+    so the caller can remove the files, or None if it does not exist.
+
+    Paths still referenced by a deduplicated copy of the document are returned as ""
+    so the shared files are kept.
+    """
+    with get_store(db_path).transaction() as conn:
+        c = conn.cursor()
+        c.execute("SELECT path, extracted_text_path, output_path, content_hash FROM documents WHERE id = ?",
+                  (doc_id,))
+        result = c.fetchone()
+        if not result:
+            return None
+        c.execute("DELETE FROM extracted_texts WHERE doc_id = ?", (doc_id,))
+        c.execute("DELETE FROM document_pages WHERE doc_id = ?", (doc_id,))
+        c.execute("DELETE FROM document_chunks WHERE doc_id = ?", (doc_id,))
+        _unlink_tags(c, doc_id)
+        c.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+        *paths, content_hash = result
+        if content_hash:
+            c.execute("""SELECT path, extracted_text_path, output_path FROM documents
+                         WHERE content_hash = ?""", (content_hash,))
+            shared = {path for row in c.fetchall() for path in row if path}
+            paths = ["" if path in shared else path for path in paths]
+    return tuple(paths)
+
+
+# Indexes handled by rebuild_fts_index: index -> (table whose ids are indexed,
+# table or view the indexed values are read from, indexed columns)
+FTS_INDEXES = {
+    "documents_fts": ("documents", "documents_fts_source", FTS_COLUMNS),
+    "chunks_fts": ("document_chunks", "document_chunks", "content"),
+    "documents_meta_trigram": ("documents", "documents", TRIGRAM_COLUMNS),
+}
+
+
+def _fts_indexes(store: DocumentStore) -> list:
+    """The FTS_INDEXES this database has and this SQLite can read"""
+    return [index for index in FTS_INDEXES
+            if index != "documents_meta_trigram" or _has_trigram_index(store)]
+
+FTS_REBUILD_MODES = ("full", "missing")
+
+
+def _rebuild_fts_batches(store: DocumentStore, index: str, mode: str, batch_size: int,
+                         progress_callback: Optional[Callable[[str, int, int], None]]) -> int:
+    id_table, source, columns = FTS_INDEXES[index]
+    conn = store.connection()
+    state = conn.execute("SELECT mode, last_id, done, total FROM fts_rebuild_state WHERE index_name = ?",
+                         (index,)).fetchone()
+    # An interrupted full rebuild left the index partly empty, so it always wins
+    if state is not None and (state[0] == mode or state[0] == "full"):
+        mode, last_id, done, total = state
+    else:
+        with store.transaction() as conn:
+            if mode == "full":
+                conn.execute(f"INSERT INTO {index} ({index}) VALUES ('delete-all')")
+            total = conn.execute(f"""SELECT COUNT(*) FROM {id_table} t
+                                     WHERE NOT EXISTS (SELECT 1 FROM {index}_docsize WHERE id = t.id)"""
+                                 ).fetchone()[0]
+            last_id, done = 0, 0
+            conn.execute("INSERT OR REPLACE INTO fts_rebuild_state VALUES (?, ?, ?, ?, ?, ?)",
+                         (index, mode, last_id, done, total, datetime.datetime.now().isoformat()))
+
+    while True:
+        with store.transaction() as conn:
+            upper = conn.execute(f"""SELECT MAX(id) FROM
+                                     (SELECT id FROM {id_table} WHERE id > ? ORDER BY id LIMIT ?)""",
+                                 (last_id, batch_size)).fetchone()[0]
+            if upper is None:
+                conn.execute("DELETE FROM fts_rebuild_state WHERE index_name = ?", (index,))
+                break
+            # Rows indexed since the rebuild started (by the triggers) are skipped
+            added = conn.execute(f"""INSERT INTO {index} (rowid, {columns})
+                                     SELECT id, {columns} FROM {source} src
+                                     WHERE id > ? AND id <= ?
+                                       AND NOT EXISTS (SELECT 1 FROM {index}_docsize WHERE id = src.id)""",
+                                 (last_id, upper)).rowcount
+            last_id, done = upper, done + added
+            conn.execute("""UPDATE fts_rebuild_state SET last_id = ?, done = ?, updated_at = ?
+                            WHERE index_name = ?""",
+                         (last_id, done, datetime.datetime.now().isoformat(), index))
+        if progress_callback:
+            progress_callback(index, done, total)
+    return done
+
+
+def rebuild_fts_index(mode: str = "full", batch_size: int = FTS_REBUILD_BATCH_SIZE,
+                      indexes: Optional[Iterable[str]] = None,
+                      progress_callback: Optional[Callable[[str, int, int], None]] = None,
+                      db_path: str = DB_PATH) -> int:
+    """Re-index the FTS tables in batches of ``batch_size`` ids; returns rows indexed.
+
+    Each batch commits with a checkpoint in fts_rebuild_state, so an interrupted
+    rebuild resumes where it stopped on the next call and searches and writes can
+    run in between. ``mode="full"`` empties the index first and re-reads every row;
+    ``mode="missing"`` only adds rows that have no index entry. Entries that are
+    present but stale (written with the triggers bypassed, or left by deleted rows)
+    cannot be removed one by one from an external-content index, since a 'delete'
+    must replay the exact indexed values, so only a full rebuild repairs them.
+
+    ``progress_callback(index, done, total)`` is called after every batch.
+    """
+    if mode not in FTS_REBUILD_MODES:
+        raise ValueError(f"Unknown FTS rebuild mode: {mode}")
+    store = get_store(db_path)
+    try:
+        added = sum(_rebuild_fts_batches(store, index, mode, batch_size, progress_callback)
+                    for index in (indexes or _fts_indexes(store)))
         print("FTS index rebuilt successfully")
+        return added
     except Exception as e:
-        conn.rollback()
         print(f"Failed to rebuild FTS index: {e}")
         raise e
-    finally:
-        conn.close()
 
 
+def pending_fts_rebuilds(db_path: str = DB_PATH) -> List[Tuple[str, str, int, int]]:
+    """(index, mode, done, total) of every rebuild that was interrupted"""
+    conn = get_store(db_path).connection()
+    return conn.execute("SELECT index_name, mode, done, total FROM fts_rebuild_state ORDER BY index_name"
+                        ).fetchall()
+
+
+def optimize_fts_index(indexes: Optional[Iterable[str]] = None, db_path: str = DB_PATH) -> None:
+    """Merge all segments of each FTS index into one ('optimize'); slow on large indexes"""
+    store = get_store(db_path)
+    for index in indexes or _fts_indexes(store):
+        with store.transaction() as conn:
+            conn.execute(f"INSERT INTO {index} ({index}) VALUES ('optimize')")
+
+
+def merge_fts_index(pages: int = FTS_MERGE_PAGES, indexes: Optional[Iterable[str]] = None,
+                    db_path: str = DB_PATH) -> int:
+    """Incrementally merge FTS segments, at most ``pages`` pages per committed step,
+    until there is nothing left to merge; returns the number of steps"""
+    store = get_store(db_path)
+    steps = 0
+    for index in indexes or _fts_indexes(store):
+        while True:
+            with store.transaction() as conn:
+                before = conn.total_changes
+                conn.execute(f"INSERT INTO {index} ({index}, rank) VALUES ('merge', ?)", (pages,))
+                merged = conn.total_changes - before >= 2
+            steps += 1
+            if not merged:
+                break
+    return steps
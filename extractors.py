@@ -0,0 +1,91 @@
+from collections import namedtuple
+from pathlib import Path
+from typing import Callable, Iterable, Optional, Union
+
+# A registered text extractor.
+#   extract(file_path, probe, force_ocr) -> (readable, text, method)
+#   stream(file_path) yields the text in chunks, or is None when the format must be
+#     extracted in one piece
+#   cost: relative work per page, one of the COST_* values below
+Extractor = namedtuple("Extractor", "format extract stream cost")
+
+COST_TEXT = 1
+COST_DOCUMENT = 5
+COST_OCR = 100
+
+_extractors = {}
+
+
+def register_extractor(formats: Union[str, Iterable[str]], extract: Callable,
+                       stream: Optional[Callable] = None, cost: int = COST_DOCUMENT) -> None:
+    """Register ``extract`` for one or more formats, replacing earlier registrations"""
+    for file_format in ([formats] if isinstance(formats, str) else formats):
+        _extractors[file_format] = Extractor(file_format, extract, stream, cost)
+
+
+def get_extractor(file_format: str) -> Optional[Extractor]:
+    return _extractors.get(file_format)
+
+
+# Leading bytes that identify a format: ((offset, bytes), ...) must all match
+MAGIC_SIGNATURES = [
+    (((0, b"%PDF-"),), "pdf"),
+    (((0, b"\x89PNG\r\n\x1a\n"),), "png"),
+    (((0, b"\xff\xd8\xff"),), "jpg"),
+    (((0, b"GIF87a"),), "gif"),
+    (((0, b"GIF89a"),), "gif"),
+    (((0, b"II*\x00"),), "tiff"),
+    (((0, b"MM\x00*"),), "tiff"),
+    # "BM" alone is too common at the start of text; the header's reserved field is zero
+    (((0, b"BM"), (6, b"\x00\x00\x00\x00")), "bmp"),
+    (((0, b"RIFF"), (8, b"WEBP")), "webp"),
+    (((0, b"{\\rtf"),), "rtf"),
+    # OLE2 compound file: legacy Word (also Excel/PowerPoint, which are not collected)
+    (((0, b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"),), "doc"),
+]
+
+ZIP_SIGNATURE = b"PK\x03\x04"
+# OpenDocument stores an uncompressed "mimetype" member first, right after its header
+ODT_MIMETYPE = b"mimetypeapplication/vnd.oasis.opendocument.text"
+SNIFF_BYTES = 30 + len(ODT_MIMETYPE)
+
+
+def _sniff_zip(file_path: str, head: bytes) -> Optional[str]:
+    if head[30:].startswith(ODT_MIMETYPE):
+        return "odt"
+    import zipfile
+    try:
+        with zipfile.ZipFile(file_path) as archive:
+            names = set(archive.namelist())
+    except (zipfile.BadZipFile, OSError):
+        return None
+    return "docx" if "word/document.xml" in names else None
+
+
+def sniff_format(file_path: str) -> Optional[str]:
+    """Format identified from the file's leading bytes, or None (plain-text formats
+    have no signature)"""
+    try:
+        with open(file_path, 'rb') as f:
+            head = f.read(SNIFF_BYTES)
+    except OSError:
+        return None
+    for parts, file_format in MAGIC_SIGNATURES:
+        if all(head[offset:offset + len(magic)] == magic for offset, magic in parts):
+            return file_format
+    if head.startswith(ZIP_SIGNATURE):
+        return _sniff_zip(file_path, head)
+    return None
+
+
+def detect_format(file_path: str) -> str:
+    """The sniffed format of a file, falling back to its extension. Formats that share
+    a signature (jpg/jpeg) keep the extension's spelling."""
+    extension = Path(file_path).suffix.lower().lstrip('.')
+    sniffed = sniff_format(file_path)
+    if sniffed is None or sniffed == extension:
+        return extension
+    by_signature, by_extension = get_extractor(sniffed), get_extractor(extension)
+    if by_signature and by_extension and by_signature.extract is by_extension.extract:
+        return extension
+    return sniffed
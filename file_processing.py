@@ -1,12 +1,27 @@
 import os
 import shutil
+import subprocess
 import json
 import datetime
+import hashlib
 import re
+import statistics
+import threading
+from collections import OrderedDict
 from pathlib import Path
+from typing import Optional
 
-from config import MACHINE_READABLE_FORMATS, OUTPUT_FORMATS
-from db_ops import insert_document
+from config import (CHUNKING_ENABLED, COST_BYTES_PER_PAGE, COST_SAMPLE_PAGES, DB_PATH, DEDUP_ENABLED,
+                    DEDUP_NEW_ROW, HASH_CHUNK_SIZE, IMAGE_FORMATS, INDEXED_TEXT_MAX_CHARS,
+                    MACHINE_READABLE_FORMATS, OCR_ADAPTIVE_DPI, OCR_CACHE_ENABLED, OCR_DOWNSAMPLE_IMAGES,
+                    OCR_DPI, OCR_DPI_STEP, OCR_LANG, OCR_MAX_DPI, OCR_MAX_IMAGE_SIDE, OCR_MAX_IN_FLIGHT_PAGES,
+                    OCR_MAX_WORKERS, OCR_MIN_DPI, OCR_MIN_PAGE_CHARS, OCR_PAGE_CHUNK, OCR_PREPROCESS,
+                    OCR_PROBE_DPI, OCR_TARGET_LINE_HEIGHT, OCR_TESSERACT_CONFIG, OUTPUT_FORMATS,
+                    PROBE_CACHE_SIZE, STREAM_CHUNK_CHARS)
+from db_ops import (DOCUMENT_COLUMNS, find_document_by_hash, get_document_content, get_document_pages,
+                    insert_documents, parse_tags, split_passages, update_documents)
+from extractors import COST_DOCUMENT, COST_OCR, COST_TEXT, detect_format, get_extractor, register_extractor
+import ocr_cache
 
 
 def sanitize_filename(filename: str) -> str:
@@ -24,65 +39,254 @@ def generate_unique_filename(base_name: str, storage_dir: str, extension: str) -
     return f"{base_name}.{extension}"
 
 
-def detect_file_readability(file_path: str) -> bool:
-    file_ext = Path(file_path).suffix.lower().lstrip('.')
-    if file_ext in ['jpg', 'jpeg', 'png', 'tiff', 'bmp', 'gif', 'webp']:
-        return False
-    if file_ext == 'pdf':
+def reserve_storage_path(base_name: str, storage_dir: str, extension: str) -> str:
+    """Atomically claim a unique file in storage so concurrent workers never collide."""
+    while True:
+        filename = generate_unique_filename(base_name, storage_dir, extension)
+        path = os.path.join(storage_dir, filename)
         try:
-            import pdfplumber
-            with pdfplumber.open(file_path) as pdf:
-                if len(pdf.pages) > 0:
-                    text = pdf.pages[0].extract_text()
-                    return bool(text and text.strip())
-        except:
-            pass
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            continue
+        os.close(fd)
+        return path
+
+
+# Formats whose text is the file itself; these are extracted as a stream of chunks
+TEXT_STREAM_FORMATS = ('txt', 'csv', 'json', 'xml', 'html', 'md')
+
+_probe_cache = OrderedDict()
+_probe_cache_lock = threading.Lock()
+
+
+def _page_resources(page) -> tuple:
+    """(has fonts, has images, has forms) of a pdfplumber page, read from its resource
+    dictionary without parsing the page's content"""
+    from pdfminer.pdftypes import resolve1
+    resources = resolve1(page.page_obj.resources) or {}
+    subtypes = {getattr(resolve1(xobject).get("Subtype"), "name", None)
+                for xobject in (resolve1(resources.get("XObject")) or {}).values()}
+    return bool(resolve1(resources.get("Font"))), "Image" in subtypes, "Form" in subtypes
+
+
+# Inline image operator (BI ... ID ... EI) in a decoded content stream
+INLINE_IMAGE_RE = re.compile(rb'(?:^|\s)BI\s')
+
+
+def _has_inline_images(page) -> bool:
+    """Whether a pdfplumber page's content streams contain an inline image operator,
+    checked by decoding the streams without parsing them"""
+    from pdfminer.pdftypes import resolve1
+    return any(INLINE_IMAGE_RE.search(resolve1(stream).get_data())
+               for stream in page.page_obj.contents)
+
+
+def _needs_ocr(page) -> bool:
+    """Whether a pdfplumber page holds images but fewer than OCR_MIN_PAGE_CHARS characters
+    of text. Blank pages and short text pages have nothing to OCR. The resource
+    dictionary and, for pages without image XObjects, a search of the content streams
+    for inline images settle most pages without parsing their content."""
+    try:
+        has_fonts, has_images, has_forms = _page_resources(page)
+        # Scans are sometimes embedded as inline images, which are not resources
+        has_images = has_images or has_forms or _has_inline_images(page)
+    except Exception:
+        has_fonts, has_images, has_forms = True, True, True
+    if not has_images:
+        return False
+    if not has_fonts and not has_forms:
+        return True
+    if sum(1 for char in page.chars if not char["text"].isspace()) >= OCR_MIN_PAGE_CHARS:
         return False
-    return file_ext in MACHINE_READABLE_FORMATS
+    # Parsing resolves forms and inline images, so this also finds images nested
+    # inside forms and settles stray "BI" matches
+    return bool(page.images)
 
 
-def extract_text_from_file(file_path: str, force_ocr: bool = False):
-    file_ext = Path(file_path).suffix.lower().lstrip('.')
-    if force_ocr or not detect_file_readability(file_path):
-        if file_ext == 'pdf':
-            return ocr_pdf_to_text(file_path)
-        elif file_ext in ['jpg', 'jpeg', 'png', 'tiff', 'bmp', 'gif', 'webp']:
-            return ocr_image_to_text(file_path)
+def _probe_pdf(file_path: str, with_texts: bool = False) -> tuple:
+    """(whether each page needs OCR, text of every page or None) in a single pdfplumber
+    pass; page text is only laid out when ``with_texts`` is set"""
+    try:
+        import pdfplumber
+        with pdfplumber.open(file_path) as pdf:
+            needs_ocr, texts = [], []
+            for page in pdf.pages:
+                needs_ocr.append(_needs_ocr(page))
+                if with_texts:
+                    texts.append("" if needs_ocr[-1] else page.extract_text() or "")
+            return needs_ocr, (texts if with_texts else None)
+    except Exception:
+        return [], None
+
+
+def _probe_key(file_path: str) -> tuple:
+    stat = os.stat(file_path)
+    return os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns
+
+
+def probe_document(file_path: str, with_texts: bool = False) -> dict:
+    """Describe a file: sniffed format, page count and which pages need OCR.
+
+    A PDF is machine readable unless some page is an image without a usable text
+    layer; such pages are listed in ``ocr_pages`` (1-based) and every other page,
+    blank ones included, in ``page_has_text``. Pages are only classified, unless
+    ``with_texts`` asks for their text in ``page_texts`` so extraction does not parse
+    the PDF again. Probes are cached on (path, size,
+    mtime) without their texts.
+    """
+    key = _probe_key(file_path)
+    with _probe_cache_lock:
+        cached = _probe_cache.get(key)
+        if cached is not None:
+            _probe_cache.move_to_end(key)
+    if cached is not None and not (with_texts and cached["format"] == 'pdf'):
+        return cached
+
+    file_ext = detect_format(file_path)
+    page_texts = None
     if file_ext == 'pdf':
-        return extract_text_from_pdf(file_path)
-    elif file_ext == 'docx':
-        return extract_text_from_docx(file_path)
-    elif file_ext == 'doc':
-        return extract_text_from_doc(file_path)
-    elif file_ext == 'rtf':
-        return extract_text_from_rtf(file_path)
-    elif file_ext == 'odt':
-        return extract_text_from_odt(file_path)
-    elif file_ext == 'txt':
-        return extract_text_from_txt(file_path)
-    elif file_ext in ['csv', 'json', 'xml', 'html', 'md']:
-        return extract_text_from_txt(file_path)
+        needs_ocr, page_texts = _probe_pdf(file_path, with_texts)
+        page_has_text = [not page_needs_ocr for page_needs_ocr in needs_ocr]
+        is_machine_readable = bool(page_has_text) and all(page_has_text)
     else:
-        raise ValueError(f"Unsupported file format: {file_ext}")
+        is_machine_readable = file_ext not in IMAGE_FORMATS and file_ext in MACHINE_READABLE_FORMATS
+        page_has_text = [is_machine_readable]
+    probe = {
+        "format": file_ext,
+        "page_count": len(page_has_text),
+        "page_has_text": page_has_text,
+        "page_texts": page_texts,
+        "ocr_pages": [number for number, has_text in enumerate(page_has_text, 1) if not has_text],
+        "is_machine_readable": is_machine_readable
+    }
+
+    with _probe_cache_lock:
+        _probe_cache[key] = {**probe, "page_texts": None}
+        while len(_probe_cache) > PROBE_CACHE_SIZE:
+            _probe_cache.popitem(last=False)
+    return probe
 
 
-def extract_text_from_pdf(pdf_path: str):
+def detect_file_readability(file_path: str) -> bool:
+    return probe_document(file_path)["is_machine_readable"]
+
+
+def _sample_pdf(pdf_path: str) -> tuple:
+    """(page count, estimated pages without a text layer) from COST_SAMPLE_PAGES evenly
+    spaced pages; an unreadable PDF counts as one page needing OCR"""
     try:
         import pdfplumber
         with pdfplumber.open(pdf_path) as pdf:
-            full_text = []
-            for page in pdf.pages:
-                text = page.extract_text()
-                if text:
-                    full_text.append(text.strip())
-            joined = "\n".join(full_text).strip()
-            return (len(joined) > 0), joined, "direct_extraction"
+            pages = len(pdf.pages)
+            if pages == 0:
+                return 0, 0
+            sample = pdf.pages[::max(1, pages // COST_SAMPLE_PAGES)][:COST_SAMPLE_PAGES]
+            missing = sum(_needs_ocr(page) for page in sample)
+            return pages, round(pages * missing / len(sample))
+    except Exception:
+        return 1, 1
+
+
+def estimate_cost(file_path: str, force_ocr: bool = False) -> int:
+    """Relative cost of extracting a file, in extractors.COST_* units.
+
+    PDFs cost COST_OCR per page that needs OCR and their extractor's cost per other
+    page. A cached probe is used when there is one; otherwise a few pages are sampled
+    rather than probing the whole PDF. Images cost one OCR page; other formats count
+    a page per COST_BYTES_PER_PAGE bytes.
+    """
+    try:
+        key = _probe_key(file_path)
+    except OSError:
+        return COST_TEXT  # fails fast in extraction
+    with _probe_cache_lock:
+        probe = _probe_cache.get(key)
+    file_format = probe["format"] if probe else detect_format(file_path)
+    extractor = get_extractor(file_format)
+    if extractor is None:
+        return COST_TEXT
+    if file_format == 'pdf':
+        if probe:
+            pages, ocr_pages = probe["page_count"], len(probe["ocr_pages"])
+        else:
+            pages, ocr_pages = _sample_pdf(file_path)
+        if force_ocr:
+            ocr_pages = pages
+        return ocr_pages * COST_OCR + (pages - ocr_pages) * extractor.cost
+    if extractor.cost >= COST_OCR:
+        return extractor.cost
+    return extractor.cost * (1 + key[1] // COST_BYTES_PER_PAGE)
+
+
+def count_pages(file_path: str) -> int:
+    """Number of pages in a PDF; every other format counts as a single page"""
+    return probe_document(file_path)["page_count"]
+
+
+def extract_text_from_file(file_path: str, force_ocr: bool = False, probe: dict = None):
+    """Extract a file's text with the extractor registered for its probed format. A
+    ``probe["content_hash"]`` of the file saves the OCR cache from hashing it again."""
+    probe = probe or probe_document(file_path)
+    extractor = get_extractor(probe["format"])
+    if extractor is None:
+        raise ValueError(f"Unsupported file format: {probe['format']}")
+    return extractor.extract(file_path, probe, force_ocr)
+
+
+def _extract_pdf(pdf_path: str, probe: dict, force_ocr: bool):
+    """Text layer, OCR of the pages without one, or OCR of every page"""
+    if force_ocr or not any(probe["page_has_text"]):
+        return ocr_pdf_to_text(pdf_path, file_hash=probe.get("content_hash"))
+    if probe["ocr_pages"]:
+        return extract_text_from_pdf_hybrid(pdf_path, probe)
+    return extract_text_from_pdf(pdf_path, probe["page_texts"])
+
+
+def extract_text_from_pdf(pdf_path: str, page_texts: list = None):
+    """Join the text layer of every page; ``page_texts`` from a probe skips reopening the PDF"""
+    try:
+        if page_texts is None:
+            import pdfplumber
+            with pdfplumber.open(pdf_path) as pdf:
+                page_texts = [page.extract_text() for page in pdf.pages]
+        full_text = [text.strip() for text in page_texts if text]
+        joined = "\n".join(full_text).strip()
+        return (len(joined) > 0), joined, "direct_extraction"
     except ImportError:
         raise RuntimeError("pdfplumber required: pip install pdfplumber")
     except Exception as e:
         raise RuntimeError(f"Failed to extract text from PDF: {e}")
 
 
+def extract_text_from_pdf_hybrid(pdf_path: str, probe: dict):
+    """Use the text layer of pages that have one and OCR only ``probe["ocr_pages"]``"""
+    try:
+        page_texts = probe["page_texts"]
+        if page_texts is None:
+            page_texts = _probe_pdf(pdf_path, with_texts=True)[1] or []
+        ocr_texts = ocr_pdf_pages(pdf_path, probe["ocr_pages"], file_hash=probe.get("content_hash"))
+        full_text = []
+        for number, text in enumerate(page_texts, 1):
+            text = ocr_texts.get(number, text)
+            if text and text.strip():
+                full_text.append(text.strip())
+        joined = "\n".join(full_text).strip()
+        return (len(joined) > 0), joined, "hybrid"
+    except ImportError:
+        raise RuntimeError("pdf2image and pytesseract required: pip install pdf2image pytesseract")
+    except Exception as e:
+        raise RuntimeError(f"Failed to perform hybrid extraction on PDF: {e}")
+
+
+def page_methods(probe: dict, method: str) -> list:
+    """Per-page extraction method of a PDF extracted with ``method``; [] for other formats"""
+    if probe["format"] != 'pdf' or method == "failed":
+        return []
+    if method == "hybrid":
+        return ["direct_extraction" if has_text else "ocr" for has_text in probe["page_has_text"]]
+    return [method] * probe["page_count"]
+
+
 def extract_text_from_docx(docx_path: str):
     try:
         from docx import Document
@@ -99,7 +303,29 @@ def extract_text_from_docx(docx_path: str):
         raise RuntimeError(f"Failed to extract text from DOCX: {e}")
 
 
+# Command-line converters for legacy Word files, tried in order; each prints UTF-8 text
+DOC_CONVERTERS = (
+    ("antiword", ["-m", "UTF-8.txt", "-w", "0"]),
+    ("catdoc", ["-d", "utf-8", "-w"]),
+)
+
+
 def extract_text_from_doc(doc_path: str):
+    """Legacy Word text through antiword or catdoc, or through Word itself (COM) on
+    Windows when neither is installed"""
+    for command, options in DOC_CONVERTERS:
+        executable = shutil.which(command)
+        if executable is None:
+            continue
+        try:
+            result = subprocess.run([executable, *options, doc_path], capture_output=True, check=True)
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError(f"Failed to extract text from DOC: {command}: "
+                               f"{e.stderr.decode('utf-8', errors='ignore').strip()}")
+        text = result.stdout.decode('utf-8', errors='ignore').strip()
+        return (len(text) > 0), text, "direct_extraction"
+    if os.name != 'nt':
+        raise RuntimeError("antiword or catdoc required: apt install antiword")
     try:
         import win32com.client
         word = win32com.client.Dispatch("Word.Application")
@@ -110,7 +336,7 @@ def extract_text_from_doc(doc_path: str):
         word.Quit()
         return (len(text.strip()) > 0), text.strip(), "direct_extraction"
     except ImportError:
-        raise RuntimeError("pywin32 required: pip install pywin32")
+        raise RuntimeError("antiword, catdoc or pywin32 required: pip install pywin32")
     except Exception as e:
         raise RuntimeError(f"Failed to extract text from DOC: {e}")
 
@@ -153,12 +379,182 @@ def extract_text_from_txt(file_path: str):
         raise RuntimeError(f"Failed to read text file: {e}")
 
 
-def ocr_image_to_text(image_path: str):
+def iter_text_chunks(file_path: str, chunk_chars: int = STREAM_CHUNK_CHARS, newline: str = None):
+    """Yield a text file's contents in chunks of at most ``chunk_chars`` characters"""
+    with open(file_path, 'r', encoding='utf-8', errors='ignore', newline=newline) as f:
+        for chunk in iter(lambda: f.read(chunk_chars), ""):
+            yield chunk
+
+
+def _iter_lines(chunks):
+    """Split a stream of text chunks on '\n', like ``"".join(chunks).split('\n')``"""
+    pending = []
+    for chunk in chunks:
+        *lines, tail = chunk.split('\n')
+        if lines:
+            lines[0] = "".join(pending) + lines[0]
+            pending = []
+        pending.append(tail)
+        yield from lines
+    yield "".join(pending)
+
+
+def stream_text_to_file(chunks, output_path: str, prefix_chars: int = INDEXED_TEXT_MAX_CHARS):
+    """Write text chunks to ``output_path`` while counting words.
+
+    Returns (readable, prefix, word_count) where ``prefix`` is at most the first
+    ``prefix_chars`` characters, so memory use does not depend on the input size.
+    """
+    readable = False
+    prefix = []
+    prefix_len = 0
+    word_count = 0
+    word_open = False
+    with open(output_path, 'w', encoding='utf-8') as f:
+        for chunk in chunks:
+            f.write(chunk)
+            readable = readable or bool(chunk.strip())
+            if prefix_len < prefix_chars:
+                prefix.append(chunk[:prefix_chars - prefix_len])
+                prefix_len += len(prefix[-1])
+            word_count += len(chunk.split())
+            # A word split across two chunks was counted once in each
+            if word_open and not chunk[0].isspace():
+                word_count -= 1
+            word_open = not chunk[-1].isspace()
+    return readable, "".join(prefix), word_count
+
+
+OCR_PREPROCESS_MODES = ("none", "grayscale", "binarize")
+
+
+def _otsu_threshold(histogram: list) -> int:
+    """Grey level separating a 256-bin histogram into its two classes (Otsu's method)"""
+    total = sum(histogram)
+    sum_all = sum(level * count for level, count in enumerate(histogram))
+    best, threshold = -1.0, 127
+    weight_dark = sum_dark = 0
+    for level, count in enumerate(histogram):
+        weight_dark += count
+        weight_light = total - weight_dark
+        if weight_dark == 0:
+            continue
+        if weight_light == 0:
+            break
+        sum_dark += level * count
+        mean_dark = sum_dark / weight_dark
+        mean_light = (sum_all - sum_dark) / weight_light
+        between = weight_dark * weight_light * (mean_dark - mean_light) ** 2
+        if between > best:
+            best, threshold = between, level
+    return threshold
+
+
+def _grayscale(img):
+    """``img`` in mode "L", with any transparency flattened onto white"""
+    from PIL import Image
+    if img.mode == "L":
+        return img
+    if img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info:
+        background = Image.new("RGBA", img.size, "white")
+        return Image.alpha_composite(background, img.convert("RGBA")).convert("L")
+    return img.convert("L")
+
+
+def preprocess_image(img, mode: str = OCR_PREPROCESS):
+    """The image as handed to Tesseract: unchanged ("none"), "grayscale", or
+    "binarize"d to black and white at Otsu's threshold"""
+    if mode not in OCR_PREPROCESS_MODES:
+        raise ValueError(f"Unknown OCR preprocessing {mode!r}; expected one of {OCR_PREPROCESS_MODES}")
+    if mode == "none":
+        return img
+    gray = _grayscale(img)
+    if mode == "grayscale":
+        return gray
+    threshold = _otsu_threshold(gray.histogram())
+    return gray.point([0 if level <= threshold else 255 for level in range(256)], "1")
+
+
+def text_line_height(img) -> Optional[float]:
+    """Median height in pixels of the text lines of a page image, or None if it has none.
+
+    Lines are runs of rows holding ink (the less common side of Otsu's threshold,
+    so light text on a dark background works too); runs too short to be text
+    (rules, specks) or taller than an eighth of the page (pictures) are ignored.
+    """
+    gray = _grayscale(img)
+    histogram = gray.histogram()
+    threshold = _otsu_threshold(histogram)
+    dark = sum(histogram[:threshold + 1])
+    ink = 0 if dark <= sum(histogram) - dark else 255
+    data = gray.point([0 if level <= threshold else 255 for level in range(256)]).tobytes()
+    width, height = gray.size
+    min_ink = max(2, width // 1000)
+    runs, run = [], 0
+    for top in range(0, width * height, width):
+        if data.count(ink, top, top + width) >= min_ink:
+            run += 1
+        elif run:
+            runs.append(run)
+            run = 0
+    if run:
+        runs.append(run)
+    runs = [run for run in runs if 3 <= run <= height / 8]
+    return statistics.median(runs) if runs else None
+
+
+def choose_ocr_dpi(line_height: Optional[float], rendered_dpi: int, fallback_dpi: int = OCR_DPI) -> int:
+    """DPI at which text lines ``line_height`` pixels tall at ``rendered_dpi`` come out
+    about OCR_TARGET_LINE_HEIGHT pixels tall"""
+    if not line_height:
+        return fallback_dpi
+    dpi = round(rendered_dpi * OCR_TARGET_LINE_HEIGHT / line_height / OCR_DPI_STEP) * OCR_DPI_STEP
+    return max(OCR_MIN_DPI, min(OCR_MAX_DPI, dpi))
+
+
+def _downsample_image(img):
+    """``img`` scaled down so its longer side fits OCR_MAX_IMAGE_SIDE and its text lines
+    are no taller than OCR_TARGET_LINE_HEIGHT; never scaled up"""
+    from PIL import Image
+    scale = OCR_MAX_IMAGE_SIDE / max(img.size)
+    line_height = text_line_height(img)
+    if line_height:
+        scale = min(scale, OCR_TARGET_LINE_HEIGHT / line_height)
+    if scale >= 1:
+        return img
+    size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+    return img.resize(size, Image.LANCZOS)
+
+
+def ocr_image_to_text(image_path: str, preprocess: str = OCR_PREPROCESS,
+                      downsample: bool = OCR_DOWNSAMPLE_IMAGES, use_cache: bool = OCR_CACHE_ENABLED,
+                      file_hash: Optional[str] = None):
+    """OCR an image file, through the OCR cache (by file hash, then by the pixels handed
+    to Tesseract); oversized images are scaled down first when ``downsample`` is set.
+    The file is hashed for the cache unless its ``file_hash`` is given."""
     try:
         import pytesseract
         from PIL import Image
-        img = Image.open(image_path)
-        text = pytesseract.image_to_string(img)
+        source = None
+        if use_cache:
+            render = f"image:{preprocess}:" + (f"{OCR_MAX_IMAGE_SIDE}/{OCR_TARGET_LINE_HEIGHT}"
+                                               if downsample else "full")
+            source = ocr_cache.source_key(file_hash or compute_file_hash(image_path), 1, render)
+            text = ocr_cache.get_source_texts([source]).get(source)
+            if text is not None:
+                return (len(text.strip()) > 0), text.strip(), "ocr"
+        with Image.open(image_path) as img:
+            prepared = img
+            if downsample:
+                # Grayscale first, so the resampling works on one channel
+                prepared = _downsample_image(_grayscale(img) if preprocess != "none" else img)
+            prepared = preprocess_image(prepared, preprocess)
+            key = ocr_cache.raster_key(prepared) if use_cache else None
+            text = ocr_cache.get_raster_texts([key]).get(key) if use_cache else None
+            if text is None:
+                text = pytesseract.image_to_string(prepared, lang=OCR_LANG, config=OCR_TESSERACT_CONFIG)
+        if use_cache:
+            ocr_cache.put_texts([(source, key, text)])
         return (len(text.strip()) > 0), text.strip(), "ocr"
     except ImportError:
         raise RuntimeError("pytesseract and pillow required: pip install pytesseract pillow")
@@ -166,19 +562,158 @@ def ocr_image_to_text(image_path: str):
         raise RuntimeError(f"Failed to perform OCR on image: {e}")
 
 
-def ocr_pdf_to_text(pdf_path: str):
+def _ocr_page(img, page_number: int):
+    """(text, cacheable): a failed page yields an error marker that is not cached"""
+    import pytesseract
     try:
-        from pdf2image import convert_from_path
-        import pytesseract
-        images = convert_from_path(pdf_path, dpi=300)
-        texts = []
-        for i, img in enumerate(images):
-            try:
-                text = pytesseract.image_to_string(img)
-                texts.append(text)
-            except Exception as e:
-                texts.append(f"[ERROR extracting page {i}: {e}]")
-        full_text = "\n".join(texts).strip()
+        return pytesseract.image_to_string(img, lang=OCR_LANG, config=OCR_TESSERACT_CONFIG), True
+    except Exception as e:
+        return f"[ERROR extracting page {page_number}: {e}]", False
+    finally:
+        img.close()
+
+
+def _page_windows(pages: list, size: int, page_dpi: dict) -> list:
+    """[first, last] runs of consecutive ``pages`` rendered at the same DPI, at most ``size`` long"""
+    windows = []
+    for page in pages:
+        if (windows and windows[-1][1] == page - 1 and page - windows[-1][0] < size
+                and page_dpi[page] == page_dpi[windows[-1][0]]):
+            windows[-1][1] = page
+        else:
+            windows.append([page, page])
+    return windows
+
+
+# Threads OCRing the pages of one PDF when max_workers is not given. Batch and
+# watch pool workers already run one file per CPU, so they set this to 1.
+_ocr_threads = OCR_MAX_WORKERS
+
+
+def limit_ocr_threads(threads: int = 1) -> None:
+    """Process pool initializer: OCR the pages of a PDF on ``threads`` threads in
+    this process, so N pool workers do not start N * OCR_MAX_WORKERS Tesseract runs"""
+    global _ocr_threads
+    _ocr_threads = threads
+
+
+def ocr_pdf_pages(pdf_path: str, pages: list = None, dpi: int = OCR_DPI,
+                  max_workers: Optional[int] = None, max_in_flight: int = OCR_MAX_IN_FLIGHT_PAGES,
+                  adaptive_dpi: bool = OCR_ADAPTIVE_DPI, preprocess: str = OCR_PREPROCESS,
+                  use_cache: bool = OCR_CACHE_ENABLED, file_hash: Optional[str] = None) -> dict:
+    """OCR the given 1-based ``pages`` of a PDF (all pages by default); returns {page: text}.
+
+    With ``adaptive_dpi`` each page is rendered at the DPI ``choose_ocr_dpi`` picks
+    from a low-resolution probe render, falling back to ``dpi`` (a probe is used as
+    is when that DPI is the probe's own); otherwise all pages use ``dpi``. Rendered
+    pages go through ``preprocess_image`` before OCR.
+
+    Pages found in the OCR cache under the PDF's hash (``file_hash``, computed when
+    not given) and page number are not rasterized at all; rasterized pages whose
+    pixels are cached (e.g. unchanged pages of an edited PDF) are not OCRed. Runs of
+    consecutive pages are rasterized in windows of at most OCR_PAGE_CHUNK pages and
+    at most ``max_in_flight`` rasterized pages are held in memory at once. Pages are
+    OCRed on ``max_workers`` threads, by default OCR_MAX_WORKERS (one in pool
+    workers, see limit_ocr_threads).
+    """
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+    from pdf2image import convert_from_path, pdfinfo_from_path
+    import pytesseract
+
+    if preprocess not in OCR_PREPROCESS_MODES:
+        raise ValueError(f"Unknown OCR preprocessing {preprocess!r}; expected one of {OCR_PREPROCESS_MODES}")
+    if pages is None:
+        pages = range(1, int(pdfinfo_from_path(pdf_path)["Pages"]) + 1)
+    max_in_flight = max(1, max_in_flight)
+    window = max(1, min(OCR_PAGE_CHUNK, max_in_flight))
+    if max_workers is None:
+        max_workers = _ocr_threads
+
+    texts = {}
+    sources = {}
+    if use_cache:
+        render = f"{dpi}:{preprocess}"
+        if adaptive_dpi:
+            render = (f"auto{OCR_PROBE_DPI}:{OCR_MIN_DPI}-{OCR_MAX_DPI}/{OCR_DPI_STEP}:"
+                      f"{OCR_TARGET_LINE_HEIGHT}:{render}")
+        file_hash = file_hash or compute_file_hash(pdf_path)
+        sources = {page: ocr_cache.source_key(file_hash, page, render) for page in pages}
+        cached = ocr_cache.get_source_texts(sources.values())
+        texts = {page: cached[key] for page, key in sources.items() if key in cached}
+
+    todo = sorted(page for page in pages if page not in texts)
+    grayscale = preprocess != "none"
+
+    def render_window(first_page, last_page):
+        """[(page number, image ready for OCR)] of a window of consecutive pages"""
+        numbers = range(first_page, last_page + 1)
+        if not adaptive_dpi:
+            images = convert_from_path(pdf_path, dpi=dpi, first_page=first_page, last_page=last_page,
+                                       grayscale=grayscale)
+            return [(page, preprocess_image(img, preprocess)) for page, img in zip(numbers, images)]
+        probes = dict(zip(numbers, convert_from_path(pdf_path, dpi=OCR_PROBE_DPI, first_page=first_page,
+                                                     last_page=last_page, grayscale=True)))
+        page_dpi = {page: choose_ocr_dpi(text_line_height(probe), OCR_PROBE_DPI, dpi)
+                    for page, probe in probes.items()}
+        rendered = []
+        for run_first, run_last in _page_windows(list(probes), window, page_dpi):
+            run = range(run_first, run_last + 1)
+            if page_dpi[run_first] == OCR_PROBE_DPI and grayscale:
+                # The probes already are these pages at the chosen DPI
+                rendered.extend((page, probes.pop(page)) for page in run)
+            else:
+                images = convert_from_path(pdf_path, dpi=page_dpi[run_first], first_page=run_first,
+                                           last_page=run_last, grayscale=grayscale)
+                rendered.extend(zip(run, images))
+        for probe in probes.values():
+            probe.close()
+        return [(page, preprocess_image(img, preprocess)) for page, img in rendered]
+
+    pending = {}
+
+    def collect(done):
+        entries = []
+        for future in done:
+            page_number, key = pending.pop(future)
+            texts[page_number], cacheable = future.result()
+            if cacheable and key:
+                entries.append((sources.get(page_number), key, texts[page_number]))
+        ocr_cache.put_texts(entries)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        for first_page, last_page in _page_windows(todo, window, dict.fromkeys(todo, dpi)):
+            while pending and len(pending) + (last_page - first_page + 1) > max_in_flight:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            images = render_window(first_page, last_page)
+            keys = [ocr_cache.raster_key(img) if use_cache else None for _, img in images]
+            cached = ocr_cache.get_raster_texts(key for key in keys if key)
+            hits = []
+            for (page_number, img), key in zip(images, keys):
+                if key in cached:
+                    texts[page_number] = cached[key]
+                    hits.append((sources.get(page_number), key, cached[key]))
+                    img.close()
+                else:
+                    pending[executor.submit(_ocr_page, img, page_number)] = (page_number, key)
+            # Record the source keys of pages that were only found by their pixels
+            ocr_cache.put_texts(hits)
+            del images
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            collect(done)
+    return texts
+
+
+def ocr_pdf_to_text(pdf_path: str, dpi: int = OCR_DPI, max_workers: Optional[int] = None,
+                    max_in_flight: int = OCR_MAX_IN_FLIGHT_PAGES, adaptive_dpi: bool = OCR_ADAPTIVE_DPI,
+                    preprocess: str = OCR_PREPROCESS, use_cache: bool = OCR_CACHE_ENABLED,
+                    file_hash: Optional[str] = None):
+    """OCR every page of a PDF; text is reassembled in page order"""
+    try:
+        texts = ocr_pdf_pages(pdf_path, None, dpi, max_workers, max_in_flight, adaptive_dpi, preprocess,
+                              use_cache, file_hash)
+        full_text = "\n".join(texts[page] for page in sorted(texts)).strip()
         return (len(full_text) > 0), full_text, "ocr"
     except ImportError:
         raise RuntimeError("pdf2image and pytesseract required: pip install pdf2image pytesseract")
@@ -186,51 +721,91 @@ def ocr_pdf_to_text(pdf_path: str):
         raise RuntimeError(f"Failed to perform OCR on PDF: {e}")
 
 
+def _path_only(extract):
+    """Adapt a ``extract(file_path)`` function to the registry's signature"""
+    return lambda file_path, probe, force_ocr: extract(file_path)
+
+
+def _extract_image(image_path: str, probe: dict, force_ocr: bool):
+    return ocr_image_to_text(image_path, file_hash=probe.get("content_hash"))
+
+
+# Built-in extractors
+register_extractor('pdf', _extract_pdf, cost=COST_DOCUMENT)
+register_extractor(IMAGE_FORMATS, _extract_image, cost=COST_OCR)
+register_extractor('docx', _path_only(extract_text_from_docx), cost=COST_DOCUMENT)
+register_extractor('doc', _path_only(extract_text_from_doc), cost=COST_DOCUMENT)
+register_extractor('rtf', _path_only(extract_text_from_rtf), cost=COST_DOCUMENT)
+register_extractor('odt', _path_only(extract_text_from_odt), cost=COST_DOCUMENT)
+register_extractor(TEXT_STREAM_FORMATS, _path_only(extract_text_from_txt), stream=iter_text_chunks,
+                   cost=COST_TEXT)
+
+
 def convert_to_output_format(text: str, output_format: str, output_path: str) -> None:
+    _write_output_format(lambda: [text], output_format, output_path)
+
+
+def convert_file_to_output_format(text_path: str, output_format: str, output_path: str) -> None:
+    """Convert an extracted-text file, reading it in chunks instead of loading it whole"""
+    _write_output_format(lambda: iter_text_chunks(text_path, newline=''), output_format, output_path)
+
+
+def _write_output_format(open_chunks, output_format: str, output_path: str) -> None:
+    """Write the text produced by ``open_chunks()`` (called once per pass) as ``output_format``"""
     if output_format == 'txt':
         with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(text)
+            for chunk in open_chunks():
+                f.write(chunk)
     elif output_format == 'docx':
         try:
             from docx import Document
             doc = Document()
-            for paragraph in text.split('\n'):
+            for paragraph in _iter_lines(open_chunks()):
                 if paragraph.strip():
                     doc.add_paragraph(paragraph)
             doc.save(output_path)
         except ImportError:
             raise RuntimeError("python-docx required: pip install python-docx")
     elif output_format == 'html':
-        html_content = f"""<!DOCTYPE html>
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write("""<!DOCTYPE html>
 <html>
 <head>
     <meta charset="UTF-8">
     <title>Converted Document</title>
     <style>
-        body {{ font-family: Arial, sans-serif; margin: 40px; line-height: 1.6; }}
-        p {{ margin-bottom: 10px; }}
+        body { font-family: Arial, sans-serif; margin: 40px; line-height: 1.6; }
+        p { margin-bottom: 10px; }
     </style>
 </head>
 <body>
-"""
-        for paragraph in text.split('\n'):
-            if paragraph.strip():
-                html_content += f"    <p>{paragraph.strip()}</p>\n"
-        html_content += "</body>\n</html>"
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(html_content)
+""")
+            for paragraph in _iter_lines(open_chunks()):
+                if paragraph.strip():
+                    f.write(f"    <p>{paragraph.strip()}</p>\n")
+            f.write("</body>\n</html>")
     elif output_format == 'md':
         with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(text)
+            for chunk in open_chunks():
+                f.write(chunk)
     elif output_format == 'json':
-        json_data = {
-            "content": text,
-            "paragraphs": [p.strip() for p in text.split('\n') if p.strip()],
-            "converted_at": datetime.datetime.utcnow().isoformat(),
-            "word_count": len(text.split())
-        }
+        # Written by hand so content and paragraphs can be streamed; the layout
+        # matches json.dump(..., indent=2, ensure_ascii=False)
         with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(json_data, f, indent=2, ensure_ascii=False)
+            f.write('{\n  "content": "')
+            for chunk in open_chunks():
+                f.write(json.dumps(chunk, ensure_ascii=False)[1:-1])
+            f.write('",\n  "paragraphs": [')
+            word_count = 0
+            separator = "\n"
+            for paragraph in _iter_lines(open_chunks()):
+                word_count += len(paragraph.split())
+                if paragraph.strip():
+                    f.write(f"{separator}    {json.dumps(paragraph.strip(), ensure_ascii=False)}")
+                    separator = ",\n"
+            f.write("\n  ]" if separator == ",\n" else "]")
+            converted_at = json.dumps(datetime.datetime.utcnow().isoformat())
+            f.write(f',\n  "converted_at": {converted_at},\n  "word_count": {word_count}\n}}')
     elif output_format == 'pdf':
         try:
             from reportlab.lib.pagesizes import letter
@@ -239,7 +814,7 @@ def convert_to_output_format(text: str, output_format: str, output_path: str) ->
             doc = SimpleDocTemplate(output_path, pagesize=letter)
             styles = getSampleStyleSheet()
             story = []
-            for paragraph in text.split('\n'):
+            for paragraph in _iter_lines(open_chunks()):
                 if paragraph.strip():
                     story.append(Paragraph(paragraph, styles['Normal']))
             doc.build(story)
@@ -247,16 +822,87 @@ def convert_to_output_format(text: str, output_format: str, output_path: str) ->
             raise RuntimeError("reportlab required: pip install reportlab")
 
 
-def process_file(file_path: str, output_format: str = 'txt', custom_name: str = "",
-                 tags: str = "", description: str = "", force_ocr: bool = False) -> dict:
+def compute_file_hash(file_path: str, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    """SHA-256 of a file's bytes, read in fixed-size chunks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_existing_text(existing: dict, db_path: str = DB_PATH) -> str:
+    """The first INDEXED_TEXT_MAX_CHARS characters of an existing document's text"""
+    text_path = existing["extracted_text_path"]
+    if text_path and os.path.exists(text_path):
+        with open(text_path, 'r', encoding='utf-8', newline='') as f:
+            return f.read(INDEXED_TEXT_MAX_CHARS)
+    return get_document_content(existing["id"], db_path)
+
+
+def _write_output(extracted_text: str, extracted_text_path: str, output_format: str, output_stem: str,
+                  storage_dir: str) -> str:
+    """Convert extracted text into a new storage file; returns its path, or "" on failure"""
+    output_path = reserve_storage_path(output_stem, storage_dir, output_format)
+    try:
+        if extracted_text_path and os.path.exists(extracted_text_path):
+            convert_file_to_output_format(extracted_text_path, output_format, output_path)
+        else:
+            convert_to_output_format(extracted_text, output_format, output_path)
+        print(f"Successfully converted to {output_format.upper()}: {output_path}")
+        return output_path
+    except Exception as e:
+        print(f"Conversion to {output_format} failed: {e}")
+        os.remove(output_path)
+        return ""
+
+
+def _retag_duplicate(existing: dict, content_hash: str, output_format: str, custom_name: str, tags: str,
+                     description: str, storage_dir: str, db_path: str) -> dict:
+    """Record that updates an existing duplicate instead of adding a row: a given name and
+    description replace the stored ones, tags are added to its tags, and its text is
+    converted to ``output_format`` unless it already has an output in that format"""
+    record = {key: existing[key] for key in DOCUMENT_COLUMNS if key not in ("id", "ingested_at", "updated_at")}
+    record["custom_name"] = custom_name or existing["custom_name"]
+    record["description"] = description or existing["description"]
+    record["tags"] = ", ".join(parse_tags(f"{existing['tags'] or ''},{tags}"))
+    output_path = existing["output_path"]
+    if existing["readable"] and (output_format != existing["output_format"]
+                                 or not (output_path and os.path.exists(output_path))):
+        output_path = _write_output(_read_existing_text(existing, db_path), existing["extracted_text_path"],
+                                    output_format, f"{Path(existing['path']).stem}_converted", storage_dir)
+        if output_path:
+            record.update(output_format=output_format, output_path=output_path)
+    record.update(extracted_text="", page_count=count_pages(existing["path"]),
+                  page_methods=[method for _, method in get_document_pages(existing["id"], db_path)],
+                  content_hash=content_hash, duplicate_of=existing["id"], reuses_row=True)
+    return record
+
+
+def extract_document(file_path: str, output_format: str = 'txt', custom_name: str = "",
+                     tags: str = "", description: str = "", force_ocr: bool = False,
+                     new_row_on_duplicate: bool = DEDUP_NEW_ROW, db_path: str = DB_PATH) -> dict:
+    """Copy a file into storage and extract its text without writing to the database.
+
+    Returns a record whose keys match the keyword arguments of ``insert_document``,
+    so it can be produced in a worker process and written by a single DB writer.
+
+    Files whose content hash matches an already ingested document reuse that
+    document's stored blob and extracted text instead of being copied and
+    re-extracted (``force_ocr`` always re-extracts). Unless ``new_row_on_duplicate``
+    is set, the record updates the existing document (see ``_retag_duplicate``) and
+    carries its id in ``duplicate_of`` so no new row is written.
+
+    Text-like formats are streamed into the extracted-text file and converted from
+    it in chunks; the record then carries only a bounded prefix of the text.
+    """
     storage_dir = os.path.join(os.path.dirname(__file__), "storage")
     os.makedirs(storage_dir, exist_ok=True)
 
     base_name = os.path.basename(file_path)
     file_ext = Path(file_path).suffix.lower().lstrip('.')
     file_size = os.path.getsize(file_path)
-
-    is_machine_readable = detect_file_readability(file_path) and not force_ocr
+    requested_name = custom_name
 
     if custom_name:
         display_name = sanitize_filename(custom_name)
@@ -264,44 +910,83 @@ def process_file(file_path: str, output_format: str = 'txt', custom_name: str =
         display_name = Path(base_name).stem
         custom_name = base_name
 
-    stored_filename = generate_unique_filename(display_name, storage_dir, file_ext)
-    stored_path = os.path.join(storage_dir, stored_filename)
-    shutil.copy2(file_path, stored_path)
+    content_hash = compute_file_hash(file_path) if DEDUP_ENABLED else ""
+    existing = None
+    if content_hash and not force_ocr:
+        existing = find_document_by_hash(content_hash, db_path)
+        existing = dict(zip(DOCUMENT_COLUMNS, existing)) if existing else None
 
-    try:
-        readable, extracted_text, method = extract_text_from_file(stored_path, force_ocr)
-        word_count = len(extracted_text.split()) if extracted_text else 0
-    except Exception as e:
-        print(f"Text extraction failed: {e}")
-        readable, extracted_text, method, word_count = False, "", "failed", 0
+    if existing and not new_row_on_duplicate:
+        return _retag_duplicate(existing, content_hash, output_format, requested_name, tags, description,
+                                storage_dir, db_path)
 
     extracted_text_path = ""
     output_path = ""
 
-    if readable and extracted_text:
-        extracted_filename = f"{display_name}_extracted.txt"
-        extracted_text_path = os.path.join(storage_dir, extracted_filename)
-        with open(extracted_text_path, "w", encoding="utf-8") as f:
-            f.write(extracted_text)
+    if existing:
+        stored_path = existing["path"]
+        is_machine_readable = bool(existing["is_machine_readable"])
+        readable = bool(existing["readable"])
+        method = existing["processing_method"]
+        extracted_text = _read_existing_text(existing, db_path)
+        extracted_text_path = existing["extracted_text_path"]
+        word_count = existing["word_count"]
+        page_count = count_pages(stored_path)
+        methods = [page_method for _, page_method in get_document_pages(existing["id"], db_path)]
+        output_stem = f"{display_name}_converted"
+    else:
+        probe = probe_document(file_path, with_texts=not force_ocr)
+        if content_hash:
+            # A copy: probes of formats other than PDF are the cached dicts themselves
+            probe = {**probe, "content_hash": content_hash}
+        page_count = probe["page_count"]
+        is_machine_readable = probe["is_machine_readable"] and not force_ocr
 
-        output_filename = f"{display_name}_converted.{output_format}"
-        output_path = os.path.join(storage_dir, output_filename)
-        try:
-            convert_to_output_format(extracted_text, output_format, output_path)
-            print(f"Successfully converted to {output_format.upper()}: {output_path}")
-        except Exception as e:
-            print(f"Conversion to {output_format} failed: {e}")
-            output_path = ""
+        stored_path = reserve_storage_path(display_name, storage_dir, file_ext)
+        shutil.copy2(file_path, stored_path)
+        stored_stem = Path(stored_path).stem
+        output_stem = f"{stored_stem}_converted"
 
-    doc_id = insert_document(base_name, custom_name, stored_path, file_ext, is_machine_readable,
-                             readable, extracted_text_path, output_format, output_path, method,
-                             file_size, word_count, tags, description, extracted_text)
+        extracted_filename = f"{stored_stem}_extracted.txt"
+
+        extractor = get_extractor(probe["format"])
+        if extractor is not None and extractor.stream is not None:
+            # Streamed straight into the extracted-text file; only a bounded prefix
+            # is kept in memory for the database
+            streamed_path = os.path.join(storage_dir, extracted_filename)
+            try:
+                readable, extracted_text, word_count = stream_text_to_file(
+                    extractor.stream(stored_path), streamed_path)
+                method = "direct_read"
+            except Exception as e:
+                print(f"Text extraction failed: {e}")
+                readable, extracted_text, method, word_count = False, "", "failed", 0
+            if readable and extracted_text:
+                extracted_text_path = streamed_path
+            elif os.path.exists(streamed_path):
+                os.remove(streamed_path)
+        else:
+            try:
+                readable, extracted_text, method = extract_text_from_file(stored_path, force_ocr, probe)
+                word_count = len(extracted_text.split()) if extracted_text else 0
+            except Exception as e:
+                print(f"Text extraction failed: {e}")
+                readable, extracted_text, method, word_count = False, "", "failed", 0
+
+            if readable and extracted_text:
+                extracted_text_path = os.path.join(storage_dir, extracted_filename)
+                with open(extracted_text_path, "w", encoding="utf-8") as f:
+                    f.write(extracted_text)
+        methods = page_methods(probe, method)
+
+    if readable and extracted_text:
+        output_path = _write_output(extracted_text, extracted_text_path, output_format, output_stem,
+                                    storage_dir)
 
     return {
-        "id": doc_id,
         "name": base_name,
         "custom_name": custom_name,
-        "stored_path": stored_path,
+        "path": stored_path,
         "original_format": file_ext,
         "is_machine_readable": is_machine_readable,
         "readable": readable,
@@ -312,7 +997,77 @@ def process_file(file_path: str, output_format: str = 'txt', custom_name: str =
         "file_size": file_size,
         "word_count": word_count,
         "tags": tags,
-        "description": description
+        "description": description,
+        "extracted_text": extracted_text,
+        "page_count": page_count,
+        "page_methods": methods,
+        "content_hash": content_hash,
+        "duplicate_of": existing["id"] if existing else None,
+        "reuses_row": False
+    }
+
+
+def build_result(record: dict, doc_id: int) -> dict:
+    """Shape an extracted record and its database id into the ``process_file`` result."""
+    return {
+        "id": doc_id,
+        "name": record["name"],
+        "custom_name": record["custom_name"],
+        "stored_path": record["path"],
+        "original_format": record["original_format"],
+        "is_machine_readable": bool(record["is_machine_readable"]),
+        "readable": bool(record["readable"]),
+        "extracted_text_path": record["extracted_text_path"],
+        "output_format": record["output_format"],
+        "output_path": record["output_path"],
+        "processing_method": record["processing_method"],
+        "file_size": record["file_size"],
+        "word_count": record["word_count"],
+        "tags": record["tags"],
+        "description": record["description"],
+        "page_count": record["page_count"],
+        "page_methods": record["page_methods"],
+        "content_hash": record["content_hash"],
+        "duplicate_of": record["duplicate_of"]
     }
 
 
+def store_document(record: dict, db_path: str = DB_PATH) -> dict:
+    return store_documents([record], db_path)[0]
+
+
+def _passages(record: dict):
+    """Passages of a record's full text, streamed from its extracted-text file when present"""
+    text_path = record["extracted_text_path"]
+    if text_path and os.path.exists(text_path):
+        return split_passages(iter_text_chunks(text_path, newline=''))
+    return split_passages([record["extracted_text"]])
+
+
+def store_documents(records: list, db_path: str = DB_PATH) -> list:
+    """Insert extracted records in one bulk write; returns their result dicts.
+
+    Records that point at an existing duplicate update that row instead. With
+    CHUNKING_ENABLED the full text is also stored as passages, read lazily here in
+    the writer so worker results never carry them.
+    """
+    replaced = update_documents([(r["duplicate_of"], r["custom_name"], r["tags"], r["description"],
+                                  r["output_format"], r["output_path"]) for r in records if r["reuses_row"]],
+                                db_path)
+    for output_path in replaced:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+    new_records = [r for r in records if not r["reuses_row"]]
+    if CHUNKING_ENABLED:
+        new_records = [dict(r, chunks=_passages(r)) if r["readable"] else r for r in new_records]
+    doc_ids = iter(insert_documents(new_records, db_path=db_path))
+    return [build_result(record, record["duplicate_of"] if record["reuses_row"] else next(doc_ids))
+            for record in records]
+
+
+def process_file(file_path: str, output_format: str = 'txt', custom_name: str = "",
+                 tags: str = "", description: str = "", force_ocr: bool = False,
+                 new_row_on_duplicate: bool = DEDUP_NEW_ROW, db_path: str = DB_PATH) -> dict:
+    record = extract_document(file_path, output_format, custom_name, tags, description, force_ocr,
+                              new_row_on_duplicate, db_path)
+    return store_document(record, db_path)
@@ -0,0 +1,173 @@
+import hashlib
+import threading
+import time
+from functools import lru_cache
+from typing import Iterable, Optional, Tuple
+
+from config import (OCR_CACHE_ENABLED, OCR_CACHE_MAX_BYTES, OCR_CACHE_PATH, OCR_LANG, OCR_TESSERACT_CONFIG,
+                    ensure_db_dir)
+from db_ops import get_store
+
+# Bumped whenever the layout below changes; a cache with another version is dropped
+OCR_CACHE_SCHEMA_VERSION = 1
+
+# Eviction trims the cache to this fraction of OCR_CACHE_MAX_BYTES so it does not
+# run again on the very next insert
+OCR_CACHE_EVICT_TO = 0.9
+
+# Keys per IN (...) lookup, below SQLite's bound-parameter limit
+LOOKUP_BATCH = 500
+
+_initialized = set()
+_init_lock = threading.Lock()
+
+
+def _create_schema(conn) -> None:
+    # OCR text is stored once per page raster (ocr_texts); ocr_sources maps a
+    # (source file hash, page, render settings) key onto it so unchanged files skip rasterizing
+    for table in ("ocr_sources", "ocr_texts", "ocr_cache_size"):
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+    conn.execute("""CREATE TABLE IF NOT EXISTS ocr_texts
+                    (key TEXT PRIMARY KEY,
+                     text TEXT NOT NULL,
+                     size INTEGER NOT NULL,
+                     last_used REAL NOT NULL)""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_texts_last_used ON ocr_texts(last_used)")
+    conn.execute("""CREATE TABLE IF NOT EXISTS ocr_sources
+                    (key TEXT PRIMARY KEY,
+                     text_key TEXT NOT NULL) WITHOUT ROWID""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_sources_text_key ON ocr_sources(text_key)")
+    # Running total of ocr_texts.size, so inserts need not SUM the table
+    conn.execute("""CREATE TABLE IF NOT EXISTS ocr_cache_size
+                    (id INTEGER PRIMARY KEY CHECK (id = 0),
+                     bytes INTEGER NOT NULL)""")
+    conn.execute("INSERT OR IGNORE INTO ocr_cache_size (id, bytes) VALUES (0, 0)")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS ocr_texts_ai AFTER INSERT ON ocr_texts BEGIN
+                      UPDATE ocr_cache_size SET bytes = bytes + new.size;
+                    END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS ocr_texts_ad AFTER DELETE ON ocr_texts BEGIN
+                      UPDATE ocr_cache_size SET bytes = bytes - old.size;
+                      DELETE FROM ocr_sources WHERE text_key = old.key;
+                    END""")
+    conn.execute(f"PRAGMA user_version = {OCR_CACHE_SCHEMA_VERSION}")
+
+
+def _connection(cache_path: str):
+    store = get_store(cache_path)
+    if cache_path not in _initialized:
+        with _init_lock:
+            if cache_path not in _initialized:
+                ensure_db_dir(cache_path)
+                # Under the write lock, so worker processes opening a new cache together
+                # create it once and never drop pages another process just cached
+                with store.transaction(immediate=True) as conn:
+                    version = conn.execute("PRAGMA user_version").fetchone()[0]
+                    if version != OCR_CACHE_SCHEMA_VERSION:
+                        _create_schema(conn)
+                _initialized.add(cache_path)
+    return store.connection()
+
+
+@lru_cache(maxsize=1)
+def ocr_engine_id() -> str:
+    """Tesseract version, part of every key so an upgrade does not serve stale text"""
+    try:
+        import pytesseract
+        return str(pytesseract.get_tesseract_version())
+    except Exception:
+        return "unknown"
+
+
+def _digest(*parts) -> str:
+    return hashlib.sha256("\0".join(str(part) for part in parts).encode()).hexdigest()
+
+
+def source_key(file_hash: str, page_number: int, render: str, lang: str = OCR_LANG,
+               config: str = OCR_TESSERACT_CONFIG) -> str:
+    """Key of a page by its source file's SHA-256, page number, ``render`` (a description
+    of the DPI and preprocessing settings) and OCR settings"""
+    return _digest("source", file_hash, page_number, render, lang, config, ocr_engine_id())
+
+
+def raster_key(image, lang: str = OCR_LANG, config: str = OCR_TESSERACT_CONFIG) -> str:
+    """Key of a page by the hash of its rasterized pixels and the OCR settings"""
+    digest = hashlib.sha256(f"{image.mode}:{image.size}".encode())
+    digest.update(image.tobytes())
+    return _digest("raster", digest.hexdigest(), lang, config, ocr_engine_id())
+
+
+def _lookup(query: str, keys: list, cache_path: str) -> dict:
+    conn = _connection(cache_path)
+    found = {}
+    for start in range(0, len(keys), LOOKUP_BATCH):
+        batch = keys[start:start + LOOKUP_BATCH]
+        placeholders = ", ".join("?" * len(batch))
+        found.update(conn.execute(query.format(placeholders=placeholders), batch).fetchall())
+    return found
+
+
+def _touch(text_keys: list, cache_path: str) -> None:
+    if not text_keys:
+        return
+    now = time.time()
+    with get_store(cache_path).transaction() as conn:
+        conn.executemany("UPDATE ocr_texts SET last_used = ? WHERE key = ?",
+                         [(now, key) for key in text_keys])
+
+
+def get_source_texts(keys: Iterable[str], cache_path: str = OCR_CACHE_PATH) -> dict:
+    """{source key: text} of the keys that are cached"""
+    keys = list(keys)
+    if not OCR_CACHE_ENABLED or not keys:
+        return {}
+    rows = _lookup("SELECT key, text_key FROM ocr_sources WHERE key IN ({placeholders})", keys, cache_path)
+    texts = get_raster_texts(set(rows.values()), cache_path)
+    return {key: texts[text_key] for key, text_key in rows.items() if text_key in texts}
+
+
+def get_raster_texts(keys: Iterable[str], cache_path: str = OCR_CACHE_PATH) -> dict:
+    """{raster key: text} of the keys that are cached"""
+    keys = list(keys)
+    if not OCR_CACHE_ENABLED or not keys:
+        return {}
+    texts = _lookup("SELECT key, text FROM ocr_texts WHERE key IN ({placeholders})", keys, cache_path)
+    _touch(list(texts), cache_path)
+    return texts
+
+
+def put_texts(entries: Iterable[Tuple[Optional[str], str, str]], cache_path: str = OCR_CACHE_PATH) -> None:
+    """Cache (source key or None, raster key, text) entries, evicting the least
+    recently used pages once the cache exceeds OCR_CACHE_MAX_BYTES"""
+    entries = list(entries)
+    if not OCR_CACHE_ENABLED or not entries:
+        return
+    _connection(cache_path)
+    now = time.time()
+    with get_store(cache_path).transaction() as conn:
+        conn.executemany("""INSERT INTO ocr_texts (key, text, size, last_used) VALUES (?, ?, ?, ?)
+                            ON CONFLICT (key) DO UPDATE SET last_used = excluded.last_used""",
+                         [(key, text, len(text.encode('utf-8')), now) for _, key, text in entries])
+        conn.executemany("INSERT OR REPLACE INTO ocr_sources (key, text_key) VALUES (?, ?)",
+                         [(source, key) for source, key, _ in entries if source])
+        total = conn.execute("SELECT bytes FROM ocr_cache_size").fetchone()[0]
+        if total > OCR_CACHE_MAX_BYTES:
+            conn.execute("""DELETE FROM ocr_texts WHERE key IN
+                            (SELECT key FROM
+                             (SELECT key, SUM(size) OVER (ORDER BY last_used DESC, key) AS kept
+                              FROM ocr_texts)
+                             WHERE kept > ?)""", (int(OCR_CACHE_MAX_BYTES * OCR_CACHE_EVICT_TO),))
+
+
+def ocr_cache_stats(cache_path: str = OCR_CACHE_PATH) -> dict:
+    conn = _connection(cache_path)
+    pages = conn.execute("SELECT COUNT(*) FROM ocr_texts").fetchone()[0]
+    sources = conn.execute("SELECT COUNT(*) FROM ocr_sources").fetchone()[0]
+    size = conn.execute("SELECT bytes FROM ocr_cache_size").fetchone()[0]
+    return {"pages": pages, "source_keys": sources, "bytes": size, "max_bytes": OCR_CACHE_MAX_BYTES}
+
+
+def clear_ocr_cache(cache_path: str = OCR_CACHE_PATH) -> None:
+    """Drop every cached page"""
+    _connection(cache_path)
+    with get_store(cache_path).transaction() as conn:
+        conn.execute("DELETE FROM ocr_texts")
@@ -0,0 +1,40 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_ops  # noqa: E402
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """A freshly migrated database in a temporary directory"""
+    path = str(tmp_path / "documents.db")
+    db_ops.init_db(path)
+    yield path
+    db_ops.get_store(path).close()
+
+
+def make_record(name: str, text: str = "", **fields) -> dict:
+    """``insert_document`` keyword arguments of a plain-text document"""
+    record = {
+        "name": name,
+        "custom_name": name,
+        "path": f"/storage/{name}",
+        "original_format": "txt",
+        "is_machine_readable": True,
+        "readable": bool(text),
+        "extracted_text_path": "",
+        "output_format": "txt",
+        "output_path": "",
+        "processing_method": "direct_read",
+        "file_size": len(text),
+        "word_count": len(text.split()),
+        "tags": "",
+        "description": "",
+        "extracted_text": text,
+    }
+    record.update(fields)
+    return record
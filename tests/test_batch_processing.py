@@ -0,0 +1,67 @@
+import os
+import subprocess
+import sys
+import time
+
+import batch_processing
+import file_processing
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CANCEL_SCRIPT = """import sys, threading, time
+sys.path.insert(0, {repo!r})
+import batch_processing, db_ops
+
+
+def slow_extract(*args):
+    time.sleep(60)
+
+
+if __name__ == "__main__":
+    batch_processing.extract_document = slow_extract
+    db_ops.init_db({db_path!r})
+    cancel = threading.Event()
+    threading.Timer(1.0, cancel.set).start()
+    jobs = [(path, "", "", "", False) for path in {files!r}]
+    results, failures = batch_processing.process_batch(jobs, max_workers=2, cancel_event=cancel,
+                                                       db_path={db_path!r})
+    print(len(results), len(failures))
+"""
+
+
+def report_ocr_threads(*args):
+    raise RuntimeError(f"{file_processing._ocr_threads} OCR threads")
+
+
+def test_cancel_terminates_running_jobs(tmp_path):
+    files = []
+    for i in range(4):
+        files.append(str(tmp_path / f"file_{i}.txt"))
+        with open(files[-1], "w") as f:
+            f.write("text")
+    script = tmp_path / "cancel_batch.py"
+    script.write_text(CANCEL_SCRIPT.format(repo=REPO, db_path=str(tmp_path / "documents.db"), files=files))
+
+    started = time.monotonic()
+    completed = subprocess.run([sys.executable, str(script)], capture_output=True, text=True, timeout=50)
+    elapsed = time.monotonic() - started
+
+    assert completed.returncode == 0, completed.stderr
+    assert completed.stdout.split() == ["0", "0"]
+    # The jobs would run for a minute; exit must not wait for them
+    assert elapsed < 15
+
+
+
+def test_pool_workers_ocr_on_one_thread(tmp_path, db_path, monkeypatch):
+    files = []
+    for i in range(3):
+        files.append(str(tmp_path / f"file_{i}.txt"))
+        with open(files[-1], "w") as f:
+            f.write("text")
+    monkeypatch.setattr(batch_processing, "extract_document", report_ocr_threads)
+    jobs = [(path, "", "", "", False) for path in files]
+    results, failures = batch_processing.process_batch(jobs, max_workers=2, db_path=db_path)
+    assert results == []
+    assert sorted(failures) == [(path, "1 OCR threads") for path in files]
+    assert file_processing._ocr_threads == file_processing.OCR_MAX_WORKERS
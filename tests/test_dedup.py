@@ -0,0 +1,56 @@
+import pytest
+
+import db_ops
+import file_processing
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    """Keep extract_document's storage directory inside tmp_path"""
+    monkeypatch.setattr(file_processing, "__file__", str(tmp_path / "file_processing.py"))
+    return tmp_path / "storage"
+
+
+def test_failed_extraction_is_retried(db_path, storage, tmp_path):
+    broken = tmp_path / "report.docx"
+    broken.write_bytes(b"not a zip archive")
+    first = file_processing.process_file(str(broken), db_path=db_path)
+    assert first["processing_method"] == "failed"
+
+    second = file_processing.process_file(str(broken), db_path=db_path)
+    assert second["duplicate_of"] is None
+    assert second["id"] != first["id"]
+    assert db_ops.find_document_by_hash(first["content_hash"], db_path) is None
+
+
+def test_duplicate_reuses_row_with_bool_flags(db_path, storage, tmp_path):
+    source = tmp_path / "notes.txt"
+    source.write_text("some searchable notes")
+    first = file_processing.process_file(str(source), db_path=db_path)
+    second = file_processing.process_file(str(source), tags="extra", db_path=db_path)
+    assert second["duplicate_of"] == first["id"] == second["id"]
+    for result in (first, second):
+        assert result["is_machine_readable"] is True
+        assert result["readable"] is True
+
+
+def test_ocr_reuses_content_hash(db_path, storage, tmp_path, monkeypatch):
+    hashed = []
+    ocr_hashes = []
+
+    def compute_file_hash(path):
+        hashed.append(path)
+        return "content-hash"
+
+    def ocr_image_to_text(image_path, file_hash=None):
+        ocr_hashes.append(file_hash)
+        return True, "scanned text", "ocr"
+
+    monkeypatch.setattr(file_processing, "compute_file_hash", compute_file_hash)
+    monkeypatch.setattr(file_processing, "ocr_image_to_text", ocr_image_to_text)
+    scan = tmp_path / "scan.png"
+    scan.write_bytes(b"\x89PNG\r\n\x1a\n" + bytes(64))
+    record = file_processing.extract_document(str(scan), db_path=db_path)
+    assert record["content_hash"] == "content-hash"
+    assert ocr_hashes == ["content-hash"]
+    assert hashed == [str(scan)]
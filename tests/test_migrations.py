@@ -0,0 +1,49 @@
+import multiprocessing
+import sqlite3
+
+import db_ops
+
+PROCESSES = 6
+
+
+def _init_db(db_path, barrier, errors):
+    barrier.wait()
+    try:
+        db_ops.init_db(db_path)
+    except Exception as e:
+        errors.put(repr(e))
+
+
+def _init_concurrently(db_path):
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(PROCESSES)
+    errors = ctx.Queue()
+    processes = [ctx.Process(target=_init_db, args=(db_path, barrier, errors)) for _ in range(PROCESSES)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+    failures = []
+    while not errors.empty():
+        failures.append(errors.get())
+    assert [process.exitcode for process in processes] == [0] * PROCESSES
+    return failures
+
+
+def test_concurrent_init_of_fresh_database(tmp_path):
+    db_path = str(tmp_path / "documents.db")
+    assert _init_concurrently(db_path) == []
+    with sqlite3.connect(db_path) as conn:
+        assert db_ops.get_schema_version(conn) == db_ops.SCHEMA_VERSION
+
+
+def test_concurrent_init_of_old_database(tmp_path):
+    db_path = str(tmp_path / "documents.db")
+    with sqlite3.connect(db_path) as conn:
+        c = conn.cursor()
+        for version, migrate in db_ops.MIGRATIONS[:3]:
+            migrate(c)
+            c.execute(f"PRAGMA user_version = {version}")
+    assert _init_concurrently(db_path) == []
+    with sqlite3.connect(db_path) as conn:
+        assert db_ops.get_schema_version(conn) == db_ops.SCHEMA_VERSION
@@ -0,0 +1,37 @@
+import multiprocessing
+
+import ocr_cache
+
+PROCESSES = 6
+PAGES = 20
+
+
+def _cache_pages(cache_path, worker, barrier, errors):
+    barrier.wait()
+    try:
+        ocr_cache.put_texts([(f"source-{worker}-{page}", f"raster-{worker}-{page}", f"text {worker} {page}")
+                             for page in range(PAGES)], cache_path)
+    except Exception as e:
+        errors.put(repr(e))
+
+
+def test_concurrent_first_use_of_new_cache(tmp_path):
+    cache_path = str(tmp_path / "ocr_cache.db")
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(PROCESSES)
+    errors = ctx.Queue()
+    processes = [ctx.Process(target=_cache_pages, args=(cache_path, worker, barrier, errors))
+                 for worker in range(PROCESSES)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+    failures = []
+    while not errors.empty():
+        failures.append(errors.get())
+    assert failures == []
+    assert [process.exitcode for process in processes] == [0] * PROCESSES
+
+    stats = ocr_cache.ocr_cache_stats(cache_path)
+    assert (stats["pages"], stats["source_keys"]) == (PROCESSES * PAGES, PROCESSES * PAGES)
+    assert ocr_cache.get_source_texts(["source-3-7"], cache_path) == {"source-3-7": "text 3 7"}
@@ -0,0 +1,113 @@
+import random
+
+import pytest
+
+import db_ops
+from benchmarks import FULL_SCAN_RE
+from conftest import make_record
+
+WORDS = ["invoice", "voice", "report", "annual", "budget", "memo", "draft", "final", "scan", "letter"]
+
+
+@pytest.fixture
+def corpus(db_path):
+    rng = random.Random(0)
+    records = []
+    for i in range(60):
+        words = rng.choices(WORDS, k=rng.randint(1, 12))
+        records.append(make_record(f"{rng.choice(WORDS)}_{i}.txt", " ".join(words),
+                                   tags=", ".join(rng.sample(WORDS[:4], 2)),
+                                   is_machine_readable=i % 3 != 0))
+    db_ops.insert_documents(records, batch_size=7, db_path=db_path)
+    return db_path
+
+
+def _all_pages(query, search_type, readability_filter, page_size, db_path):
+    rows, cursor = db_ops.search_documents_page(query, search_type, readability_filter, page_size,
+                                                db_path=db_path)
+    pages = [rows]
+    while cursor:
+        rows, cursor = db_ops.search_documents_page(query, search_type, readability_filter, page_size,
+                                                    cursor, db_path=db_path)
+        pages.append(rows)
+    assert all(len(page) <= page_size for page in pages)
+    return [row for page in pages for row in page]
+
+
+@pytest.mark.parametrize("search_type, query", [
+    ("all", "voice"), ("all", "voi"), ("all", "annual report"), ("all", "in"),
+    ("content", "budget"), ("content", "memo draft"), ("name", "scan"), ("tags", "invoice"),
+    ("tags", "ann"), ("all", ""),
+])
+@pytest.mark.parametrize("readability_filter", ["all", "machine_readable"])
+@pytest.mark.parametrize("page_size", [1, 7, 200])
+def test_pages_concatenate_to_unpaged_results(corpus, search_type, query, readability_filter, page_size):
+    unpaged, cursor = db_ops.search_documents_page(query, search_type, readability_filter, None,
+                                                   db_path=corpus)
+    assert cursor is None
+    assert unpaged
+    assert _all_pages(query, search_type, readability_filter, page_size, corpus) == unpaged
+
+
+def test_substring_matches_follow_full_text_matches(db_path):
+    db_ops.insert_documents([make_record("invoice.pdf", "hello world"),
+                             make_record("notes.txt", "a voice memo")], db_path=db_path)
+    rows = db_ops.search_documents("voice", db_path=db_path)
+    assert [row[1] for row in rows] == ["notes.txt", "invoice.pdf"]
+    snippets = [row[db_ops.SEARCH_COLUMNS.index("snippet")] for row in rows]
+    assert snippets == [f"a {db_ops.HIGHLIGHT_START}voice{db_ops.HIGHLIGHT_END} memo", ""]
+
+
+def test_short_all_query_does_not_scan_content(db_path):
+    for plan in db_ops.explain_search_plan("vo", "all", db_path=db_path).values():
+        assert not any(FULL_SCAN_RE.match(line) for line in plan), plan
+
+
+def test_database_migrated_without_trigram_index(tmp_path, monkeypatch):
+    # Migrated by an SQLite without the trigram tokenizer, then opened by one with it
+    db_path = str(tmp_path / "documents.db")
+    monkeypatch.setattr(db_ops, "TRIGRAM_SUPPORTED", False)
+    db_ops.init_db(db_path)
+    monkeypatch.setattr(db_ops, "TRIGRAM_SUPPORTED", True)
+    db_ops.insert_documents([make_record("invoice.pdf", "hello world"),
+                             make_record("notes.txt", "a voice memo")], db_path=db_path)
+
+    rows = db_ops.search_documents("voice", db_path=db_path)
+    assert [row[1] for row in rows] == ["notes.txt", "invoice.pdf"]
+    assert db_ops.rebuild_fts_index(db_path=db_path) == 2
+
+
+def test_only_pages_are_cached(corpus):
+    db_ops.search_documents("voice", db_path=corpus)
+    db_ops.get_all_documents(db_path=corpus)
+    assert db_ops.search_cache_stats(corpus)["size"] == 0
+
+    first = db_ops.search_documents_page("voice", page_size=5, db_path=corpus)
+    assert db_ops.search_documents_page("voice", page_size=5, db_path=corpus) == first
+    stats = db_ops.search_cache_stats(corpus)
+    assert (stats["size"], stats["hits"]) == (1, 1)
+
+    db_ops.insert_document(**make_record("voice_new.txt", "voice"), db_path=corpus)
+    assert db_ops.search_cache_stats(corpus)["size"] == 0
+    rows, _ = db_ops.search_documents_page("voice", page_size=5, db_path=corpus)
+    assert "voice_new.txt" in [row[1] for row in rows]
+
+
+def test_init_db_leaves_interrupted_rebuild_to_resume(corpus):
+    def interrupt(index, done, total):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        db_ops.rebuild_fts_index(batch_size=10, indexes=["documents_fts"], progress_callback=interrupt,
+                                 db_path=corpus)
+    db_ops.init_db(corpus)
+    conn = db_ops.get_store(corpus).connection()
+    assert conn.execute("SELECT COUNT(*) FROM documents_fts_docsize").fetchone()[0] == 10
+    assert [row[0] for row in db_ops.pending_fts_rebuilds(corpus)] == ["documents_fts"]
+
+    batches = []
+    db_ops.rebuild_fts_index(batch_size=10, indexes=["documents_fts"],
+                             progress_callback=lambda *progress: batches.append(progress), db_path=corpus)
+    assert batches[-1] == ("documents_fts", 60, 60)
+    assert len(batches) == 5
+    assert db_ops.pending_fts_rebuilds(corpus) == []
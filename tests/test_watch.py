@@ -0,0 +1,67 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import batch_processing
+import watch
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STOP_SCRIPT = """import sys, threading, time
+sys.path.insert(0, {repo!r})
+import db_ops, watch
+
+
+def slow_extract(*args):
+    time.sleep(60)
+
+
+if __name__ == "__main__":
+    watch.extract_document = slow_extract
+    db_ops.init_db({db_path!r})
+    stop = threading.Event()
+    threading.Timer(2.0, stop.set).start()
+    print(watch.watch_directories([{directory!r}], max_workers=2, poll_interval=0.1, settle_time=0,
+                                  stop_event=stop, db_path={db_path!r}))
+"""
+
+
+@pytest.mark.parametrize("max_workers, expected", [(1, [1]), (2, [1, 1]), (4, [1, 3])])
+def test_pool_sizes_honour_max_workers(tmp_path, db_path, monkeypatch, max_workers, expected):
+    pools = []
+
+    class RecordingPool(ProcessPoolExecutor):
+        def __init__(self, max_workers, **kwargs):
+            pools.append(max_workers)
+            super().__init__(max_workers, **kwargs)
+
+    monkeypatch.setattr(watch, "ProcessPoolExecutor", RecordingPool)
+    monkeypatch.setattr(batch_processing, "BATCH_FAST_LANE_WORKERS", 1)
+    stop = threading.Event()
+    stop.set()
+    watch.watch_directories([str(tmp_path)], max_workers=max_workers, stop_event=stop, db_path=db_path)
+    assert pools == expected
+
+
+def test_stop_terminates_running_jobs(tmp_path):
+    directory = tmp_path / "inbox"
+    directory.mkdir()
+    for i in range(4):
+        (directory / f"file_{i}.txt").write_text("text")
+    script = tmp_path / "stop_watch.py"
+    script.write_text(STOP_SCRIPT.format(repo=REPO, db_path=str(tmp_path / "documents.db"),
+                                         directory=str(directory)))
+
+    started = time.monotonic()
+    completed = subprocess.run([sys.executable, str(script)], capture_output=True, text=True, timeout=50)
+    elapsed = time.monotonic() - started
+
+    assert completed.returncode == 0, completed.stderr
+    assert completed.stdout.split() == ["0"]
+    # The files would take a minute to extract; stopping must not wait for them
+    assert elapsed < 15
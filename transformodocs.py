@@ -4,13 +4,142 @@ import json
 
 from config import OUTPUT_FORMATS
 from db_ops import init_db
-from file_processing import process_file
-from ui import create_gui
 
 
+def parse_workers(args: list):
+    """The optional [workers] argument (args[5]) as a positive int, or None when omitted"""
+    if len(args) <= 5:
+        return None
+    if not args[5].isdigit() or int(args[5]) < 1:
+        raise ValueError(f"Invalid worker count: {args[5]}")
+    return int(args[5])
+
+
+BATCH_USAGE = ("Usage: transformodocs.py --batch <file_or_directory> [output_format] [tags] "
+               "[description] [force_ocr] [workers]")
+
+WATCH_USAGE = (f"Usage: transformodocs.py --watch <directory>[{os.pathsep}<directory>...] [output_format] "
+               "[tags] [description] [force_ocr] [workers]")
+
+
+def run_batch(args: list) -> int:
+    """CLI batch mode: --batch <file_or_directory> [output_format] [tags] [description] [force_ocr] [workers]"""
+    from batch_processing import collect_batch_files, process_batch
+
+    if not args:
+        print(BATCH_USAGE)
+        return 1
+
+    source = args[0]
+    output_format = args[1] if len(args) > 1 else 'txt'
+    tags = args[2] if len(args) > 2 else ""
+    description = args[3] if len(args) > 3 else ""
+    force_ocr = len(args) > 4 and args[4].lower() == 'true'
+    try:
+        workers = parse_workers(args)
+    except ValueError as e:
+        print(e)
+        print(BATCH_USAGE)
+        return 1
+
+    if not os.path.exists(source):
+        print(f"Path does not exist: {source}")
+        return 1
+
+    if output_format not in OUTPUT_FORMATS:
+        print(f"Unsupported output format: {output_format}")
+        print(f"Supported formats: {', '.join(OUTPUT_FORMATS.keys())}")
+        return 1
+
+    files = collect_batch_files([source])
+    if not files:
+        print(f"No supported files found in: {source}")
+        return 1
+
+    def report(completed, total, file_path, result, error):
+        if error:
+            print(f"[{completed}/{total}] FAILED {file_path}: {error}")
+        else:
+            print(f"[{completed}/{total}] {file_path} -> id {result['id']} "
+                  f"({result['processing_method']}, {result['word_count']} words)")
+
+    jobs = [(file_path, "", tags, description, force_ocr) for file_path in files]
+    results, failures = process_batch(jobs, output_format, workers, report)
+
+    print("Batch processing completed!")
+    print(f"Processed: {len(results)}  Failed: {len(failures)}  Total: {len(files)}")
+    for file_path, error in failures:
+        print(f"  {file_path}: {error}")
+    return 1 if failures else 0
+
+
+def run_watch(args: list) -> int:
+    """CLI watch mode: --watch <directories> [output_format] [tags] [description] [force_ocr] [workers],
+    with several directories separated by os.pathsep; runs until interrupted"""
+    from watch import watch_directories
+
+    if not args:
+        print(WATCH_USAGE)
+        return 1
+
+    directories = args[0].split(os.pathsep)
+    output_format = args[1] if len(args) > 1 else 'txt'
+    tags = args[2] if len(args) > 2 else ""
+    description = args[3] if len(args) > 3 else ""
+    force_ocr = len(args) > 4 and args[4].lower() == 'true'
+    try:
+        workers = parse_workers(args)
+    except ValueError as e:
+        print(e)
+        print(WATCH_USAGE)
+        return 1
+
+    missing = [directory for directory in directories if not os.path.isdir(directory)]
+    if missing:
+        print(f"Not a directory: {', '.join(missing)}")
+        return 1
+
+    if output_format not in OUTPUT_FORMATS:
+        print(f"Unsupported output format: {output_format}")
+        print(f"Supported formats: {', '.join(OUTPUT_FORMATS.keys())}")
+        return 1
+
+    def report(file_path, result, error):
+        if error:
+            print(f"FAILED {file_path}: {error}")
+        else:
+            print(f"{file_path} -> id {result['id']} "
+                  f"({result['processing_method']}, {result['word_count']} words)")
+
+    print(f"Watching {', '.join(directories)} (Ctrl+C to stop)")
+    try:
+        ingested = watch_directories(directories, output_format, tags, description, force_ocr, workers,
+                                     progress_callback=report)
+    except KeyboardInterrupt:
+        print("Stopped watching")
+        return 0
+    print(f"Stopped watching; ingested {ingested} files")
+    return 0
+
+
+# Each mode imports what it needs when it runs, so a single-file call never loads
+# the GUI (tkinter) or the process pool machinery of batch and watch mode
 if __name__ == "__main__":
     init_db()
 
+    if len(sys.argv) > 1 and sys.argv[1] == "--batch":
+        sys.exit(run_batch(sys.argv[2:]))
+
+    if len(sys.argv) > 1 and sys.argv[1] == "--watch":
+        sys.exit(run_watch(sys.argv[2:]))
+
+    if len(sys.argv) > 1 and os.path.isdir(sys.argv[1]):
+        # Same positions as a single file: <directory> [output_format] [custom_name] [tags]
+        # [description] [force_ocr], then [workers]; a custom name cannot apply to many files
+        if len(sys.argv) > 3 and sys.argv[3]:
+            print("Ignoring custom name for a directory")
+        sys.exit(run_batch(sys.argv[1:3] + sys.argv[4:]))
+
     if len(sys.argv) > 1:
         file_path = sys.argv[1]
         output_format = sys.argv[2] if len(sys.argv) > 2 else 'txt'
@@ -28,6 +157,7 @@ if __name__ == "__main__":
             print(f"Supported formats: {', '.join(OUTPUT_FORMATS.keys())}")
             sys.exit(1)
 
+        from file_processing import process_file
         try:
             result = process_file(file_path, output_format, custom_name, tags, description, force_ocr)
             print("Processing completed!")
@@ -36,6 +166,5 @@ if __name__ == "__main__":
             print(f"Processing failed: {e}")
             sys.exit(1)
     else:
+        from ui import create_gui
         create_gui()
-
-
@@ -1,13 +1,41 @@
 import os
 import sys
+import queue
+import threading
+import time
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 from pathlib import Path
 import datetime
 
-from config import ALL_FORMATS, MACHINE_READABLE_FORMATS, OUTPUT_FORMATS, DB_PATH
-from file_processing import detect_file_readability, process_file
-from db_ops import get_all_documents, search_documents, rebuild_fts_index
+from config import ALL_FORMATS, IMAGE_FORMATS, MACHINE_READABLE_FORMATS, OUTPUT_FORMATS, DB_PATH
+from file_processing import probe_document
+from batch_processing import process_batch
+from db_ops import (HIGHLIGHT_END, HIGHLIGHT_START, count_document_chunks, delete_document, find_tags,
+                    get_document, get_document_chunks, get_document_content, get_document_pages,
+                    get_documents_page, optimize_fts_index, pending_fts_rebuilds, rebuild_fts_index,
+                    search_documents_page, search_passages)
+
+# Milliseconds between polls of the background processing queue
+PROGRESS_POLL_MS = 100
+
+# Passages loaded at a time in the document details view, and best-matching
+# passages shown for the active search
+DETAILS_CHUNKS_PER_LOAD = 25
+DETAILS_MATCHING_PASSAGES = 5
+
+# Tags offered by the tag filter box, most used first
+TAG_SUGGESTIONS = 50
+
+
+def describe_readability(file_path: str):
+    """(label, colour) for a file's probed readability; mixed PDFs show how many pages need OCR"""
+    probe = probe_document(file_path)
+    if probe["is_machine_readable"]:
+        return "Machine Readable", "green"
+    if probe["format"] == 'pdf' and any(probe["page_has_text"]):
+        return f"Mixed ({len(probe['ocr_pages'])} of {probe['page_count']} pages need OCR)", "orange"
+    return "Requires OCR", "orange"
 
 
 def create_gui():
@@ -19,8 +47,35 @@ def create_gui():
 
             self.selected_files = []  # (file_path, custom_name, tags, description, force_ocr)
 
+            # Search & Browse paging: the active (query, search_type, readability_filter)
+            # and the keyset cursor of the next page, fetched as the list is scrolled
+            self.list_query = ("", "all", "all")
+            self.next_cursor = None
+            self.loading_page = False
+
+            # Background processing: the worker thread posts events to progress_queue,
+            # which the Tk main loop drains with after()
+            self.processing_thread = None
+            self.progress_queue = queue.Queue()
+            self.cancel_event = threading.Event()
+
+            # Search index rebuilds run on their own thread and report through index_queue
+            self.index_thread = None
+            self.index_queue = queue.Queue()
+
+            # Selected files are probed one at a time on a background thread (a large
+            # PDF takes a while); their (label, colour) readability lands in readability
+            self.readability = {}
+            self.probing = set()
+            self.probe_requests = queue.Queue()
+            self.probe_queue = queue.Queue()
+            self.probe_thread = None
+
             self.create_widgets()
             self.refresh_document_list()
+            # A rebuild interrupted last session left the index incomplete: finish it
+            if pending_fts_rebuilds():
+                self.rebuild_search_index()
 
         def create_widgets(self):
             self.notebook = ttk.Notebook(self.master)
@@ -80,9 +135,22 @@ def create_gui():
             ttk.Checkbutton(global_options, text="Force OCR for all files (ignore machine readability)",
                             variable=self.force_ocr_all).pack(anchor="w")
 
-            ttk.Button(self.process_frame, text="Process Files",
-                       command=self.process_files,
-                       style="Accent.TButton").pack(pady=20)
+            process_buttons = ttk.Frame(self.process_frame)
+            process_buttons.pack(pady=(20, 5))
+            self.process_button = ttk.Button(process_buttons, text="Process Files",
+                                             command=self.process_files,
+                                             style="Accent.TButton")
+            self.process_button.pack(side="left")
+            self.cancel_button = ttk.Button(process_buttons, text="Cancel",
+                                            command=self.cancel_processing, state="disabled")
+            self.cancel_button.pack(side="left", padx=(10, 0))
+
+            progress_frame = ttk.Frame(self.process_frame)
+            progress_frame.pack(fill="x", padx=20, pady=(0, 10))
+            self.progress_bar = ttk.Progressbar(progress_frame, mode="determinate")
+            self.progress_bar.pack(fill="x")
+            self.progress_label = ttk.Label(progress_frame, text="")
+            self.progress_label.pack(anchor="w", pady=(5, 0))
 
             results_frame = ttk.LabelFrame(self.process_frame, text="Processing Results", padding=10)
             results_frame.pack(fill="both", expand=True, padx=20, pady=(0, 20))
@@ -110,6 +178,15 @@ def create_gui():
             ttk.Button(search_row1, text="Show All",
                        command=self.refresh_document_list).pack(side="left")
 
+            ttk.Label(search_row1, text="Tag:").pack(side="left", padx=(20, 5))
+            self.tag_var = tk.StringVar()
+            self.tag_suggestions = {}  # combobox label "tag (count)" -> tag
+            self.tag_combo = ttk.Combobox(search_row1, textvariable=self.tag_var, width=25)
+            self.tag_combo.pack(side="left")
+            self.tag_combo.bind("<KeyRelease>", lambda e: self.update_tag_suggestions())
+            self.tag_combo.bind("<<ComboboxSelected>>", lambda e: self.search_by_tag())
+            self.tag_combo.bind("<Return>", lambda e: self.search_by_tag())
+
             search_row2 = ttk.Frame(search_frame)
             search_row2.pack(fill="x", pady=(5, 0))
 
@@ -131,12 +208,13 @@ def create_gui():
             list_frame = ttk.LabelFrame(self.search_frame, text="Documents", padding=10)
             list_frame.pack(fill="both", expand=True, padx=20, pady=(0, 10))
 
-            columns = ("ID", "Name", "Custom Name", "Format", "Readable", "Size", "Words", "Tags", "Date")
+            columns = ("ID", "Name", "Custom Name", "Format", "Readable", "Size", "Words", "Tags", "Date",
+                       "Match")
             self.doc_tree = ttk.Treeview(list_frame, columns=columns, show="headings", height=15)
 
             column_widths = {
                 "ID": 50, "Name": 150, "Custom Name": 150, "Format": 80,
-                "Readable": 100, "Size": 80, "Words": 80, "Tags": 120, "Date": 120
+                "Readable": 100, "Size": 80, "Words": 80, "Tags": 120, "Date": 120, "Match": 300
             }
             for col in columns:
                 self.doc_tree.heading(col, text=col)
@@ -144,7 +222,9 @@ def create_gui():
 
             tree_scroll_v = ttk.Scrollbar(list_frame, orient="vertical", command=self.doc_tree.yview)
             tree_scroll_h = ttk.Scrollbar(list_frame, orient="horizontal", command=self.doc_tree.xview)
-            self.doc_tree.configure(yscrollcommand=tree_scroll_v.set, xscrollcommand=tree_scroll_h.set)
+            self.doc_tree.configure(
+                yscrollcommand=lambda first, last: self.on_document_list_scroll(tree_scroll_v, first, last),
+                xscrollcommand=tree_scroll_h.set)
 
             tree_frame = ttk.Frame(list_frame)
             tree_frame.pack(fill="both", expand=True)
@@ -163,13 +243,18 @@ def create_gui():
                       command=self.open_selected_file).pack(side="left", padx=(0, 10))
             ttk.Button(action_frame, text="Delete",
                       command=self.delete_selected_document).pack(side="left", padx=(0, 10))
-            ttk.Button(action_frame, text="Rebuild Search Index",
-                      command=self.rebuild_search_index).pack(side="left", padx=(0, 10))
+            self.rebuild_button = ttk.Button(action_frame, text="Rebuild Search Index",
+                                             command=self.rebuild_search_index)
+            self.rebuild_button.pack(side="left", padx=(0, 10))
+            self.index_progress = ttk.Progressbar(action_frame, length=200, mode="determinate")
+            self.index_progress.pack(side="left", padx=(0, 10))
+            self.index_label = ttk.Label(action_frame, text="")
+            self.index_label.pack(side="left")
 
         def select_files(self):
             filetypes = [("All Supported", " ".join([f"*.{ext}" for ext in ALL_FORMATS.keys()]))]
             filetypes.append(("Machine Readable", " ".join([f"*.{ext}" for ext in MACHINE_READABLE_FORMATS.keys()])))
-            filetypes.append(("Images/Scanned", " ".join([f"*.{ext}" for ext in ['jpg','jpeg','png','tiff','bmp','gif','webp']])))
+            filetypes.append(("Images/Scanned", " ".join([f"*.{ext}" for ext in IMAGE_FORMATS])))
             for ext, desc in ALL_FORMATS.items():
                 filetypes.append((desc, f"*.{ext}"))
             filetypes.append(("All files", "*.*"))
@@ -181,6 +266,8 @@ def create_gui():
 
             if files:
                 for file_path in files:
+                    # Re-probe files selected again, they may have changed
+                    self.readability.pop(file_path, None)
                     base_name = Path(file_path).stem
                     self.selected_files.append((file_path, base_name, "", "", False))
                 self.update_files_display()
@@ -235,14 +322,14 @@ def create_gui():
                 info_frame.pack(fill="x", padx=10, pady=5)
 
                 file_path = current_values[0]
-                is_readable = detect_file_readability(file_path)
+                readability, readability_colour = self.readability_of(file_path)
 
                 tk.Label(info_frame, text=f"File: {os.path.basename(file_path)}",
                         font=("Arial", 10, "bold")).pack(anchor="w")
                 tk.Label(info_frame, text=f"Format: {Path(file_path).suffix.upper()}",
                         fg="blue").pack(anchor="w")
-                tk.Label(info_frame, text=f"Readability: {'Machine Readable' if is_readable else 'Requires OCR'}",
-                        fg="green" if is_readable else "orange").pack(anchor="w")
+                tk.Label(info_frame, text=f"Readability: {readability}",
+                        fg=readability_colour).pack(anchor="w")
 
                 name_frame = ttk.LabelFrame(edit_item_dialog, text="Custom Name", padding=10)
                 name_frame.pack(fill="x", padx=10, pady=5)
@@ -296,15 +383,53 @@ def create_gui():
             ttk.Button(button_frame, text="Apply Changes", command=apply_changes).pack(side="left", padx=(0, 10))
             ttk.Button(button_frame, text="Cancel", command=dialog.destroy).pack(side="left")
 
+        def readability_of(self, file_path):
+            """Probed (label, colour) of a file; starts probing it if that has not happened yet"""
+            if file_path in self.readability:
+                return self.readability[file_path]
+            if file_path not in self.probing:
+                if not self.probing:
+                    self.master.after(PROGRESS_POLL_MS, self.poll_probes)
+                self.probing.add(file_path)
+                self.probe_requests.put(file_path)
+                if self.probe_thread is None:
+                    self.probe_thread = threading.Thread(target=self.run_probes, daemon=True)
+                    self.probe_thread.start()
+            return "Checking...", "gray"
+
+        def run_probes(self):
+            # Runs on the probe thread: never touch Tk widgets here, only the queues
+            while True:
+                file_path = self.probe_requests.get()
+                try:
+                    self.probe_queue.put((file_path, describe_readability(file_path)))
+                except Exception as e:
+                    self.probe_queue.put((file_path, (f"Unknown ({e})", "red")))
+
+        def poll_probes(self):
+            probed = False
+            try:
+                while True:
+                    file_path, readability = self.probe_queue.get_nowait()
+                    self.probing.discard(file_path)
+                    self.readability[file_path] = readability
+                    probed = True
+            except queue.Empty:
+                pass
+            if probed:
+                self.update_files_display()
+            if self.probing:
+                self.master.after(PROGRESS_POLL_MS, self.poll_probes)
+
         def update_files_display(self):
             self.files_text.delete(1.0, tk.END)
             if self.selected_files:
                 for file_path, custom_name, tags, description, force_ocr in self.selected_files:
                     original_name = os.path.basename(file_path)
-                    is_readable = detect_file_readability(file_path)
+                    readability, readability_colour = self.readability_of(file_path)
                     display_text = f"File: {original_name}\n"
                     display_text += f"Custom Name: {custom_name}\n"
-                    display_text += f"Readability: {'Machine Readable' if is_readable else 'Requires OCR'}\n"
+                    display_text += f"Readability: {readability}\n"
                     if force_ocr:
                         display_text += "Processing: Force OCR\n"
                     if tags:
@@ -317,51 +442,127 @@ def create_gui():
                 self.files_text.insert(tk.END, "No files selected")
 
         def process_files(self):
+            if self.processing_thread is not None:
+                return
             if not self.selected_files:
                 messagebox.showwarning("Warning", "Please select at least one file.")
                 return
             output_fmt = self.output_format.get()
             force_ocr_global = self.force_ocr_all.get()
+            jobs = [(file_path, custom_name, tags, description, force_ocr_global or force_ocr_individual)
+                    for file_path, custom_name, tags, description, force_ocr_individual in self.selected_files]
+            self.job_names = {job[0]: job[1] for job in jobs}
             self.results_text.delete(1.0, tk.END)
+            self.results_text.insert(tk.END, f"Processing {len(jobs)} files...\n")
+            self.results_text.insert(tk.END, "-" * 60 + "\n")
+
+            self.processed_count = 0
+            self.failed_count = 0
+            self.pages_done = 0
+            self.completed_paths = set()
+            self.processing_started = time.monotonic()
+            self.progress_bar.configure(maximum=len(jobs), value=0)
+            self.progress_label.configure(text=f"0/{len(jobs)} files")
+            self.process_button.configure(state="disabled")
+            self.cancel_button.configure(state="normal")
+
+            self.cancel_event = threading.Event()
+            self.progress_queue = queue.Queue()
+            self.processing_thread = threading.Thread(target=self.run_batch, args=(jobs, output_fmt),
+                                                      daemon=True)
+            self.processing_thread.start()
+            self.master.after(PROGRESS_POLL_MS, self.poll_progress)
+
+        def run_batch(self, jobs, output_fmt):
+            # Runs on the worker thread: never touch Tk widgets here, only the queue
+            def report(completed, total, file_path, result, error):
+                self.progress_queue.put(("file", completed, total, file_path, result, error))
             try:
-                processed_count = 0
-                failed_count = 0
-                for file_path, custom_name, tags, description, force_ocr_individual in self.selected_files:
-                    try:
-                        force_ocr = force_ocr_global or force_ocr_individual
-                        is_readable = detect_file_readability(file_path)
-                        self.results_text.insert(tk.END, f"Processing: {custom_name}\n")
-                        self.results_text.insert(tk.END, f"  File Type: {Path(file_path).suffix.upper()}\n")
-                        self.results_text.insert(tk.END, f"  Readability: {'Machine Readable' if is_readable else 'Requires OCR'}\n")
-                        self.results_text.insert(tk.END, f"  Processing Method: {'OCR' if force_ocr or not is_readable else 'Direct Extraction'}\n")
-                        self.master.update()
-                        result = process_file(file_path, output_fmt, custom_name, tags, description, force_ocr)
-                        if result['readable']:
-                            self.results_text.insert(tk.END, f"✓ SUCCESS: Text extracted and saved\n")
-                            self.results_text.insert(tk.END, f"  Word Count: {result['word_count']}\n")
-                            self.results_text.insert(tk.END, f"  Output: {result['output_format'].upper()} format\n")
-                            processed_count += 1
-                        else:
-                            self.results_text.insert(tk.END, f"✗ FAILED: Could not extract readable text\n")
-                            failed_count += 1
-                        self.results_text.insert(tk.END, "-" * 60 + "\n")
-                        self.master.update()
-                    except Exception as e:
-                        self.results_text.insert(tk.END, f"✗ ERROR processing '{custom_name}': {str(e)}\n")
-                        failed_count += 1
-                self.results_text.insert(tk.END, f"\nPROCESSING SUMMARY:\n")
-                self.results_text.insert(tk.END, f"Successfully processed: {processed_count}\n")
-                self.results_text.insert(tk.END, f"Failed: {failed_count}\n")
-                self.results_text.insert(tk.END, f"Total files: {len(self.selected_files)}\n")
-                self.results_text.insert(tk.END, f"Database: {DB_PATH}\n")
-                if processed_count > 0:
-                    storage_dir = os.path.join(os.path.dirname(__file__), "storage")
-                    self.results_text.insert(tk.END, f"Files stored in: {storage_dir}\n")
-                    self.refresh_document_list()
-                self.selected_files = []
-                self.update_files_display()
+                results, failures = process_batch(jobs, output_fmt, progress_callback=report,
+                                                  cancel_event=self.cancel_event)
+                self.progress_queue.put(("done", len(jobs), results, failures))
             except Exception as e:
-                messagebox.showerror("Error", f"Processing failed: {str(e)}")
+                self.progress_queue.put(("error", str(e)))
+
+        def cancel_processing(self):
+            if self.processing_thread is not None:
+                self.cancel_event.set()
+                self.cancel_button.configure(state="disabled")
+                self.progress_label.configure(text="Cancelling...")
+
+        def poll_progress(self):
+            try:
+                while True:
+                    event = self.progress_queue.get_nowait()
+                    if event[0] == "file":
+                        self.show_file_progress(*event[1:])
+                    elif event[0] == "done":
+                        self.finish_processing(*event[1:])
+                        return
+                    elif event[0] == "error":
+                        self.processing_thread = None
+                        self.process_button.configure(state="normal")
+                        self.cancel_button.configure(state="disabled")
+                        messagebox.showerror("Error", f"Processing failed: {event[1]}")
+                        return
+            except queue.Empty:
+                pass
+            self.master.after(PROGRESS_POLL_MS, self.poll_progress)
+
+        def show_file_progress(self, completed, total, file_path, result, error):
+            custom_name = self.job_names.get(file_path, os.path.basename(file_path))
+            self.completed_paths.add(file_path)
+            if error:
+                self.results_text.insert(tk.END, f"✗ ERROR processing '{custom_name}': {error}\n")
+                self.failed_count += 1
+            elif result['readable']:
+                self.results_text.insert(tk.END, f"✓ SUCCESS: {custom_name}\n")
+                self.results_text.insert(tk.END, f"  File Type: {Path(file_path).suffix.upper()}\n")
+                self.results_text.insert(tk.END, f"  Readability: {'Machine Readable' if result['is_machine_readable'] else 'Requires OCR'}\n")
+                self.results_text.insert(tk.END, f"  Processing Method: {result['processing_method']}\n")
+                self.results_text.insert(tk.END, f"  Word Count: {result['word_count']}\n")
+                self.results_text.insert(tk.END, f"  Output: {result['output_format'].upper()} format\n")
+                self.processed_count += 1
+            else:
+                self.results_text.insert(tk.END, f"✗ FAILED: Could not extract readable text from '{custom_name}'\n")
+                self.failed_count += 1
+            self.results_text.insert(tk.END, "-" * 60 + "\n")
+            self.results_text.see(tk.END)
+
+            if result:
+                self.pages_done += result.get('page_count', 0)
+            elapsed_min = max(time.monotonic() - self.processing_started, 1e-6) / 60
+            files_per_min = completed / elapsed_min
+            pages_per_min = self.pages_done / elapsed_min
+            eta_seconds = int((total - completed) / files_per_min * 60) if files_per_min else 0
+            eta = str(datetime.timedelta(seconds=eta_seconds))
+            self.progress_bar.configure(value=completed)
+            self.progress_label.configure(
+                text=f"{completed}/{total} files | {files_per_min:.1f} files/min | "
+                     f"{pages_per_min:.1f} pages/min | ETA {eta}")
+
+        def finish_processing(self, total, results, failures):
+            cancelled = total - len(results) - len(failures)
+            self.processing_thread = None
+            self.process_button.configure(state="normal")
+            self.cancel_button.configure(state="disabled")
+            elapsed = str(datetime.timedelta(seconds=int(time.monotonic() - self.processing_started)))
+            self.progress_label.configure(text=f"{'Cancelled' if cancelled else 'Finished'} after {elapsed}")
+            self.results_text.insert(tk.END, f"\nPROCESSING SUMMARY:\n")
+            self.results_text.insert(tk.END, f"Successfully processed: {self.processed_count}\n")
+            self.results_text.insert(tk.END, f"Failed: {self.failed_count}\n")
+            if cancelled:
+                self.results_text.insert(tk.END, f"Cancelled: {cancelled}\n")
+            self.results_text.insert(tk.END, f"Total files: {total}\n")
+            self.results_text.insert(tk.END, f"Database: {DB_PATH}\n")
+            if self.processed_count > 0:
+                storage_dir = os.path.join(os.path.dirname(__file__), "storage")
+                self.results_text.insert(tk.END, f"Files stored in: {storage_dir}\n")
+                self.refresh_document_list()
+            self.results_text.see(tk.END)
+            # Keep files that were cancelled before they ran so they can be resubmitted
+            self.selected_files = [f for f in self.selected_files if f[0] not in self.completed_paths]
+            self.update_files_display()
 
         def search_documents(self):
             query = self.search_var.get().strip()
@@ -371,9 +572,10 @@ def create_gui():
             search_type = self.search_type.get()
             readability_filter = self.readability_filter.get()
             try:
-                results = search_documents(query, search_type, readability_filter)
+                self.list_query = (query, search_type, readability_filter)
+                results, self.next_cursor = search_documents_page(query, search_type, readability_filter)
                 self.populate_document_list(results)
-                count = len(results)
+                count = f"{len(results)}+" if self.next_cursor else str(len(results))
                 filter_text = {
                     "all": "all files",
                     "machine_readable": "machine readable files",
@@ -389,18 +591,58 @@ def create_gui():
             try:
                 readability_filter = getattr(self, 'readability_filter', None)
                 filter_value = readability_filter.get() if readability_filter else "all"
-                results = get_all_documents(filter_value)
+                self.list_query = ("", "all", filter_value)
+                results, self.next_cursor = get_documents_page(filter_value)
                 self.populate_document_list(results)
+                self.update_tag_suggestions()
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to load documents: {str(e)}")
 
+        def update_tag_suggestions(self):
+            # Prefix lookup on the tag index, with per-tag document counts as facets
+            tags = find_tags(self.tag_var.get().strip(), readability_filter=self.readability_filter.get(),
+                             limit=TAG_SUGGESTIONS)
+            self.tag_suggestions = {f"{tag} ({count})": tag for tag, count in tags}
+            self.tag_combo["values"] = list(self.tag_suggestions)
+
+        def search_by_tag(self):
+            tag = self.tag_var.get().strip()
+            tag = self.tag_suggestions.get(tag, tag)
+            if not tag:
+                return
+            self.tag_var.set(tag)
+            self.search_var.set(tag)
+            self.search_type.set("tags")
+            self.search_documents()
+
+        def on_document_list_scroll(self, scrollbar, first, last):
+            scrollbar.set(first, last)
+            if float(last) >= 0.9 and self.next_cursor and not self.loading_page:
+                self.loading_page = True
+                self.master.after_idle(self.load_next_page)
+
+        def load_next_page(self):
+            try:
+                if self.next_cursor:
+                    query, search_type, readability_filter = self.list_query
+                    results, self.next_cursor = search_documents_page(
+                        query, search_type, readability_filter, cursor=self.next_cursor)
+                    self.insert_document_rows(results)
+            except Exception as e:
+                self.next_cursor = None
+                messagebox.showerror("Error", f"Failed to load more documents: {str(e)}")
+            finally:
+                self.loading_page = False
+
         def populate_document_list(self, results):
             for item in self.doc_tree.get_children():
                 self.doc_tree.delete(item)
+            self.insert_document_rows(results)
+
+        def insert_document_rows(self, results):
             for row in results:
-                doc_id, name, custom_name, path, original_format, is_machine_readable, readable, \
-                extracted_text_path, output_format, output_path, processing_method, file_size, \
-                word_count, tags, description, ingested_at, updated_at, content = row
+                doc_id, name, custom_name, original_format, is_machine_readable, readable, \
+                file_size, word_count, tags, updated_at, score, snippet = row
                 if file_size:
                     if file_size > 1024 * 1024:
                         size_str = f"{file_size / (1024 * 1024):.1f} MB"
@@ -422,7 +664,7 @@ def create_gui():
                 word_str = str(word_count) if word_count else "0"
                 self.doc_tree.insert("", "end", values=(
                     doc_id, name, custom_name or "N/A", original_format.upper(),
-                    readable_str, size_str, word_str, tags or "N/A", date_str
+                    readable_str, size_str, word_str, tags or "N/A", date_str, " ".join(snippet.split())
                 ))
 
         def view_document_details(self, event=None):
@@ -433,17 +675,12 @@ def create_gui():
                 return
             item = self.doc_tree.item(selection[0])
             doc_id = item['values'][0]
-            import sqlite3
-            conn = sqlite3.connect(DB_PATH)
-            c = conn.cursor()
-            c.execute("""SELECT d.*, et.content FROM documents d 
-                        LEFT JOIN extracted_texts et ON d.id = et.doc_id
-                        WHERE d.id = ?""", (doc_id,))
-            result = c.fetchone()
-            conn.close()
+            result = get_document(doc_id)
             if not result:
                 messagebox.showerror("Error", "Document not found.")
                 return
+            pages = get_document_pages(doc_id)
+            ocr_page_count = sum(1 for _, method in pages if method == "ocr")
             details_dialog = tk.Toplevel(self.master)
             details_dialog.title(f"Document Details - {result[1]}")
             details_dialog.geometry("900x700")
@@ -475,6 +712,7 @@ Updated: {result[16]}
 Processing Details:
 - Readability Detection: {'Detected as machine readable' if result[5] else 'Detected as requiring OCR'}
 - Extraction Method: {result[10]}
+- Pages OCR'd: {f"{ocr_page_count} of {len(pages)}" if pages else 'N/A'}
 - Text Available: {'Yes, searchable' if result[17] else 'No text content'}
 """
             info_text.insert("1.0", info_content)
@@ -484,14 +722,72 @@ Processing Details:
             if result[17]:
                 content_frame = ttk.Frame(details_notebook)
                 details_notebook.add(content_frame, text="Content")
+                chunk_count = count_document_chunks(doc_id)
+                if chunk_count:
+                    more_button = ttk.Button(content_frame, text="Load More")
+                    more_button.pack(side="bottom", pady=5)
                 content_text = tk.Text(content_frame, wrap=tk.WORD, padx=10, pady=10)
                 content_scroll = ttk.Scrollbar(content_frame, orient="vertical", command=content_text.yview)
                 content_text.configure(yscrollcommand=content_scroll.set)
-                content_text.insert("1.0", result[17])
                 content_text.configure(state="disabled")
                 content_text.pack(side="left", fill="both", expand=True)
                 content_scroll.pack(side="right", fill="y")
 
+                def load_more_chunks():
+                    # Only the next range of passages is read from the database
+                    chunks = get_document_chunks(doc_id, len(content_loaded), DETAILS_CHUNKS_PER_LOAD)
+                    content_text.configure(state="normal")
+                    content_text.insert(tk.END, "".join(chunk for _, chunk in chunks))
+                    content_text.configure(state="disabled")
+                    content_loaded.extend(chunks)
+                    if len(content_loaded) >= chunk_count:
+                        more_button.configure(state="disabled")
+
+                def load_content(event=None):
+                    # Text is only read from the database when the tab is opened
+                    if details_notebook.select() != str(content_frame) or content_loaded:
+                        return
+                    if chunk_count:
+                        load_more_chunks()
+                        return
+                    content_loaded.append(True)
+                    content_text.configure(state="normal")
+                    content_text.insert("1.0", get_document_content(doc_id))
+                    content_text.configure(state="disabled")
+
+                content_loaded = []
+                if chunk_count:
+                    more_button.configure(command=load_more_chunks)
+                details_notebook.bind("<<NotebookTabChanged>>", load_content)
+
+                query, search_type, _ = self.list_query
+                if chunk_count and query.strip() and search_type in ("all", "content"):
+                    passages = search_passages(query, [doc_id], per_doc=DETAILS_MATCHING_PASSAGES)
+                    if passages:
+                        matches_frame = ttk.Frame(details_notebook)
+                        details_notebook.add(matches_frame, text=f"Matches ({len(passages)})")
+                        matches_text = tk.Text(matches_frame, wrap=tk.WORD, padx=10, pady=10)
+                        matches_scroll = ttk.Scrollbar(matches_frame, orient="vertical",
+                                                       command=matches_text.yview)
+                        matches_text.configure(yscrollcommand=matches_scroll.set)
+                        for _, chunk_number, passage, _ in passages:
+                            matches_text.insert(tk.END, f"Passage {chunk_number + 1} of {chunk_count}\n",
+                                                "heading")
+                            # Matched terms come back between highlight markers
+                            for part in passage.strip().split(HIGHLIGHT_START):
+                                term, marker, rest = part.partition(HIGHLIGHT_END)
+                                if marker:
+                                    matches_text.insert(tk.END, term, "match")
+                                    matches_text.insert(tk.END, rest)
+                                else:
+                                    matches_text.insert(tk.END, part)
+                            matches_text.insert(tk.END, "\n\n")
+                        matches_text.tag_configure("heading", font=("Arial", 10, "bold"))
+                        matches_text.tag_configure("match", background="yellow")
+                        matches_text.configure(state="disabled")
+                        matches_text.pack(side="left", fill="both", expand=True)
+                        matches_scroll.pack(side="right", fill="y")
+
         def open_selected_file(self):
             selection = self.doc_tree.selection()
             if not selection:
@@ -499,16 +795,12 @@ Processing Details:
                 return
             item = self.doc_tree.item(selection[0])
             doc_id = item['values'][0]
-            import sqlite3
-            conn = sqlite3.connect(DB_PATH)
-            c = conn.cursor()
-            c.execute("SELECT path, output_path FROM documents WHERE id = ?", (doc_id,))
-            result = c.fetchone()
-            conn.close()
+            result = get_document(doc_id)
             if not result:
                 messagebox.showerror("Error", "Document not found.")
                 return
-            file_path = result[1] if result[1] and os.path.exists(result[1]) else result[0]
+            path, output_path = result[3], result[9]
+            file_path = output_path if output_path and os.path.exists(output_path) else path
             if os.path.exists(file_path):
                 try:
                     if sys.platform.startswith('darwin'):
@@ -535,34 +827,65 @@ Processing Details:
                                        "This will remove the database entry and associated files."):
                 return
             try:
-                import sqlite3
-                conn = sqlite3.connect(DB_PATH)
-                c = conn.cursor()
-                c.execute("SELECT path, extracted_text_path, output_path FROM documents WHERE id = ?", (doc_id,))
-                result = c.fetchone()
+                result = delete_document(doc_id)
                 if result:
-                    c.execute("DELETE FROM documents_fts WHERE doc_id = ?", (doc_id,))
-                    c.execute("DELETE FROM extracted_texts WHERE doc_id = ?", (doc_id,))
-                    c.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
-                    conn.commit()
                     for file_path in result:
                         if file_path and os.path.exists(file_path):
                             try:
                                 os.remove(file_path)
                             except Exception as e:
                                 print(f"Warning: Could not delete file {file_path}: {e}")
-                conn.close()
                 self.refresh_document_list()
                 messagebox.showinfo("Success", f"Document '{doc_name}' deleted successfully.")
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to delete document: {str(e)}")
 
         def rebuild_search_index(self):
+            if self.index_thread is not None:
+                return
+            self.rebuild_button.configure(state="disabled")
+            self.index_progress.configure(value=0)
+            self.index_label.configure(text="Rebuilding search index...")
+            self.index_queue = queue.Queue()
+            self.index_thread = threading.Thread(target=self.run_index_rebuild, daemon=True)
+            self.index_thread.start()
+            self.master.after(PROGRESS_POLL_MS, self.poll_index_progress)
+
+        def run_index_rebuild(self):
+            # Runs on the worker thread: never touch Tk widgets here, only the queue
+            def report(index, done, total):
+                self.index_queue.put(("batch", index, done, total))
             try:
-                rebuild_fts_index()
-                messagebox.showinfo("Success", "Search index rebuilt successfully!")
+                rebuild_fts_index(progress_callback=report)
+                self.index_queue.put(("optimize",))
+                optimize_fts_index()
+                self.index_queue.put(("done",))
             except Exception as e:
-                messagebox.showerror("Error", f"Failed to rebuild search index: {str(e)}")
+                self.index_queue.put(("error", str(e)))
+
+        def poll_index_progress(self):
+            try:
+                while True:
+                    event = self.index_queue.get_nowait()
+                    if event[0] == "batch":
+                        _, index, done, total = event
+                        self.index_progress.configure(maximum=max(total, done, 1), value=done)
+                        self.index_label.configure(text=f"Indexing {index}: {done}/{total}")
+                    elif event[0] == "optimize":
+                        self.index_label.configure(text="Optimizing search index...")
+                    else:
+                        self.index_thread = None
+                        self.rebuild_button.configure(state="normal")
+                        if event[0] == "done":
+                            self.index_label.configure(text="Search index rebuilt")
+                            self.refresh_document_list()
+                        else:
+                            self.index_label.configure(text="Search index rebuild failed")
+                            messagebox.showerror("Error", f"Failed to rebuild search index: {event[1]}")
+                        return
+            except queue.Empty:
+                pass
+            self.master.after(PROGRESS_POLL_MS, self.poll_index_progress)
 
     root = tk.Tk()
     app = DocumentProcessorGUI(root)
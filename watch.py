@@ -0,0 +1,188 @@
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from batch_processing import lane_workers, terminate_pool
+from config import (ALL_FORMATS, BATCH_COMMIT_INTERVAL, BATCH_COMMIT_SIZE, BATCH_MAX_WORKERS,
+                    BATCH_SLOW_LANE_COST, DB_PATH, DEDUP_NEW_ROW, WATCH_POLL_INTERVAL, WATCH_SETTLE_SECONDS)
+from db_ops import get_processed_files, record_processed_files
+from file_processing import estimate_cost, extract_document, limit_ocr_threads, store_documents
+
+# (file_size, mtime_ns) of a file as last seen
+Signature = Tuple[int, int]
+WatchCallback = Callable[[str, Optional[dict], Optional[str]], None]
+
+
+def snapshot_directories(directories: Iterable[str], recursive: bool = True) -> Dict[str, Signature]:
+    """(file_size, mtime_ns) of every supported file under the directories.
+
+    Hidden files and directories are skipped, which also covers the temporary
+    names most copy tools write to before renaming into place.
+    """
+    snapshot = {}
+    stack = list(directories)
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue  # removed or unreadable since it was listed
+        for entry in entries:
+            if entry.name.startswith('.'):
+                continue
+            try:
+                if entry.is_dir():
+                    if recursive:
+                        stack.append(entry.path)
+                elif entry.is_file() and Path(entry.name).suffix.lower().lstrip('.') in ALL_FORMATS:
+                    stat = entry.stat()
+                    snapshot[entry.path] = (stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                continue
+    return snapshot
+
+
+def watch_directories(directories: Iterable[str], output_format: str = 'txt', tags: str = "",
+                      description: str = "", force_ocr: bool = False,
+                      max_workers: Optional[int] = None,
+                      poll_interval: float = WATCH_POLL_INTERVAL,
+                      settle_time: float = WATCH_SETTLE_SECONDS, recursive: bool = True,
+                      progress_callback: Optional[WatchCallback] = None,
+                      new_row_on_duplicate: bool = DEDUP_NEW_ROW,
+                      stop_event: Optional[threading.Event] = None,
+                      db_path: str = DB_PATH) -> int:
+    """Ingest files dropped into the directories until ``stop_event`` is set.
+
+    The directories are rescanned every ``poll_interval`` seconds. A file is picked
+    up once its size and mtime have stayed the same for ``settle_time`` seconds, so
+    files still being written are left alone. As in ``process_batch``, extraction runs
+    in separate fast and slow (OCR) process pools and this process is the single
+    database writer.
+
+    Every file handled is recorded with its size and mtime in the processed_files
+    ledger, failures included, so neither a restart nor the next scan picks it up
+    again unless it changes. ``progress_callback(file_path, result, error)`` is
+    called once per file after it is committed or has failed. Returns the number of
+    files ingested.
+    """
+    directories = [os.path.abspath(directory) for directory in directories]
+    ledger = get_processed_files(db_path)
+    candidates = {}  # path -> (signature, monotonic time it was first seen with it)
+    lanes = [deque(), deque()]  # (path, signature) ready for the fast and slow pools
+    in_flight = {}  # future -> (path, signature, lane index)
+    pending = []  # (path, signature, record) extracted but not yet written
+    ingested = 0
+    last_commit = time.monotonic()
+
+    def stopped():
+        return stop_event is not None and stop_event.is_set()
+
+    def sleep(seconds):
+        if stop_event is not None:
+            stop_event.wait(seconds)
+        else:
+            time.sleep(seconds)
+
+    def report(file_path, result=None, error=None):
+        if progress_callback:
+            progress_callback(file_path, result, error)
+
+    def fail(file_path, signature, error):
+        record_processed_files([(file_path, signature[0], signature[1], None, error)], db_path)
+        ledger[file_path] = signature
+        report(file_path, error=error)
+
+    def commit():
+        nonlocal last_commit, ingested
+        if pending:
+            try:
+                stored = store_documents([record for _, _, record in pending], db_path)
+            except Exception as e:
+                # Left out of the ledger: the next scan retries them
+                for file_path, _, _ in pending:
+                    report(file_path, error=f"Database insert failed: {e}")
+            else:
+                record_processed_files([(file_path, signature[0], signature[1], result['id'], None)
+                                        for (file_path, signature, _), result in zip(pending, stored)],
+                                       db_path)
+                for (file_path, signature, _), result in zip(pending, stored):
+                    ledger[file_path] = signature
+                    ingested += 1
+                    report(file_path, result)
+            pending.clear()
+        last_commit = time.monotonic()
+
+    def scan():
+        now = time.monotonic()
+        snapshot = snapshot_directories(directories, recursive)
+        busy = {file_path for file_path, _, _ in in_flight.values()}
+        busy.update(file_path for lane in lanes for file_path, _ in lane)
+        busy.update(file_path for file_path, _, _ in pending)
+        for file_path, signature in snapshot.items():
+            if ledger.get(file_path) == signature or file_path in busy:
+                continue
+            seen = candidates.get(file_path)
+            if seen is None or seen[0] != signature:
+                candidates[file_path] = (signature, now)
+            elif now - seen[1] >= settle_time:
+                del candidates[file_path]
+                slow = estimate_cost(file_path, force_ocr) >= BATCH_SLOW_LANE_COST
+                lanes[slow].append((file_path, signature))
+        for file_path in [p for p in candidates if p not in snapshot]:
+            del candidates[file_path]
+
+    def dispatch():
+        # As in process_batch, a pool whose own lane is empty takes the other's files
+        for index, executor in enumerate(executors):
+            if executor is None:
+                continue
+            busy = sum(1 for _, _, lane in in_flight.values() if lane == index)
+            while busy < workers[index] and (lanes[index] or lanes[1 - index]):
+                file_path, signature = (lanes[index] or lanes[1 - index]).popleft()
+                future = executor.submit(extract_document, file_path, output_format, "", tags,
+                                         description, force_ocr, new_row_on_duplicate, db_path)
+                in_flight[future] = (file_path, signature, index)
+                busy += 1
+
+    max_workers = max_workers or BATCH_MAX_WORKERS
+    # Either lane may fill up, so both are sized as if they had max_workers files
+    # queued; a single worker serves both lanes from the fast lane's pool
+    workers = lane_workers(max_workers, max_workers, max_workers) if max_workers > 1 else (1, 0)
+    executors = [ProcessPoolExecutor(max_workers=n, initializer=limit_ocr_threads) if n else None
+                 for n in workers]
+    try:
+        next_scan = 0.0
+        while not stopped():
+            if time.monotonic() >= next_scan:
+                scan()
+                next_scan = time.monotonic() + poll_interval
+            dispatch()
+            timeout = max(next_scan - time.monotonic(), 0)
+            if in_flight:
+                done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    file_path, signature, _ = in_flight.pop(future)
+                    try:
+                        record = future.result()
+                    except Exception as e:
+                        fail(file_path, signature, str(e))
+                    else:
+                        pending.append((file_path, signature, record))
+            else:
+                sleep(timeout)
+            if pending and (not in_flight or len(pending) >= BATCH_COMMIT_SIZE
+                            or time.monotonic() - last_commit >= BATCH_COMMIT_INTERVAL):
+                commit()
+    finally:
+        # Files still queued or being extracted are not in the ledger and are
+        # picked up again on the next start, so busy workers are killed rather
+        # than waited for
+        for executor in executors:
+            if executor is not None:
+                terminate_pool(executor)
+        commit()
+    return ingested